@@ -0,0 +1,68 @@
+"""search indexes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+SEARCH_CONFIGS = ("russian", "english")
+
+# table -> (first column, second column) of the indexed search document
+SEARCH_DOCUMENTS = {
+    "courses": ("title", "description"),
+    "lessons": ("title", "content"),
+    "lesson_terms": ("term", "explanation"),
+}
+
+TRGM_INDEXES = {
+    "ix_courses_title_trgm": ("courses", "title"),
+    "ix_lesson_terms_term_trgm": ("lesson_terms", "term"),
+}
+
+
+def upgrade() -> None:
+    # Full-text and trigram indexes exist only on PostgreSQL; SQLite uses
+    # the in-memory fallback index of app/services/search.py
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, (first, second) in SEARCH_DOCUMENTS.items():
+        for config in SEARCH_CONFIGS:
+            op.create_index(
+                f"ix_{table}_search_{config}",
+                table,
+                [sa.text(
+                    f"to_tsvector('{config}', (coalesce({first}, '') || ' ') || coalesce({second}, ''))"
+                )],
+                postgresql_using="gin",
+            )
+    for name, (table, column) in TRGM_INDEXES.items():
+        op.create_index(
+            name,
+            table,
+            [column],
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"},
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    for name, (table, _) in TRGM_INDEXES.items():
+        op.drop_index(name, table_name=table)
+    for table in SEARCH_DOCUMENTS:
+        for config in SEARCH_CONFIGS:
+            op.drop_index(f"ix_{table}_search_{config}", table_name=table)
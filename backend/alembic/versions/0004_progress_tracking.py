@@ -0,0 +1,55 @@
+"""progress tracking
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 19:10:57.985830
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('courses', sa.Column('lessons_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('enrollments', sa.Column('completed_lessons_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('student_progress', sa.Column('time_spent_seconds', sa.Integer(), server_default='0', nullable=False))
+
+    # batch mode recreates the table on SQLite, which cannot ALTER constraints
+    with op.batch_alter_table('enrollments') as batch_op:
+        batch_op.create_unique_constraint('uq_enrollment_user_course', ['user_id', 'course_id'])
+    with op.batch_alter_table('student_progress') as batch_op:
+        batch_op.create_unique_constraint('uq_progress_enrollment_lesson', ['enrollment_id', 'lesson_id'])
+
+    # Backfill the precomputed counters used for incremental progress_percent
+    op.execute("""
+        UPDATE courses SET lessons_count = (
+            SELECT COUNT(*) FROM lessons
+            JOIN course_modules ON lessons.module_id = course_modules.id
+            WHERE course_modules.course_id = courses.id
+        )
+    """)
+    op.execute("""
+        UPDATE enrollments SET completed_lessons_count = (
+            SELECT COUNT(*) FROM student_progress
+            WHERE student_progress.enrollment_id = enrollments.id
+              AND student_progress.completed_at IS NOT NULL
+        )
+    """)
+    op.execute("UPDATE student_progress SET time_spent_seconds = time_spent_minutes * 60")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('student_progress') as batch_op:
+        batch_op.drop_constraint('uq_progress_enrollment_lesson', type_='unique')
+    with op.batch_alter_table('enrollments') as batch_op:
+        batch_op.drop_constraint('uq_enrollment_user_course', type_='unique')
+    op.drop_column('student_progress', 'time_spent_seconds')
+    op.drop_column('enrollments', 'completed_lessons_count')
+    op.drop_column('courses', 'lessons_count')
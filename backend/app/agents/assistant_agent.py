@@ -1,7 +1,9 @@
 """Личный ИИ-ассистент для пользователя."""
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
-from typing import Dict, Any, List
+from app.services.llm_client import get_llm
+from app.services.llm_cache import ainvoke_cached, astream_text
+from app.services.conversation_memory import ConversationMemory, conversation_memory
+from typing import AsyncIterator, Dict, Any, List
 import os
 
 
@@ -11,10 +13,19 @@ class PersonalAssistantAgent:
     его цели, текущие курсы и предпочтения.
     """
 
-    def __init__(self, model_name: str | None = None, temperature: float = 0.7):
+    def __init__(
+        self,
+        model_name: str | None = None,
+        temperature: float = 0.7,
+        memory: ConversationMemory | None = None,
+    ):
         if model_name is None:
             model_name = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature)
+        self.model_name = model_name
+        self.llm = get_llm(model=model_name, temperature=temperature)
+        # Сводка должна быть стабильной, поэтому для нее низкая температура и кэш
+        self.summary_llm = get_llm(model=model_name, temperature=0.2)
+        self.memory = memory or conversation_memory
         self.system_prompt = ChatPromptTemplate.from_messages(
             [
                 (
@@ -43,15 +54,50 @@ class PersonalAssistantAgent:
 - Текущие курсы: {current_courses}
 - Предпочитаемые темы: {preferred_topics}
 
+Краткое содержание более ранней части диалога (если есть):
+{conversation_summary}
+
 Отвечай достаточно кратко (обычно 2–5 предложений), по сути и с лёгкой человечной интонацией.""",
                 ),
                 MessagesPlaceholder("history"),
                 ("user", "{user_message}"),
             ]
         )
+        self.summary_prompt = ChatPromptTemplate.from_template(
+            """Ты ведешь краткий конспект диалога пользователя с ИИ-наставником.
 
-    async def chat(self, message: str, user_context: Dict[str, Any] | None, history: List[Dict[str, str]] | None) -> str:
-        """Отвечает пользователю, учитывая контекст и историю диалога."""
+Текущий конспект:
+{summary}
+
+Новые сообщения диалога:
+{messages}
+
+Обнови конспект с учетом новых сообщений: сохрани факты о пользователе, его цели,
+договоренности, обсужденные темы и открытые вопросы. Не больше 150 слов,
+без вступлений - только текст конспекта."""
+        )
+
+    async def summarize(self, summary: str, messages: List[Dict[str, str]]) -> str:
+        """Дописывает сообщения в конспект ранней части диалога."""
+        content = await ainvoke_cached(
+            self.summary_prompt,
+            self.summary_llm,
+            {
+                "summary": summary or "пока пуст",
+                "messages": "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages),
+            },
+            agent="assistant_summary",
+        )
+        return content.strip()
+
+    async def _build_inputs(
+        self,
+        message: str,
+        user_context: Dict[str, Any] | None,
+        history: List[Dict[str, str]] | None,
+        conversation_id: str | None,
+    ) -> Dict[str, Any]:
+        """Собирает переменные промпта: контекст пользователя, сводку и окно истории."""
         # Преобразуем историю в формат сообщений LangChain
         history_messages: List[Dict[str, str]] = []
         if history:
@@ -60,20 +106,50 @@ class PersonalAssistantAgent:
                 content = msg.get("content", "")
                 history_messages.append({"role": role, "content": content})
 
+        # В модель уходит только окно последних сообщений, остальное - в виде сводки
+        summary, history_messages = await self.memory.prepare(
+            history_messages, self.summarize, conversation_id=conversation_id, model=self.model_name
+        )
+
         context = user_context or {}
-        chain = self.system_prompt | self.llm
+        return {
+            "user_name": context.get("name") or "пользователь",
+            "user_goals": ", ".join(context.get("goals", []) or []) or "не указаны",
+            "current_courses": ", ".join(context.get("current_courses", []) or []) or "нет активных курсов",
+            "preferred_topics": ", ".join(context.get("preferred_topics", []) or []) or "не указаны",
+            "conversation_summary": summary or "нет",
+            "history": history_messages,
+            "user_message": message,
+        }
 
-        response = await chain.ainvoke(
-            {
-                "user_name": context.get("name") or "пользователь",
-                "user_goals": ", ".join(context.get("goals", []) or []) or "не указаны",
-                "current_courses": ", ".join(context.get("current_courses", []) or []) or "нет активных курсов",
-                "preferred_topics": ", ".join(context.get("preferred_topics", []) or []) or "не указаны",
-                "history": history_messages,
-                "user_message": message,
-            }
+    async def chat(
+        self,
+        message: str,
+        user_context: Dict[str, Any] | None,
+        history: List[Dict[str, str]] | None,
+        conversation_id: str | None = None,
+    ) -> str:
+        """Отвечает пользователю, учитывая контекст и историю диалога."""
+        variables = await self._build_inputs(message, user_context, history, conversation_id)
+        # Диалог уникален, поэтому ответы ассистента не кэшируются
+        content = await ainvoke_cached(
+            self.system_prompt,
+            self.llm,
+            variables,
+            agent="assistant",
+            use_cache=False,
         )
 
-        return response.content.strip()
-
+        return content.strip()
 
+    async def chat_stream(
+        self,
+        message: str,
+        user_context: Dict[str, Any] | None,
+        history: List[Dict[str, str]] | None,
+        conversation_id: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Отвечает пользователю по частям, по мере генерации токенов моделью."""
+        variables = await self._build_inputs(message, user_context, history, conversation_id)
+        async for chunk in astream_text(self.system_prompt, self.llm, variables):
+            yield chunk
@@ -1,18 +1,22 @@
 """Агент для создания структуры курса"""
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from app.services.llm_client import get_llm
+from app.services.llm_cache import cache_enabled_for
+from app.services.structured_output import StructuredOutputError, ainvoke_structured
+from app.models import CourseStructurePlan
+from app.services.reference_index import ReferenceIndex
 from typing import Dict, Any, List
-import json
 import os
 
 
 class CourseStructureAgent:
     """Агент, отвечающий за создание структуры курса"""
     
-    def __init__(self, model_name: str = None, temperature: float = 0.7):
+    def __init__(self, model_name: str = None, temperature: float = 0.7, use_cache: bool | None = None):
         if model_name is None:
             model_name = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature)
+        self.llm = get_llm(model=model_name, temperature=temperature)
+        self.use_cache = cache_enabled_for(temperature, use_cache)
         self.prompt_template = ChatPromptTemplate.from_template(
             """Ты - эксперт по созданию образовательных курсов. 
 Создай структуру курса на основе следующих параметров:
@@ -48,54 +52,59 @@ class CourseStructureAgent:
 }}"""
         )
     
-    async def generate_structure(self, course_settings: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_structure(
+        self,
+        course_settings: Dict[str, Any],
+        reference_index: ReferenceIndex | None = None
+    ) -> Dict[str, Any]:
         """Генерирует структуру курса"""
-        chain = self.prompt_template | self.llm
-        
         learning_objectives_str = "\n".join(
             f"- {obj}" for obj in course_settings.get("learning_objectives", [])
         ) if course_settings.get("learning_objectives") else "Не указаны"
 
         reference_files = course_settings.get("reference_files") or []
+        if reference_index is None and reference_files:
+            reference_index = ReferenceIndex.from_files(reference_files)
         reference_summary = (
-            "\n".join(
-                f"- {item.get('name')}: {item.get('content', '')[:300]}"
-                for item in reference_files
-            )
-            if reference_files else "Не переданы"
+            self._reference_summary(course_settings, reference_index)
+            if reference_index is not None and reference_index.sources else "Не переданы"
         )
         
-        response = await chain.ainvoke({
-            "title": course_settings.get("title", ""),
-            "description": course_settings.get("description", ""),
-            "difficulty": course_settings.get("difficulty", "intermediate"),
-            "duration_hours": course_settings.get("duration_hours", 10),
-            "target_audience": course_settings.get("target_audience", ""),
-            "learning_objectives": learning_objectives_str,
-            "reference_files": reference_summary,
-        })
-        
-        # Парсим JSON из ответа
-        content = response.content.strip()
-        
-        # Убираем markdown код блоки если есть
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
-        
         try:
-            structure = json.loads(content)
-            return structure
-        except json.JSONDecodeError as e:
-            # Если не удалось распарсить, возвращаем базовую структуру
-            print(f"Ошибка парсинга JSON: {e}")
-            print(f"Содержимое ответа: {content}")
+            plan = await ainvoke_structured(
+                self.prompt_template,
+                self.llm,
+                {
+                    "title": course_settings.get("title", ""),
+                    "description": course_settings.get("description", ""),
+                    "difficulty": course_settings.get("difficulty", "intermediate"),
+                    "duration_hours": course_settings.get("duration_hours", 10),
+                    "target_audience": course_settings.get("target_audience", ""),
+                    "learning_objectives": learning_objectives_str,
+                    "reference_files": reference_summary,
+                },
+                CourseStructurePlan,
+                agent="course_structure",
+                use_cache=self.use_cache,
+                non_empty=("modules",),
+            )
+            return plan.model_dump()
+        except StructuredOutputError as e:
+            # Если ответ не удалось привести к схеме, возвращаем базовую структуру
+            print(f"Ошибка разбора структуры курса: {e}")
             return self._get_default_structure(course_settings)
-    
+
+    def _reference_summary(self, course_settings: Dict[str, Any], reference_index: ReferenceIndex) -> str:
+        """Список файлов и фрагменты, наиболее близкие к теме и целям курса"""
+        query = " ".join([
+            course_settings.get("title", ""),
+            course_settings.get("description") or "",
+            " ".join(course_settings.get("learning_objectives") or []),
+        ])
+        files = "\n".join(f"- {name}" for name in reference_index.sources)
+        context = reference_index.context(query, k=reference_index.top_k * 2) or reference_index.overview()
+        return f"{files}\n\n{context}" if context else files
+
     def _get_default_structure(self, course_settings: Dict[str, Any]) -> Dict[str, Any]:
         """Возвращает базовую структуру курса при ошибке"""
         duration = course_settings.get("duration_hours", 10)
@@ -1,22 +1,49 @@
 """Координатор мультиагентной системы для создания курсов"""
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Callable, Tuple
 from app.agents.course_agent import CourseStructureAgent
 from app.agents.lesson_agent import LessonDetailAgent
 from app.agents.material_search_agent import MaterialSearchAgent
+from app.services.llm_cache import refresh_cache
+from app.services.reference_index import ReferenceIndex
+from app.services.lesson_index import LessonSimilarityIndex, get_lesson_index, lesson_reuse_enabled, lesson_scope
+from app.services.lesson_results import (
+    LessonResultStore, get_lesson_result_store, lesson_fingerprint, lesson_results_enabled,
+    reference_fingerprint,
+)
 from app.models import (
     CourseSettings, Course, Module, Lesson, CourseDifficulty,
-    VideoMaterial, AdditionalMaterial, PracticeExercise
+    VideoMaterial, AdditionalMaterial, PracticeExercise, TermExplanation
 )
 import asyncio
+import os
+import time
 
 
 class CourseCoordinator:
     """Координирует работу агентов для создания полного курса"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrency: int | None = None,
+        lesson_index: LessonSimilarityIndex | None = None,
+        lesson_results: LessonResultStore | None = None
+    ):
         self.structure_agent = CourseStructureAgent()
         self.lesson_agent = LessonDetailAgent()
         self.material_agent = MaterialSearchAgent()
+        # Индекс похожих уроков: близкие уроки берутся из него или адаптируются
+        if lesson_index is None and lesson_reuse_enabled():
+            lesson_index = get_lesson_index()
+        self.lesson_index = lesson_index
+        # Готовые уроки по отпечатку входных данных: после правки структуры
+        # заново генерируются только добавленные и измененные уроки
+        if lesson_results is None and lesson_results_enabled():
+            lesson_results = get_lesson_result_store()
+        self.lesson_results = lesson_results
+        # Максимум одновременных обращений к агентам в рамках одного курса
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("COURSE_GENERATION_CONCURRENCY", "8"))
+        self.max_concurrency = max(1, max_concurrency)
     
     async def generate_course(
         self,
@@ -24,7 +51,43 @@ class CourseCoordinator:
         structure_override: Dict[str, Any] | None = None
     ) -> Course:
         """Генерирует полный курс используя мультиагентную систему"""
+        course, _ = await self.generate_course_with_reuse(settings, structure_override)
+        return course
+
+    async def generate_course_with_reuse(
+        self,
+        settings: CourseSettings,
+        structure_override: Dict[str, Any] | None = None
+    ) -> tuple[Course, List[tuple[int, int]]]:
+        """Генерирует курс и возвращает позиции уроков, взятых из хранилища готовых уроков"""
+        course, reused_lessons = None, []
+        async for event in self.generate_course_events(settings, structure_override):
+            if event["event"] == "course":
+                course, reused_lessons = event["course"], event["reused_lessons"]
+        return course, reused_lessons
+
+    async def generate_course_events(
+        self,
+        settings: CourseSettings,
+        structure_override: Dict[str, Any] | None = None,
+        completed_lessons: Dict[tuple[int, int], Lesson] | None = None,
+        partial_lessons: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Генерирует курс, отдавая промежуточные события по мере готовности:
+        - structure: структура курса сразу после CourseStructureAgent
+        - lesson_partial: часть урока (текст, упражнение, термин), как только модель
+          ее дописала - только при partial_lessons=True
+        - lesson: каждый урок, как только он детализирован; reused=True - урок с теми же
+          входными данными взят из хранилища готовых уроков без обращения к агентам
+        - course: итоговый курс и позиции переиспользованных уроков (reused_lessons)
+
+        completed_lessons - уже готовые уроки по (индекс модуля, индекс урока),
+        они не генерируются повторно (используется при возобновлении задач).
+        """
         
+        reference_index = await self._build_reference_index(settings)
+
         # Шаг 1: Создаем структуру курса (или используем переданную)
         settings_dict = settings.model_dump()
         if structure_override:
@@ -34,117 +97,127 @@ class CourseCoordinator:
             else:
                 structure = structure_override
         else:
-            structure = await self.structure_agent.generate_structure(settings_dict)
-        
-        # Шаг 2: Детализируем каждый урок параллельно с поиском материалов
-        modules = []
-        total_duration = 0
+            structure = await self.structure_agent.generate_structure(settings_dict, reference_index=reference_index)
+
+        yield {"event": "structure", "structure": structure}
         
-        for module_data in structure.get("modules", []):
-            module_title = module_data.get("title", "Модуль")
-            module_description = module_data.get("description", "")
-            lessons_data = module_data.get("lessons", [])
-            
-            # Создаем задачи для параллельной обработки уроков
-            lesson_tasks = []
-            material_tasks = []
-            
-            for lesson_data in lessons_data:
-                lesson_title = lesson_data.get("title", "Урок")
-                lesson_summary = lesson_data.get("content", "")
-                
-                # Задача для генерации детального содержания
-                lesson_task = self.lesson_agent.generate_lesson_details(
-                    lesson_title=lesson_title,
-                    module_title=module_title,
-                    course_title=settings.title,
-                    difficulty=settings.difficulty.value,
-                    target_audience=settings.target_audience,
-                    lesson_summary=lesson_summary
-                )
-                
-                # Задача для поиска материалов
-                material_task = self.material_agent.find_materials_for_lesson(
-                    lesson_title=lesson_title,
-                    course_title=settings.title,
-                    difficulty=settings.difficulty.value,
-                    target_audience=settings.target_audience,
-                    lesson_summary=lesson_summary
-                )
-                
-                lesson_tasks.append((lesson_data, lesson_task))
-                material_tasks.append(material_task)
-            
-            # Выполняем все задачи параллельно
-            lessons = []
-            module_duration = 0
-            
-            # Собираем все задачи для параллельного выполнения
-            all_lesson_tasks = [task for _, task in lesson_tasks]
-            all_material_tasks = material_tasks
-            
-            # Выполняем параллельно
-            lesson_results = await asyncio.gather(*all_lesson_tasks)
-            material_results = await asyncio.gather(*all_material_tasks)
-            
-            # Обрабатываем результаты
-            for (lesson_data, _), lesson_details, materials_data in zip(lesson_tasks, lesson_results, material_results):
-                # Преобразуем практические упражнения
-                practice_exercises = []
-                for pe_data in lesson_details.get("practice_exercises", []):
-                    practice_exercises.append(
-                        PracticeExercise(
-                            title=pe_data.get("title", "Практическое задание"),
-                            description=pe_data.get("description", ""),
-                            difficulty=pe_data.get("difficulty", "medium"),
-                            estimated_time=pe_data.get("estimated_time"),
-                            solution_hint=pe_data.get("solution_hint")
-                        )
-                    )
-                
-                # Преобразуем видео
-                videos = []
-                for video_data in materials_data.get("videos", []):
-                    videos.append(
-                        VideoMaterial(
-                            title=video_data.get("title", ""),
-                            url=video_data.get("url", ""),
-                            description=video_data.get("description"),
-                            duration=video_data.get("duration"),
-                            channel=video_data.get("channel")
-                        )
-                    )
-                
-                # Преобразуем дополнительные материалы
-                additional_materials = []
-                for mat_data in materials_data.get("additional_materials", []):
-                    additional_materials.append(
-                        AdditionalMaterial(
-                            title=mat_data.get("title", ""),
-                            type=mat_data.get("type", "article"),
-                            url=mat_data.get("url"),
-                            description=mat_data.get("description")
+        # Шаг 2: Детализируем все уроки курса одним графом задач
+        modules_data = structure.get("modules", [])
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        lessons_by_position: Dict[tuple[int, int], Lesson] = dict(completed_lessons or {})
+
+        # Уроки с неизмененными входными данными берутся из хранилища готовых уроков
+        fingerprints: Dict[tuple[int, int], str] = {}
+        reused_lessons: List[tuple[int, int]] = []
+        if self.lesson_results is not None:
+            reference_digest = reference_fingerprint(settings)
+            for module_index, module_data in enumerate(modules_data):
+                for lesson_index, lesson_data in enumerate(module_data.get("lessons", [])):
+                    if (module_index, lesson_index) not in lessons_by_position:
+                        fingerprints[(module_index, lesson_index)] = lesson_fingerprint(
+                            settings, module_data.get("title", "Модуль"), lesson_data, reference_digest
                         )
+            stored = await asyncio.gather(*(
+                self.lesson_results.get(fingerprint) for fingerprint in fingerprints.values()
+            ))
+            for (module_index, lesson_index), lesson in zip(fingerprints, stored):
+                if lesson is None:
+                    continue
+                lesson_data = modules_data[module_index]["lessons"][lesson_index]
+                lesson = lesson.model_copy(update={
+                    "duration_minutes": lesson_data.get("duration_minutes", lesson.duration_minutes),
+                })
+                lessons_by_position[(module_index, lesson_index)] = lesson
+                reused_lessons.append((module_index, lesson_index))
+                yield {
+                    "event": "lesson",
+                    "module_index": module_index,
+                    "lesson_index": lesson_index,
+                    "lesson": lesson,
+                    "reused": True,
+                }
+
+        positions: Dict[asyncio.Task, tuple[int, int]] = {}
+        partial_queue: asyncio.Queue | None = asyncio.Queue() if partial_lessons else None
+        for module_index, module_data in enumerate(modules_data):
+            for lesson_index, lesson_data in enumerate(module_data.get("lessons", [])):
+                if (module_index, lesson_index) in lessons_by_position:
+                    continue
+                task = asyncio.create_task(
+                    self._generate_lesson(
+                        semaphore=semaphore,
+                        settings=settings,
+                        module_title=module_data.get("title", "Модуль"),
+                        lesson_data=lesson_data,
+                        reference_index=reference_index,
+                        on_partial=self._partial_sink(partial_queue, module_index, lesson_index),
                     )
-                
-                lesson = Lesson(
-                    title=lesson_data.get("title", "Урок"),
-                    content=lesson_details.get("content", ""),
-                    duration_minutes=lesson_data.get("duration_minutes", 30),
-                    exercises=lesson_details.get("exercises", []),
-                    practice_exercises=practice_exercises,
-                    videos=videos,
-                    additional_materials=additional_materials
                 )
-                lessons.append(lesson)
-                module_duration += lesson.duration_minutes
-            
-            module = Module(
-                title=module_title,
-                description=module_description,
-                lessons=lessons,
-                duration_hours=round(module_duration / 60, 1)
-            )
+                positions[task] = (module_index, lesson_index)
+
+        # Ошибка одного урока не отменяет остальные: готовые уроки успевают
+        # дойти до потребителя (стрим, чекпоинты), а ошибка поднимается в конце
+        first_error: BaseException | None = None
+        partial_getter: asyncio.Future | None = None
+        try:
+            pending = set(positions)
+            while pending:
+                waiters = set(pending)
+                if partial_queue is not None:
+                    if partial_getter is None:
+                        partial_getter = asyncio.ensure_future(partial_queue.get())
+                    waiters.add(partial_getter)
+                done, _ = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+
+                # Части урока попадают в очередь до завершения его задачи,
+                # поэтому отдаются раньше самого урока
+                if partial_getter is not None and partial_getter.done():
+                    yield {"event": "lesson_partial", **partial_getter.result()}
+                    partial_getter = None
+                while partial_queue is not None and not partial_queue.empty():
+                    yield {"event": "lesson_partial", **partial_queue.get_nowait()}
+
+                finished = done & pending
+                pending -= finished
+                for task in sorted(finished, key=lambda t: positions[t]):
+                    module_index, lesson_index = positions[task]
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                        continue
+                    lesson, fallback = task.result()
+                    lessons_by_position[(module_index, lesson_index)] = lesson
+                    # Запасное содержание не сохраняется: следующая генерация попробует снова
+                    if (module_index, lesson_index) in fingerprints and not fallback:
+                        await self.lesson_results.put(fingerprints[(module_index, lesson_index)], lesson)
+                    yield {
+                        "event": "lesson",
+                        "module_index": module_index,
+                        "lesson_index": lesson_index,
+                        "lesson": lesson,
+                        "reused": False,
+                    }
+        finally:
+            # Клиент отключился - останавливаем оставшиеся задачи
+            for task in positions:
+                if not task.done():
+                    task.cancel()
+            if partial_getter is not None:
+                partial_getter.cancel()
+
+        if first_error is not None:
+            raise first_error
+
+        # Шаг 3: Собираем модули в исходном порядке
+        modules = []
+        total_duration = 0
+
+        for module_index, module_data in enumerate(modules_data):
+            lessons = [
+                lessons_by_position[(module_index, lesson_index)]
+                for lesson_index in range(len(module_data.get("lessons", [])))
+            ]
+            module = self._build_module(module_data, lessons)
             modules.append(module)
             total_duration += module.duration_hours
         
@@ -162,7 +235,400 @@ class CourseCoordinator:
             learning_objectives=settings.learning_objectives or []
         )
         
-        return course
+        yield {"event": "course", "course": course, "reused_lessons": reused_lessons}
+    
+    async def regenerate_lesson(
+        self,
+        settings: CourseSettings,
+        course: Course,
+        module_index: int,
+        lesson_index: int,
+        lesson_plan: Dict[str, Any] | None = None,
+        materials_only: bool = False
+    ) -> Course:
+        """
+        Перегенерирует один урок готового курса, остальные уроки остаются как есть.
+
+        lesson_plan - новые название, описание или длительность урока (по умолчанию текущие).
+        materials_only=True - заново ищутся только видео и материалы, текст урока сохраняется.
+        """
+        module = self._get_module(course, module_index)
+        if not 0 <= lesson_index < len(module.lessons):
+            raise ValueError(f"Урок {lesson_index} не найден в модуле {module_index}")
+        current = module.lessons[lesson_index]
+        lesson_data = self._lesson_data(current, lesson_plan)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # Перегенерация должна дать новый результат, а не тот же ответ из кэша
+        with refresh_cache():
+            if materials_only:
+                materials_data = await self._run_limited(
+                    semaphore,
+                    self.material_agent.find_materials_for_lesson(
+                        lesson_title=lesson_data["title"],
+                        course_title=settings.title,
+                        difficulty=settings.difficulty.value,
+                        target_audience=settings.target_audience,
+                        lesson_summary=lesson_data["content"]
+                    )
+                )
+                lesson = self._build_lesson(lesson_data, current.model_dump(), materials_data)
+                fallback = False
+            else:
+                reference_index = await self._build_reference_index(settings)
+                lesson, fallback = await self._generate_lesson(
+                    semaphore=semaphore,
+                    settings=settings,
+                    module_title=module.title,
+                    lesson_data=lesson_data,
+                    reference_index=reference_index,
+                    use_lesson_index=False,
+                )
+
+        if not fallback:
+            await self._store_regenerated(settings, module.title, lesson_data, current, lesson)
+        lessons = list(module.lessons)
+        lessons[lesson_index] = lesson
+        return self._replace_module(course, module_index, {"title": module.title, "description": module.description}, lessons)
+
+    async def regenerate_module(
+        self,
+        settings: CourseSettings,
+        course: Course,
+        module_index: int,
+        module_plan: Dict[str, Any] | None = None
+    ) -> Course:
+        """
+        Перегенерирует все уроки одного модуля, остальные модули остаются как есть.
+
+        module_plan - новые название, описание или уроки модуля. Переданный список
+        lessons полностью заменяет уроки модуля; без него перегенерируются текущие уроки.
+        """
+        module = self._get_module(course, module_index)
+        module_plan = module_plan or {}
+        module_data = {
+            "title": module_plan.get("title") or module.title,
+            "description": module_plan.get("description") or module.description,
+        }
+        if module_plan.get("lessons") is not None:
+            if not module_plan["lessons"]:
+                raise ValueError("module_plan.lessons не может быть пустым")
+            # Урок с тем же названием сохраняет описание, если в плане его нет
+            current_by_title = {lesson.title: lesson for lesson in module.lessons}
+            previous_lessons = [current_by_title.get(plan.get("title")) for plan in module_plan["lessons"]]
+            lessons_data = [
+                self._lesson_data(previous, plan)
+                for previous, plan in zip(previous_lessons, module_plan["lessons"])
+            ]
+        else:
+            previous_lessons = list(module.lessons)
+            lessons_data = [self._lesson_data(lesson) for lesson in module.lessons]
+
+        reference_index = await self._build_reference_index(settings)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        with refresh_cache():
+            results = await asyncio.gather(*(
+                self._generate_lesson(
+                    semaphore=semaphore,
+                    settings=settings,
+                    module_title=module_data["title"],
+                    lesson_data=lesson_data,
+                    reference_index=reference_index,
+                    use_lesson_index=False,
+                )
+                for lesson_data in lessons_data
+            ))
+        for lesson_data, previous, (lesson, fallback) in zip(lessons_data, previous_lessons, results):
+            if not fallback:
+                await self._store_regenerated(settings, module_data["title"], lesson_data, previous, lesson)
+        return self._replace_module(course, module_index, module_data, [lesson for lesson, _ in results])
+
+    async def _store_regenerated(
+        self,
+        settings: CourseSettings,
+        module_title: str,
+        lesson_data: Dict[str, Any],
+        previous: Lesson | None,
+        lesson: Lesson
+    ) -> None:
+        """Сохраняет перегенерированный урок, чтобы следующая генерация не вернула старую версию"""
+        if self.lesson_results is None:
+            return
+        fingerprint = lesson_fingerprint(settings, module_title, lesson_data, reference_fingerprint(settings))
+        if previous is None:
+            await self.lesson_results.put(fingerprint, lesson)
+        else:
+            await self.lesson_results.replace(previous, fingerprint, lesson)
+
+    @staticmethod
+    def _get_module(course: Course, module_index: int) -> Module:
+        if not 0 <= module_index < len(course.modules):
+            raise ValueError(f"Модуль {module_index} не найден в курсе")
+        return course.modules[module_index]
+
+    @classmethod
+    def _lesson_data(cls, lesson: Lesson | None, lesson_plan: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        """Черновик урока для агентов: поля lesson_plan поверх текущего урока"""
+        lesson_plan = lesson_plan or {}
+        return {
+            "title": lesson_plan.get("title") or (lesson.title if lesson else "Урок"),
+            "content": lesson_plan.get("content") or (cls._lesson_summary(lesson) if lesson else ""),
+            "duration_minutes": lesson_plan.get("duration_minutes") or (lesson.duration_minutes if lesson else 30),
+        }
+
+    @staticmethod
+    def _lesson_summary(lesson: Lesson, max_chars: int = 500) -> str:
+        """Краткое описание готового урока: начало его текста (черновик структуры не хранится)"""
+        text = " ".join(lesson.content.split())
+        if len(text) <= max_chars:
+            return text
+        cut = text.rfind(" ", 0, max_chars)
+        return text[:cut if cut > 0 else max_chars] + "..."
+
+    def _replace_module(
+        self,
+        course: Course,
+        module_index: int,
+        module_data: Dict[str, Any],
+        lessons: List[Lesson]
+    ) -> Course:
+        """Копия курса с замененным модулем и пересчитанной длительностью"""
+        modules = list(course.modules)
+        modules[module_index] = self._build_module(module_data, lessons)
+        return course.model_copy(update={
+            "modules": modules,
+            "total_duration_hours": round(sum(module.duration_hours for module in modules), 1),
+        })
+
+    async def _build_reference_index(self, settings: CourseSettings) -> ReferenceIndex | None:
+        """Материалы курса режутся на фрагменты один раз; в промпты идут только релевантные"""
+        if not settings.reference_files:
+            return None
+        return await asyncio.to_thread(ReferenceIndex.from_files, settings.reference_files)
+
+    @staticmethod
+    def _partial_sink(queue: asyncio.Queue | None, module_index: int, lesson_index: int):
+        """Колбэк, складывающий части урока в очередь событий курса"""
+        if queue is None:
+            return None
+
+        def sink(event: Dict[str, Any]) -> None:
+            part = {key: value for key, value in event.items() if key != "event"}
+            queue.put_nowait({
+                "module_index": module_index,
+                "lesson_index": lesson_index,
+                "part": event["event"],
+                **part,
+            })
+
+        return sink
+
+    async def _run_limited(self, semaphore: asyncio.Semaphore, coro):
+        """Выполняет задачу агента с учетом лимита параллельности"""
+        async with semaphore:
+            return await coro
+
+    async def _generate_lesson(
+        self,
+        semaphore: asyncio.Semaphore,
+        settings: CourseSettings,
+        module_title: str,
+        lesson_data: Dict[str, Any],
+        reference_index: ReferenceIndex | None = None,
+        on_partial: Callable[[Dict[str, Any]], None] | None = None,
+        use_lesson_index: bool = True
+    ) -> Tuple[Lesson, bool]:
+        """Детализирует урок и ищет материалы к нему параллельно
+
+        Возвращает (урок, fallback): fallback=True, если вместо ответа модели
+        использовано запасное содержание урока.
+        """
+        lesson_title = lesson_data.get("title", "Урок")
+        lesson_summary = lesson_data.get("content", "")
+        difficulty = settings.difficulty.value
+        started = time.perf_counter()
+
+        reference_context = ""
+        if reference_index:
+            reference_context = reference_index.context(f"{lesson_title} {lesson_summary} {module_title}")
+
+        # Уроки по собственным материалам курса не берутся из индекса похожих уроков
+        use_lesson_index = use_lesson_index and self.lesson_index is not None and not reference_context
+        query_text = None
+        scope = lesson_scope(settings)
+
+        def find_materials():
+            return self.material_agent.find_materials_for_lesson(
+                lesson_title=lesson_title,
+                course_title=settings.title,
+                difficulty=difficulty,
+                target_audience=settings.target_audience,
+                lesson_summary=lesson_summary
+            )
+
+        if use_lesson_index:
+            query_text = self._lesson_query_text(settings, module_title, lesson_data)
+            match = await self.lesson_index.find(query_text, scope)
+            if match is not None:
+                if match.mode == "reuse":
+                    lesson = match.lesson.model_copy(update={
+                        "title": lesson_title,
+                        "duration_minutes": lesson_data.get("duration_minutes", match.lesson.duration_minutes),
+                    })
+                    fallback = False
+                else:
+                    # Близкий, но не тот же урок: адаптируем текст, материалы ищем для этого урока
+                    lesson_details, materials_data = await asyncio.gather(
+                        self._run_limited(
+                            semaphore,
+                            self.lesson_agent.adapt_lesson_details(
+                                source_lesson=match.lesson.model_dump(),
+                                lesson_title=lesson_title,
+                                module_title=module_title,
+                                course_title=settings.title,
+                                difficulty=difficulty,
+                                target_audience=settings.target_audience,
+                                lesson_summary=lesson_summary
+                            )
+                        ),
+                        self._run_limited(semaphore, find_materials()),
+                    )
+                    lesson = self._build_lesson(lesson_data, lesson_details, materials_data)
+                    fallback = lesson_details.get("fallback", False)
+                    if not fallback:
+                        await self.lesson_index.add(query_text, scope, difficulty, lesson)
+                self.lesson_index.record_served(match, time.perf_counter() - started)
+                return lesson, fallback
+
+        details_kwargs = dict(
+            lesson_title=lesson_title,
+            module_title=module_title,
+            course_title=settings.title,
+            difficulty=difficulty,
+            target_audience=settings.target_audience,
+            lesson_summary=lesson_summary,
+            reference_context=reference_context
+        )
+        if on_partial is None:
+            details_call = self.lesson_agent.generate_lesson_details(**details_kwargs)
+        else:
+            details_call = self._stream_details(details_kwargs, on_partial)
+
+        # Детализация и поиск материалов независимы друг от друга
+        lesson_details, materials_data = await asyncio.gather(
+            self._run_limited(semaphore, details_call),
+            self._run_limited(semaphore, find_materials()),
+        )
+
+        lesson = self._build_lesson(lesson_data, lesson_details, materials_data)
+        fallback = lesson_details.get("fallback", False)
+        if use_lesson_index:
+            self.lesson_index.record_generated(time.perf_counter() - started)
+            # Запасное содержание урока в индекс не попадает
+            if not fallback:
+                await self.lesson_index.add(query_text, scope, difficulty, lesson)
+        return lesson, fallback
+
+    async def _stream_details(
+        self,
+        details_kwargs: Dict[str, Any],
+        on_partial: Callable[[Dict[str, Any]], None]
+    ) -> Dict[str, Any]:
+        """Детализирует урок потоком, передавая готовые части в on_partial"""
+        details: Dict[str, Any] = {}
+        async for event in self.lesson_agent.stream_lesson_details(**details_kwargs):
+            if event["event"] == "details":
+                details = event["details"]
+            else:
+                on_partial(event)
+        return details
+
+    def _lesson_query_text(self, settings: CourseSettings, module_title: str, lesson_data: Dict[str, Any]) -> str:
+        """Текст, по которому ищутся похожие уроки"""
+        return "\n".join([
+            lesson_data.get("title", "Урок"),
+            lesson_data.get("content", ""),
+            module_title,
+            settings.title,
+            settings.target_audience or "",
+        ])
+
+    def _build_lesson(
+        self,
+        lesson_data: Dict[str, Any],
+        lesson_details: Dict[str, Any],
+        materials_data: Dict[str, Any]
+    ) -> Lesson:
+        """Собирает урок из результатов агентов"""
+        # Преобразуем практические упражнения
+        practice_exercises = []
+        for pe_data in lesson_details.get("practice_exercises", []):
+            practice_exercises.append(
+                PracticeExercise(
+                    title=pe_data.get("title", "Практическое задание"),
+                    description=pe_data.get("description", ""),
+                    difficulty=pe_data.get("difficulty", "medium"),
+                    estimated_time=pe_data.get("estimated_time"),
+                    solution_hint=pe_data.get("solution_hint")
+                )
+            )
+        
+        # Преобразуем видео
+        videos = []
+        for video_data in materials_data.get("videos", []):
+            videos.append(
+                VideoMaterial(
+                    title=video_data.get("title", ""),
+                    url=video_data.get("url", ""),
+                    description=video_data.get("description"),
+                    duration=video_data.get("duration"),
+                    channel=video_data.get("channel")
+                )
+            )
+        
+        # Преобразуем дополнительные материалы
+        additional_materials = []
+        for mat_data in materials_data.get("additional_materials", []):
+            additional_materials.append(
+                AdditionalMaterial(
+                    title=mat_data.get("title", ""),
+                    type=mat_data.get("type", "article"),
+                    url=mat_data.get("url"),
+                    description=mat_data.get("description")
+                )
+            )
+        
+        # Преобразуем термины
+        terms = []
+        for term_data in lesson_details.get("terms", []):
+            if term_data.get("term") and term_data.get("explanation"):
+                terms.append(
+                    TermExplanation(
+                        term=term_data["term"],
+                        explanation=term_data["explanation"]
+                    )
+                )
+        
+        return Lesson(
+            title=lesson_data.get("title", "Урок"),
+            content=lesson_details.get("content", ""),
+            duration_minutes=lesson_data.get("duration_minutes", 30),
+            exercises=lesson_details.get("exercises", []),
+            practice_exercises=practice_exercises,
+            videos=videos,
+            additional_materials=additional_materials,
+            terms=terms
+        )
+
+    def _build_module(self, module_data: Dict[str, Any], lessons: List[Lesson]) -> Module:
+        """Собирает модуль из готовых уроков"""
+        module_duration = sum(lesson.duration_minutes for lesson in lessons)
+        return Module(
+            title=module_data.get("title", "Модуль"),
+            description=module_data.get("description") or "",
+            lessons=lessons,
+            duration_hours=round(module_duration / 60, 1)
+        )
     
     def _determine_category(self, title: str) -> str:
         """Определяет категорию курса на основе названия"""
@@ -1,18 +1,29 @@
 """Агент для детализации уроков"""
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from typing import Dict, Any
+from app.services.llm_client import get_llm
+from app.services.llm_cache import cache_enabled_for
+from app.services.structured_output import StructuredOutputError, ainvoke_structured, astream_structured
+from app.models import LessonDetails
+from typing import AsyncIterator, Dict, Any
 import json
 import os
 
+# Элементы списков, которые отдаются по одному по мере генерации
+PARTIAL_ITEM_EVENTS = {
+    "exercises": "exercise",
+    "practice_exercises": "practice_exercise",
+    "terms": "term",
+}
+
 
 class LessonDetailAgent:
     """Агент, отвечающий за создание детального содержания уроков"""
     
-    def __init__(self, model_name: str = None, temperature: float = 0.7):
+    def __init__(self, model_name: str = None, temperature: float = 0.7, use_cache: bool | None = None):
         if model_name is None:
             model_name = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature)
+        self.llm = get_llm(model=model_name, temperature=temperature)
+        self.use_cache = cache_enabled_for(temperature, use_cache)
         self.prompt_template = ChatPromptTemplate.from_template(
             """Ты - опытный преподаватель. Создай ДЕТАЛЬНОЕ и ПОЛНОЕ содержание урока:
 
@@ -23,6 +34,9 @@ class LessonDetailAgent:
 Целевая аудитория: {target_audience}
 Краткое описание: {lesson_summary}
 
+Материалы преподавателя (опирайся на них, если они относятся к теме):
+{reference_context}
+
 ВАЖНО: Создай ПОЛНОЕ учебное содержание урока, включающее:
 1. Введение в тему урока (1-2 абзаца)
 2. Основные концепции и теория (3-4 абзаца с детальными объяснениями)
@@ -57,6 +71,25 @@ class LessonDetailAgent:
     ]
 }}"""
         )
+        self.adapt_prompt_template = ChatPromptTemplate.from_template(
+            """Ты - опытный преподаватель. Ниже готовый урок на очень близкую тему.
+Адаптируй его под новый урок: сохрани удачные объяснения и упражнения,
+но исправь все, что не соответствует названию, описанию, курсу и аудитории.
+
+Готовый урок (JSON):
+{source_lesson}
+
+Новый урок:
+Название урока: {lesson_title}
+Модуль: {module_title}
+Курс: {course_title}
+Уровень сложности: {difficulty}
+Целевая аудитория: {target_audience}
+Краткое описание: {lesson_summary}
+
+Верни ТОЛЬКО валидный JSON той же структуры (content, exercises, practice_exercises, terms)
+без дополнительных комментариев."""
+        )
     
     async def generate_lesson_details(
         self, 
@@ -65,42 +98,134 @@ class LessonDetailAgent:
         course_title: str,
         difficulty: str,
         target_audience: str,
-        lesson_summary: str
+        lesson_summary: str,
+        reference_context: str = ""
     ) -> Dict[str, Any]:
         """Генерирует детальное содержание урока"""
-        chain = self.prompt_template | self.llm
-        
-        response = await chain.ainvoke({
+        details: Dict[str, Any] = {}
+        async for event in self.stream_lesson_details(
+            lesson_title=lesson_title,
+            module_title=module_title,
+            course_title=course_title,
+            difficulty=difficulty,
+            target_audience=target_audience,
+            lesson_summary=lesson_summary,
+            reference_context=reference_context
+        ):
+            if event["event"] == "details":
+                details = event["details"]
+        return details
+
+    async def stream_lesson_details(
+        self,
+        lesson_title: str,
+        module_title: str,
+        course_title: str,
+        difficulty: str,
+        target_audience: str,
+        lesson_summary: str,
+        reference_context: str = ""
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Генерирует содержание урока потоком, отдавая части по мере готовности:
+        - content: текст урока
+        - exercise / practice_exercise / term: очередной элемент списка (с index)
+        - details: итоговое провалидированное содержание урока
+        Промежуточные части еще не проверены схемой; окончательные данные - в details.
+        Если ответ модели не удалось использовать, details - запасное содержание
+        с флагом fallback=True: такой урок не стоит сохранять для переиспользования.
+        """
+        variables = {
             "lesson_title": lesson_title,
             "module_title": module_title,
             "course_title": course_title,
             "difficulty": difficulty,
             "target_audience": target_audience,
-            "lesson_summary": lesson_summary
-        })
-        
-        content = response.content.strip()
-        
-        # Убираем markdown код блоки если есть
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
-        
+            "lesson_summary": lesson_summary,
+            "reference_context": reference_context or "Не переданы"
+        }
+        try:
+            async for path, value in astream_structured(
+                self.prompt_template,
+                self.llm,
+                variables,
+                LessonDetails,
+                agent="lesson_detail",
+                use_cache=self.use_cache,
+            ):
+                if path is None:
+                    yield {"event": "details", "details": value.model_dump()}
+                elif path == ("content",):
+                    yield {"event": "content", "content": value}
+                elif len(path) == 2 and path[0] in PARTIAL_ITEM_EVENTS:
+                    event = PARTIAL_ITEM_EVENTS[path[0]]
+                    yield {"event": event, "index": path[1], event: value}
+        except StructuredOutputError as e:
+            print(f"Ошибка разбора содержания урока: {e}")
+            yield {"event": "details", "details": self._fallback_details(lesson_title, lesson_summary)}
+
+    async def adapt_lesson_details(
+        self,
+        source_lesson: Dict[str, Any],
+        lesson_title: str,
+        module_title: str,
+        course_title: str,
+        difficulty: str,
+        target_audience: str,
+        lesson_summary: str
+    ) -> Dict[str, Any]:
+        """Адаптирует готовый урок на близкую тему вместо генерации с нуля"""
+        source = {
+            key: source_lesson.get(key)
+            for key in ("title", "content", "exercises", "practice_exercises", "terms")
+        }
+        return await self._invoke_details(
+            self.adapt_prompt_template,
+            {
+                "source_lesson": json.dumps(source, ensure_ascii=False),
+                "lesson_title": lesson_title,
+                "module_title": module_title,
+                "course_title": course_title,
+                "difficulty": difficulty,
+                "target_audience": target_audience,
+                "lesson_summary": lesson_summary
+            },
+            "lesson_adapt",
+            lesson_title,
+            lesson_summary,
+        )
+
+    async def _invoke_details(
+        self,
+        prompt_template: ChatPromptTemplate,
+        variables: Dict[str, Any],
+        agent: str,
+        lesson_title: str,
+        lesson_summary: str
+    ) -> Dict[str, Any]:
+        """Вызывает модель и валидирует ответ в LessonDetails (с запасным вариантом при ошибке)"""
         try:
-            details = json.loads(content)
-            return details
-        except json.JSONDecodeError as e:
-            print(f"Ошибка парсинга JSON урока: {e}")
-            return {
-                "content": f"Содержание урока '{lesson_title}'. {lesson_summary}",
-                "exercises": [
-                    f"Практическое упражнение 1 по теме '{lesson_title}'",
-                    f"Практическое упражнение 2 по теме '{lesson_title}'",
-                    f"Практическое упражнение 3 по теме '{lesson_title}'"
-                ]
-            }
+            details = await ainvoke_structured(
+                prompt_template,
+                self.llm,
+                variables,
+                LessonDetails,
+                agent=agent,
+                use_cache=self.use_cache,
+            )
+            return details.model_dump()
+        except StructuredOutputError as e:
+            print(f"Ошибка разбора содержания урока: {e}")
+            return self._fallback_details(lesson_title, lesson_summary)
 
+    def _fallback_details(self, lesson_title: str, lesson_summary: str) -> Dict[str, Any]:
+        """Минимальное содержание урока, если ответ модели не удалось использовать"""
+        return {
+            "fallback": True,
+            "content": f"Содержание урока '{lesson_title}'. {lesson_summary}",
+            "exercises": [
+                f"Практическое упражнение 1 по теме '{lesson_title}'",
+                f"Практическое упражнение 2 по теме '{lesson_title}'",
+                f"Практическое упражнение 3 по теме '{lesson_title}'"
+            ]
+        }
@@ -1,39 +1,29 @@
 """Агент для поиска дополнительных материалов (видео, статьи и т.д.)"""
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from app.services.llm_client import get_llm
+from app.services.llm_cache import cache_enabled_for
+from app.services.structured_output import StructuredOutputError, ainvoke_structured
+from app.models import MaterialSearchPlan
+from app.services.video_search import VideoSearchProvider, get_default_video_provider
 from typing import List, Dict, Any
 import os
-try:
-    from youtubesearchpython import VideosSearch
-except ImportError:
-    # Fallback если библиотека не установлена
-    VideosSearch = None
-import json
-
-def normalize_text(value):
-    if value is None:
-        return None
-
-    if isinstance(value, str):
-        return value
-
-    if isinstance(value, list):
-        return " ".join(
-            item.get("text", "")
-            for item in value
-            if isinstance(item, dict)
-        )
-
-    return str(value)
 
 
 class MaterialSearchAgent:
     """Агент для поиска релевантных материалов для уроков"""
     
-    def __init__(self, model_name: str = None, temperature: float = 0.7):
+    def __init__(
+        self,
+        model_name: str = None,
+        temperature: float = 0.7,
+        use_cache: bool | None = None,
+        video_provider: VideoSearchProvider | None = None
+    ):
         if model_name is None:
             model_name = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature)
+        self.llm = get_llm(model=model_name, temperature=temperature)
+        self.use_cache = cache_enabled_for(temperature, use_cache)
+        self.video_provider = video_provider or get_default_video_provider()
         self.search_prompt_template = ChatPromptTemplate.from_template(
             """Ты - эксперт по поиску образовательных материалов. 
 
@@ -67,32 +57,25 @@ class MaterialSearchAgent:
         lesson_summary: str
     ) -> Dict[str, Any]:
         """Генерирует поисковые запросы для материалов"""
-        chain = self.search_prompt_template | self.llm
-        
-        response = await chain.ainvoke({
-            "lesson_title": lesson_title,
-            "course_title": course_title,
-            "difficulty": difficulty,
-            "target_audience": target_audience,
-            "lesson_summary": lesson_summary
-        })
-        
-        content = response.content.strip()
-        
-        # Убираем markdown код блоки если есть
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
-        
         try:
-            queries = json.loads(content)
-            return queries
-        except json.JSONDecodeError as e:
-            print(f"Ошибка парсинга JSON поисковых запросов: {e}")
+            plan = await ainvoke_structured(
+                self.search_prompt_template,
+                self.llm,
+                {
+                    "lesson_title": lesson_title,
+                    "course_title": course_title,
+                    "difficulty": difficulty,
+                    "target_audience": target_audience,
+                    "lesson_summary": lesson_summary
+                },
+                MaterialSearchPlan,
+                agent="material_search",
+                use_cache=self.use_cache,
+                non_empty=("youtube_queries",),
+            )
+            return plan.model_dump()
+        except StructuredOutputError as e:
+            print(f"Ошибка разбора поисковых запросов: {e}")
             # Возвращаем базовые запросы
             return {
                 "youtube_queries": [
@@ -103,30 +86,9 @@ class MaterialSearchAgent:
                 "material_suggestions": []
             }
     
-    def search_youtube_videos(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
+    async def search_youtube_videos(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
         """Ищет видео на YouTube"""
-        if VideosSearch is None:
-            print("youtube-search-python не установлен, пропускаем поиск видео")
-            return []
-        
-        try:
-            videos_search = VideosSearch(query, limit=max_results)
-            results = videos_search.result()
-            
-            videos = []
-            for video in results.get("result", []):
-                videos.append({
-                    "title": normalize_text(video.get("title")),
-                    "url": video.get("link", ""),
-                    "description": normalize_text(video.get("descriptionSnippet")),
-                    "duration": normalize_text(video.get("duration")),
-                    "channel": normalize_text(video.get("channel", {}).get("name") if video.get("channel") else None)
-                })
-            
-            return videos
-        except Exception as e:
-            print(f"Ошибка поиска YouTube видео: {e}")
-            return []
+        return await self.video_provider.search(query, max_results=max_results)
     
     async def find_materials_for_lesson(
         self,
@@ -142,10 +104,10 @@ class MaterialSearchAgent:
             lesson_title, course_title, difficulty, target_audience, lesson_summary
         )
         
-        # Ищем видео на YouTube
+        # Ищем видео на YouTube (первые 2 запроса выполняются параллельно)
+        queries = queries_data.get("youtube_queries", [])[:2]
         all_videos = []
-        for query in queries_data.get("youtube_queries", [])[:2]:  # Берем первые 2 запроса
-            videos = self.search_youtube_videos(query, max_results=2)
+        for videos in await self.video_provider.search_many(queries, max_results=2):
             all_videos.extend(videos)
         
         # Убираем дубликаты по URL
@@ -1,18 +1,21 @@
 """Агент для генерации тестов по модулям"""
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from app.services.llm_client import get_llm
+from app.services.llm_cache import cache_enabled_for
+from app.services.structured_output import StructuredOutputError, ainvoke_structured
+from app.models import ModuleTest
 from typing import Dict, Any, List
-import json
 import os
 
 
 class TestGeneratorAgent:
     """Агент, отвечающий за создание тестов для модулей курса"""
     
-    def __init__(self, model_name: str = None, temperature: float = 0.7):
+    def __init__(self, model_name: str = None, temperature: float = 0.7, use_cache: bool | None = None):
         if model_name is None:
             model_name = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature)
+        self.llm = get_llm(model=model_name, temperature=temperature)
+        self.use_cache = cache_enabled_for(temperature, use_cache)
         self.prompt_template = ChatPromptTemplate.from_template(
             """Ты - опытный преподаватель, создающий тесты для проверки знаний студентов.
 
@@ -57,42 +60,34 @@ class TestGeneratorAgent:
         difficulty: str = "intermediate"
     ) -> Dict[str, Any]:
         """Генерирует тесты для модуля"""
-        chain = self.prompt_template | self.llm
-        
         # Формируем список уроков
         lessons_list = "\n".join([
             f"- {lesson.get('title', 'Урок')}: {lesson.get('content', '')[:100]}..."
             for lesson in lessons
         ])
         
-        response = await chain.ainvoke({
-            "course_title": course_title,
-            "module_title": module_title,
-            "module_description": module_description,
-            "lessons_list": lessons_list,
-            "difficulty": difficulty
-        })
-        
-        content = response.content.strip()
-        
-        # Убираем markdown код блоки если есть
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
-        
         try:
-            tests_data = json.loads(content)
+            module_test = await ainvoke_structured(
+                self.prompt_template,
+                self.llm,
+                {
+                    "course_title": course_title,
+                    "module_title": module_title,
+                    "module_description": module_description,
+                    "lessons_list": lessons_list,
+                    "difficulty": difficulty
+                },
+                ModuleTest,
+                agent="test_generator",
+                use_cache=self.use_cache,
+                non_empty=("tests",),
+            )
+            tests_data = module_test.model_dump()
             # Ограничиваем количество тестов до 3
-            if "tests" in tests_data and len(tests_data["tests"]) > 3:
-                tests_data["tests"] = tests_data["tests"][:3]
+            tests_data["tests"] = tests_data["tests"][:3]
             return tests_data
-        except json.JSONDecodeError as e:
-            print(f"Ошибка парсинга JSON тестов: {e}")
-            print(f"Содержимое ответа: {content}")
+        except StructuredOutputError as e:
+            print(f"Ошибка разбора тестов: {e}")
             # Возвращаем базовые тесты
             return {
                 "tests": [
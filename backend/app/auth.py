@@ -1,14 +1,18 @@
 """Authentication utilities"""
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+import asyncio
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.db_models import User
 from app.schemas import TokenData
+from app.services.user_cache import user_cache
 import os
 from dotenv import load_dotenv
 
@@ -19,12 +23,34 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production-min-3
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# Trust role/verification claims from access tokens instead of loading the user.
+# Changes to role or email verification take effect when the token is refreshed.
+AUTH_STATELESS_PRINCIPAL = os.getenv("AUTH_STATELESS_PRINCIPAL", "false").lower() in ("1", "true", "yes")
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Changing BCRYPT_ROUNDS makes existing hashes "need update": they are
+# transparently re-hashed with the new cost on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the
+# event loop and bounds how many CPU-heavy hashes run at once
+_password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash",
+)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -37,6 +63,35 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def hash_password(password: str) -> str:
+    """Hash a password on the password executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, pwd_context.hash, password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the password executor
+
+    Returns (verified, new_hash); new_hash is set when the stored hash
+    was made with outdated cost parameters and should be replaced.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+
+def principal_claims(user: User) -> dict:
+    """Claims identifying the user inside an access token"""
+    return {
+        "sub": str(user.id),
+        "email": user.email,
+        "username": user.username,
+        "role": user.role,
+        "email_verified": user.email_verified,
+    }
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -75,19 +130,81 @@ def verify_token(token: str, token_type: str = "access") -> TokenData:
         if token_type_check != token_type:
             raise credentials_exception
             
-        token_data = TokenData(user_id=user_id)
+        token_data = TokenData(
+            user_id=user_id,
+            email=payload.get("email"),
+            username=payload.get("username"),
+            role=payload.get("role"),
+            email_verified=payload.get("email_verified"),
+        )
     except JWTError:
         raise credentials_exception
     return token_data
 
 
+async def load_user(db: AsyncSession, user_id) -> Optional[User]:
+    """Load a user by id, going through the principal cache"""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
+    if user is not None:
+        user_cache.set(user)
+    return user
+
+
+def _principal_from_token(token_data: TokenData) -> Optional[User]:
+    """Build a transient user from access token claims (stateless mode)"""
+    if token_data.role is None or token_data.email_verified is None:
+        return None  # token issued before claims were added
+    return User(
+        id=token_data.user_id,
+        email=token_data.email,
+        username=token_data.username,
+        role=token_data.role,
+        email_verified=token_data.email_verified,
+    )
+
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """Get current authenticated user
+
+    In stateless mode the principal is built from token claims and only
+    carries id, email, username, role and email_verified.
+    """
+    token_data = verify_token(token, "access")
+    if AUTH_STATELESS_PRINCIPAL:
+        principal = _principal_from_token(token_data)
+        if principal is not None:
+            return principal
+    return await _require_user(db, token_data)
+
+
+async def get_optional_current_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> Optional[User]:
+    """Get current user if a bearer token was sent, None for anonymous requests"""
+    if token is None:
+        return None
+    return await get_current_user(token=token, db=db)
+
+
+async def get_current_user_record(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
-    """Get current authenticated user"""
+    """Get current authenticated user with the full profile record"""
     token_data = verify_token(token, "access")
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    return await _require_user(db, token_data)
+
+
+async def _require_user(db: AsyncSession, token_data: TokenData) -> User:
+    user = await load_user(db, token_data.user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -109,12 +226,17 @@ async def get_current_active_user(
     return current_user
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
     """Authenticate user by email and password"""
-    user = db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalar_one_or_none()
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    verified, new_hash = await verify_and_update_password(password, user.password_hash)
+    if not verified:
         return None
+    if new_hash:
+        # Persisted by the caller's commit (login updates last_login anyway)
+        user.password_hash = new_hash
     return user
 
@@ -1,6 +1,5 @@
 """Database models using SQLAlchemy"""
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Text, Float, Table
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import text, Column, String, Integer, Boolean, DateTime, ForeignKey, Text, Float, Table, JSON, UniqueConstraint, Index, Uuid
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -11,8 +10,10 @@ from app.database import Base
 course_tags = Table(
     'course_tags',
     Base.metadata,
-    Column('course_id', UUID(as_uuid=True), ForeignKey('courses.id'), primary_key=True),
-    Column('tag_id', UUID(as_uuid=True), ForeignKey('tags.id'), primary_key=True)
+    Column('course_id', Uuid(as_uuid=True), ForeignKey('courses.id'), primary_key=True),
+    Column('tag_id', Uuid(as_uuid=True), ForeignKey('tags.id'), primary_key=True),
+    # Primary key starts with course_id; tag filters need the reverse order
+    Index('ix_course_tags_tag_id_course_id', 'tag_id', 'course_id'),
 )
 
 
@@ -20,7 +21,7 @@ class User(Base):
     """User model"""
     __tablename__ = "users"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     username = Column(String(100), unique=True, index=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
@@ -44,7 +45,7 @@ class Category(Base):
     """Category model"""
     __tablename__ = "categories"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     label = Column(String(255), nullable=False, index=True)
     description = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -57,11 +58,11 @@ class Course(Base):
     """Course model"""
     __tablename__ = "courses"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     title = Column(String(255), nullable=False, index=True)
     description = Column(Text, nullable=True)
-    category_id = Column(UUID(as_uuid=True), ForeignKey('categories.id'), nullable=True)
-    created_by = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
+    category_id = Column(Uuid(as_uuid=True), ForeignKey('categories.id'), nullable=True)
+    created_by = Column(Uuid(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
     
     format = Column(String(50), nullable=True)
     level = Column(String(50), nullable=True)
@@ -77,6 +78,11 @@ class Course(Base):
     
     published_at = Column(DateTime(timezone=True), nullable=True)
     views = Column(Integer, default=0, nullable=False)
+
+    # Generated course data
+    total_duration_hours = Column(Float, nullable=True)
+    lessons_count = Column(Integer, default=0, server_default='0', nullable=False)  # для progress_percent без пересчета
+    learning_objectives = Column(JSON, nullable=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -89,16 +95,25 @@ class Course(Base):
     tags = relationship("Tag", secondary=course_tags, back_populates="courses")
     discussions = relationship("Discussion", back_populates="course", cascade="all, delete-orphan")
 
+    # Catalog indexes: equality filters first, then the keyset sort key (created_at, id)
+    __table_args__ = (
+        Index('ix_courses_catalog_public', 'is_public', 'created_at', 'id'),
+        Index('ix_courses_catalog_category', 'category_id', 'is_public', 'created_at', 'id'),
+        Index('ix_courses_catalog_level', 'level', 'is_public', 'created_at', 'id'),
+        Index('ix_courses_catalog_creator', 'created_by', 'created_at', 'id'),
+    )
+
 
 class CourseModule(Base):
     """Course module model"""
     __tablename__ = "course_modules"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    course_id = Column(UUID(as_uuid=True), ForeignKey('courses.id'), nullable=False, index=True)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    course_id = Column(Uuid(as_uuid=True), ForeignKey('courses.id'), nullable=False, index=True)
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     order = Column(Integer, nullable=False, default=0)
+    duration_hours = Column(Float, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # Relationships
@@ -110,28 +125,98 @@ class Lesson(Base):
     """Lesson model"""
     __tablename__ = "lessons"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    module_id = Column(UUID(as_uuid=True), ForeignKey('course_modules.id'), nullable=False, index=True)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    module_id = Column(Uuid(as_uuid=True), ForeignKey('course_modules.id'), nullable=False, index=True)
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=True)
     duration_minutes = Column(Integer, nullable=True)
     order = Column(Integer, nullable=False, default=0)
+    exercises = Column(JSON, nullable=True)  # короткие упражнения (список строк)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # Relationships
     module = relationship("CourseModule", back_populates="lessons")
     student_progress = relationship("StudentProgress", back_populates="lesson", cascade="all, delete-orphan")
+    videos = relationship("LessonVideo", back_populates="lesson", cascade="all, delete-orphan", order_by="LessonVideo.order")
+    practice_exercises = relationship("LessonPracticeExercise", back_populates="lesson", cascade="all, delete-orphan", order_by="LessonPracticeExercise.order")
+    additional_materials = relationship("LessonMaterial", back_populates="lesson", cascade="all, delete-orphan", order_by="LessonMaterial.order")
+    terms = relationship("LessonTerm", back_populates="lesson", cascade="all, delete-orphan", order_by="LessonTerm.order")
+
+
+class LessonVideo(Base):
+    """Recommended video for a lesson"""
+    __tablename__ = "lesson_videos"
+
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    lesson_id = Column(Uuid(as_uuid=True), ForeignKey('lessons.id'), nullable=False, index=True)
+    title = Column(String(500), nullable=False)
+    url = Column(String(500), nullable=False)
+    description = Column(Text, nullable=True)
+    duration = Column(String(50), nullable=True)
+    channel = Column(String(255), nullable=True)
+    order = Column(Integer, nullable=False, default=0)
+
+    # Relationships
+    lesson = relationship("Lesson", back_populates="videos")
+
+
+class LessonPracticeExercise(Base):
+    """Practice exercise attached to a lesson"""
+    __tablename__ = "lesson_practice_exercises"
+
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    lesson_id = Column(Uuid(as_uuid=True), ForeignKey('lessons.id'), nullable=False, index=True)
+    title = Column(String(255), nullable=False)
+    description = Column(Text, nullable=False)
+    difficulty = Column(String(20), default='medium', nullable=False)  # easy, medium, hard
+    estimated_time = Column(String(100), nullable=True)
+    solution_hint = Column(Text, nullable=True)
+    order = Column(Integer, nullable=False, default=0)
+
+    # Relationships
+    lesson = relationship("Lesson", back_populates="practice_exercises")
+
+
+class LessonMaterial(Base):
+    """Additional material (article, book, website) for a lesson"""
+    __tablename__ = "lesson_materials"
+
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    lesson_id = Column(Uuid(as_uuid=True), ForeignKey('lessons.id'), nullable=False, index=True)
+    title = Column(String(500), nullable=False)
+    type = Column(String(50), nullable=False)
+    url = Column(String(500), nullable=True)
+    description = Column(Text, nullable=True)
+    order = Column(Integer, nullable=False, default=0)
+
+    # Relationships
+    lesson = relationship("Lesson", back_populates="additional_materials")
+
+
+class LessonTerm(Base):
+    """Term explanation (wiki-style) for a lesson"""
+    __tablename__ = "lesson_terms"
+
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    lesson_id = Column(Uuid(as_uuid=True), ForeignKey('lessons.id'), nullable=False, index=True)
+    term = Column(String(255), nullable=False)
+    explanation = Column(Text, nullable=False)
+    order = Column(Integer, nullable=False, default=0)
+
+    # Relationships
+    lesson = relationship("Lesson", back_populates="terms")
 
 
 class Enrollment(Base):
     """Enrollment model - связь пользователя с курсом"""
     __tablename__ = "enrollments"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
-    course_id = Column(UUID(as_uuid=True), ForeignKey('courses.id'), nullable=False, index=True)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    user_id = Column(Uuid(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
+    course_id = Column(Uuid(as_uuid=True), ForeignKey('courses.id'), nullable=False, index=True)
     enrolled_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     progress_percent = Column(Integer, default=0, nullable=False)
+    completed_lessons_count = Column(Integer, default=0, server_default='0', nullable=False)
     last_accessed_at = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
 
@@ -142,6 +227,7 @@ class Enrollment(Base):
 
     # Unique constraint
     __table_args__ = (
+        UniqueConstraint('user_id', 'course_id', name='uq_enrollment_user_course'),
         {'sqlite_autoincrement': True},
     )
 
@@ -150,11 +236,12 @@ class StudentProgress(Base):
     """Student progress model - прогресс по урокам"""
     __tablename__ = "student_progress"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    enrollment_id = Column(UUID(as_uuid=True), ForeignKey('enrollments.id'), nullable=False, index=True)
-    lesson_id = Column(UUID(as_uuid=True), ForeignKey('lessons.id'), nullable=False, index=True)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    enrollment_id = Column(Uuid(as_uuid=True), ForeignKey('enrollments.id'), nullable=False, index=True)
+    lesson_id = Column(Uuid(as_uuid=True), ForeignKey('lessons.id'), nullable=False, index=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     time_spent_minutes = Column(Integer, default=0, nullable=False)
+    time_spent_seconds = Column(Integer, default=0, server_default='0', nullable=False)  # точный учет heartbeat
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # Relationships
@@ -163,6 +250,7 @@ class StudentProgress(Base):
 
     # Unique constraint
     __table_args__ = (
+        UniqueConstraint('enrollment_id', 'lesson_id', name='uq_progress_enrollment_lesson'),
         {'sqlite_autoincrement': True},
     )
 
@@ -171,7 +259,7 @@ class Tag(Base):
     """Tag model"""
     __tablename__ = "tags"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String(100), unique=True, nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
@@ -183,9 +271,9 @@ class Discussion(Base):
     """Discussion model"""
     __tablename__ = "discussions"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    course_id = Column(UUID(as_uuid=True), ForeignKey('courses.id'), nullable=False, index=True)
-    author_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    course_id = Column(Uuid(as_uuid=True), ForeignKey('courses.id'), nullable=False, index=True)
+    author_id = Column(Uuid(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=False)
     likes_count = Column(Integer, default=0, nullable=False)
@@ -203,9 +291,9 @@ class DiscussionReply(Base):
     """Discussion reply model"""
     __tablename__ = "discussion_replies"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    discussion_id = Column(UUID(as_uuid=True), ForeignKey('discussions.id'), nullable=False, index=True)
-    author_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    discussion_id = Column(Uuid(as_uuid=True), ForeignKey('discussions.id'), nullable=False, index=True)
+    author_id = Column(Uuid(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
     content = Column(Text, nullable=False)
     likes_count = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -215,3 +303,89 @@ class DiscussionReply(Base):
     discussion = relationship("Discussion", back_populates="replies")
     author = relationship("User", back_populates="discussion_replies")
 
+
+class CourseGenerationJob(Base):
+    """Course generation job - фоновая генерация курса с чекпоинтами по урокам"""
+    __tablename__ = "course_generation_jobs"
+
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    batch_id = Column(Uuid(as_uuid=True), nullable=True, index=True)
+    created_by = Column(Uuid(as_uuid=True), ForeignKey('users.id'), nullable=True, index=True)
+    status = Column(String(20), default='queued', nullable=False, index=True)  # queued, running, completed, failed
+    request = Column(JSON, nullable=False)  # CourseGenerationRequest
+    structure = Column(JSON, nullable=True)  # checkpoint структуры курса
+    result = Column(JSON, nullable=True)  # итоговый Course
+    error = Column(Text, nullable=True)
+    lessons_total = Column(Integer, default=0, nullable=False)
+    lessons_completed = Column(Integer, default=0, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    locked_by = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relationships
+    lessons = relationship("CourseGenerationJobLesson", back_populates="job", cascade="all, delete-orphan")
+
+
+class CourseGenerationJobLesson(Base):
+    """Checkpoint of a generated lesson inside a course generation job"""
+    __tablename__ = "course_generation_job_lessons"
+
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    job_id = Column(Uuid(as_uuid=True), ForeignKey('course_generation_jobs.id'), nullable=False, index=True)
+    module_index = Column(Integer, nullable=False)
+    lesson_index = Column(Integer, nullable=False)
+    result = Column(JSON, nullable=False)  # сгенерированный Lesson
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    # Relationships
+    job = relationship("CourseGenerationJob", back_populates="lessons")
+
+    __table_args__ = (
+        UniqueConstraint('job_id', 'module_index', 'lesson_index', name='uq_job_lesson_position'),
+    )
+
+
+# Full-text search indexes (PostgreSQL only; SQLite uses the in-memory index
+# from app/services/search.py). Queries must build the indexed expressions with
+# search_vector() so the planner can match them to these indexes.
+SEARCH_CONFIGS = ("russian", "english")
+
+
+def search_vector(config: str, *columns):
+    """to_tsvector('<config>', coalesce(col1, '') || ' ' || coalesce(col2, '') ...)"""
+    document = None
+    for column in columns:
+        part = func.coalesce(column, text("''"))
+        document = part if document is None else document.op("||")(text("' '")).op("||")(part)
+    return func.to_tsvector(text(f"'{config}'"), document)
+
+
+for _config in SEARCH_CONFIGS:
+    Index(
+        f'ix_courses_search_{_config}',
+        search_vector(_config, Course.title, Course.description),
+        postgresql_using='gin',
+    ).ddl_if(dialect='postgresql')
+    Index(
+        f'ix_lessons_search_{_config}',
+        search_vector(_config, Lesson.title, Lesson.content),
+        postgresql_using='gin',
+    ).ddl_if(dialect='postgresql')
+    Index(
+        f'ix_lesson_terms_search_{_config}',
+        search_vector(_config, LessonTerm.term, LessonTerm.explanation),
+        postgresql_using='gin',
+    ).ddl_if(dialect='postgresql')
+
+# Trigram indexes for substring / typo-tolerant matches on short fields (pg_trgm)
+Index(
+    'ix_courses_title_trgm', Course.title,
+    postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'},
+).ddl_if(dialect='postgresql')
+Index(
+    'ix_lesson_terms_term_trgm', LessonTerm.term,
+    postgresql_using='gin', postgresql_ops={'term': 'gin_trgm_ops'},
+).ddl_if(dialect='postgresql')
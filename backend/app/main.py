@@ -1,13 +1,18 @@
 """FastAPI приложение для генерации курсов"""
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from app.models import (
     CourseGenerationRequest,
     CourseGenerationResponse,
     CourseSettings,
+    Course,
     ExerciseCheckRequest,
     ExerciseCheckResponse,
     ExerciseCheckResult,
+    ExerciseBatchCheckRequest,
+    ExerciseBatchCheckResponse,
+    ExerciseBatchItem,
     AssistantChatRequest,
     AssistantChatResponse,
     ModuleTestRequest,
@@ -15,13 +20,27 @@ from app.models import (
     ModuleTest,
     TestQuestion,
     CourseStructureResponse,
+    LessonPosition,
+    LessonRegenerationRequest,
+    ModuleRegenerationRequest,
 )
 from app.agents.course_coordinator import CourseCoordinator
 from app.agents.grading_agent import ExerciseGradingAgent
 from app.agents.assistant_agent import PersonalAssistantAgent
 from app.agents.test_generator_agent import TestGeneratorAgent
-from app.routers import auth
+from app.auth import get_optional_current_user
+from app.db_models import User
+from app.routers import auth, courses, jobs, progress, search
+from app.services.llm_cache import get_llm_cache
+from app.services.llm_client import llm_registry
+from app.services.structured_output import structured_output_stats
+from app.services.counters import counters
+from app.services.job_queue import CourseJobQueue
+from app.services.rate_limiter import QueueFullError, get_llm_scheduler
 from app.database import engine, Base
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
 
@@ -52,11 +71,63 @@ grading_agent = ExerciseGradingAgent()
 assistant_agent = PersonalAssistantAgent()
 test_generator = TestGeneratorAgent()
 
-# Include routers
-app.include_router(auth.router)
+# Сколько курсов пакета генерируется одновременно
+BATCH_MAX_CONCURRENT_COURSES = int(os.getenv("BATCH_MAX_CONCURRENT_COURSES", "3"))
+
+# Очередь фоновой генерации курсов (задачи хранятся в БД)
+job_queue = CourseJobQueue(coordinator)
 
 # Include routers
 app.include_router(auth.router)
+app.include_router(jobs.router)
+app.include_router(courses.router)
+app.include_router(search.router)
+app.include_router(progress.router)
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    """Запускает воркеры очереди генерации курсов и фоновый сброс счетчиков"""
+    if job_queue.workers > 0:
+        await job_queue.start()
+    await counters.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_background_services():
+    """Останавливает воркеры (незавершенные задачи возвращаются в очередь), сбрасывает счетчики и закрывает пул LLM-клиента"""
+    await job_queue.stop()
+    await counters.stop()
+    await llm_registry.aclose()
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    """Backpressure: очередь к модели переполнена - просим клиента повторить позже"""
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "error": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _sse_event(event: str, data: Any) -> str:
+    """Форматирует событие Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _describe_generation_error(e: Exception) -> str:
+    """Переводит ошибку генерации в понятное пользователю сообщение"""
+    error_msg = str(e)
+    print(f"Ошибка при генерации курса: {error_msg}")
+    
+    # Более детальная обработка ошибок
+    if "model" in error_msg.lower() and ("not found" in error_msg.lower() or "does not exist" in error_msg.lower()):
+        current_model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+        error_msg = f"Модель '{current_model}' недоступна. Проверьте OPENAI_MODEL в .env файле. Попробуйте: gpt-3.5-turbo, gpt-4o, gpt-4o-mini"
+    elif "api key" in error_msg.lower() or "authentication" in error_msg.lower():
+        error_msg = "Неверный API ключ OpenAI. Проверьте OPENAI_API_KEY в .env файле."
+    return error_msg
 
 
 @app.get("/")
@@ -78,15 +149,80 @@ async def health_check():
     }
 
 
+@app.get("/api/ai/scheduler/stats")
+async def llm_scheduler_stats():
+    """Состояние лимитов обращений к LLM по моделям"""
+    return get_llm_scheduler().stats()
+
+
+@app.get("/api/counters/stats")
+async def counters_stats():
+    """Состояние буфера счетчиков: ожидающие инкременты и задержка записи"""
+    return counters.stats()
+
+
+@app.get("/api/ai/cache/stats")
+async def llm_cache_stats():
+    """Статистика кэша ответов LLM (попадания/промахи по агентам)"""
+    return get_llm_cache().stats()
+
+
+@app.get("/api/ai/structured-output/stats")
+async def structured_output_stats_endpoint():
+    """Доля ответов LLM, не прошедших схему с первого раза, и исправлений по агентам"""
+    return structured_output_stats.stats()
+
+
+@app.get("/api/ai/assistant/memory/stats")
+async def assistant_memory_stats():
+    """Статистика памяти диалогов ассистента (окно истории и кэш сводок)"""
+    return assistant_agent.memory.stats()
+
+
+@app.get("/api/ai/lesson-results/stats")
+async def lesson_results_stats():
+    """Статистика хранилища готовых уроков (доля уроков, не сгенерированных повторно)"""
+    if coordinator.lesson_results is None:
+        return {"enabled": False}
+    return {"enabled": True, **coordinator.lesson_results.stats()}
+
+
+@app.get("/api/ai/lesson-reuse/stats")
+async def lesson_reuse_stats():
+    """Статистика переиспользования похожих уроков (доля, близость, сэкономленное время)"""
+    if coordinator.lesson_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **coordinator.lesson_index.stats()}
+
+
+def _require_job_owner(background: bool, current_user: Optional[User]) -> None:
+    """Фоновые задачи привязываются к автору - без токена их некому было бы показать"""
+    if background and current_user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Фоновая генерация требует авторизации",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
 @app.post("/api/courses/generate", response_model=CourseGenerationResponse)
-async def generate_course(request: CourseGenerationRequest):
+async def generate_course(
+    request: CourseGenerationRequest,
+    background: bool = False,
+    current_user: Optional[User] = Depends(get_optional_current_user),
+):
     """
     Генерирует курс на основе настроек от фронтенда
     
     Использует мультиагентную систему:
     1. CourseStructureAgent - создает структуру курса (модули и уроки)
     2. LessonDetailAgent - детализирует содержание каждого урока
+
+    С параметром background=true курс ставится в очередь фоновой генерации,
+    в ответе возвращается job_id для опроса через /api/jobs/{job_id}.
+    Фоновая генерация требует токена: статус задачи доступен только ее автору.
     """
+    _require_job_owner(background, current_user)
     try:
         # Проверяем наличие API ключа OpenAI
         api_key = os.getenv("OPENAI_API_KEY")
@@ -99,13 +235,24 @@ async def generate_course(request: CourseGenerationRequest):
         # Проверяем модель
         model_name = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
         print(f"Используется модель: {model_name}")
+
+        if not background:
+            get_llm_scheduler().ensure_capacity(model_name)
         
+        if background:
+            job_id = await job_queue.enqueue(request, created_by=current_user.id)
+            return CourseGenerationResponse(
+                success=True,
+                job_id=str(job_id),
+                message="Генерация курса поставлена в очередь"
+            )
+
         # Пробрасываем дополнительные файлы в настройки
         if request.reference_files and not request.settings.reference_files:
             request.settings.reference_files = request.reference_files
 
         # Генерируем курс используя мультиагентную систему
-        course = await coordinator.generate_course(
+        course, reused_lessons = await coordinator.generate_course_with_reuse(
             settings=request.settings,
             structure_override=request.structure_override,
         )
@@ -113,47 +260,140 @@ async def generate_course(request: CourseGenerationRequest):
         return CourseGenerationResponse(
             success=True,
             course=course,
+            reused_lessons=[
+                LessonPosition(module_index=module_index, lesson_index=lesson_index)
+                for module_index, lesson_index in reused_lessons
+            ],
             message="Курс успешно сгенерирован"
         )
     
+    except QueueFullError:
+        raise
     except Exception as e:
-        error_msg = str(e)
-        print(f"Ошибка при генерации курса: {error_msg}")
-        
-        # Более детальная обработка ошибок
-        if "model" in error_msg.lower() and ("not found" in error_msg.lower() or "does not exist" in error_msg.lower()):
-            current_model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-            error_msg = f"Модель '{current_model}' недоступна. Проверьте OPENAI_MODEL в .env файле. Попробуйте: gpt-3.5-turbo, gpt-4o, gpt-4o-mini"
-        elif "api key" in error_msg.lower() or "authentication" in error_msg.lower():
-            error_msg = "Неверный API ключ OpenAI. Проверьте OPENAI_API_KEY в .env файле."
-        
         return CourseGenerationResponse(
             success=False,
-            error=f"Ошибка при генерации курса: {error_msg}"
+            error=f"Ошибка при генерации курса: {_describe_generation_error(e)}"
         )
 
 
+@app.post("/api/courses/generate/stream")
+async def generate_course_stream(request: CourseGenerationRequest):
+    """
+    Потоковая генерация курса (Server-Sent Events).
+
+    События:
+    - structure: структура курса сразу после CourseStructureAgent
+    - lesson_partial: часть урока по мере генерации (part: content | exercise |
+      practice_exercise | term, индексы модуля и урока, значение)
+    - lesson: каждый готовый урок с индексами модуля и урока
+      (reused=true - урок не изменился и взят из хранилища готовых уроков)
+    - course: итоговый курс
+    - error: ошибка генерации (поток после нее закрывается)
+    """
+    if request.reference_files and not request.settings.reference_files:
+        request.settings.reference_files = request.reference_files
+
+    # Admission control до начала потока: после него статус 429 уже не отправить
+    get_llm_scheduler().ensure_capacity(os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"))
+
+    async def event_stream():
+        if not os.getenv("OPENAI_API_KEY"):
+            yield _sse_event("error", {"error": "OPENAI_API_KEY не установлен в переменных окружения"})
+            return
+
+        try:
+            async for event in coordinator.generate_course_events(
+                settings=request.settings,
+                structure_override=request.structure_override,
+                partial_lessons=True,
+            ):
+                if event["event"] == "structure":
+                    yield _sse_event("structure", event["structure"])
+                elif event["event"] == "lesson_partial":
+                    yield _sse_event("lesson_partial", {
+                        key: value for key, value in event.items() if key != "event"
+                    })
+                elif event["event"] == "lesson":
+                    yield _sse_event("lesson", {
+                        "module_index": event["module_index"],
+                        "lesson_index": event["lesson_index"],
+                        "lesson": event["lesson"].model_dump(mode="json"),
+                        "reused": event["reused"],
+                    })
+                elif event["event"] == "course":
+                    yield _sse_event("course", event["course"].model_dump(mode="json"))
+        except Exception as e:
+            yield _sse_event("error", {"error": f"Ошибка при генерации курса: {_describe_generation_error(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/api/courses/generate/batch")
-async def generate_courses_batch(requests: list[CourseGenerationRequest]):
+async def generate_courses_batch(
+    requests: list[CourseGenerationRequest],
+    background: bool = False,
+    current_user: Optional[User] = Depends(get_optional_current_user),
+):
     """
     Генерирует несколько курсов параллельно
+
+    С параметром background=true курсы ставятся в очередь фоновой генерации,
+    статус пакета доступен автору через /api/jobs/batch/{batch_id} (нужен токен).
     """
+    _require_job_owner(background, current_user)
     try:
-        import asyncio
-        
-        tasks = [
-            coordinator.generate_course(req.settings)
-            for req in requests
-        ]
-        
-        courses = await asyncio.gather(*tasks)
+        if background:
+            batch_id, job_ids = await job_queue.enqueue_many(requests, created_by=current_user.id)
+            return {
+                "success": True,
+                "batch_id": str(batch_id),
+                "job_ids": [str(job_id) for job_id in job_ids],
+                "count": len(job_ids)
+            }
+
+        # Admission control: не принимаем пакет, если очередь к модели уже забита
+        get_llm_scheduler().ensure_capacity(
+            os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"),
+            extra=min(len(requests), BATCH_MAX_CONCURRENT_COURSES),
+        )
+
+        semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENT_COURSES)
+
+        async def generate_one(index: int, req: CourseGenerationRequest) -> dict:
+            async with semaphore:
+                try:
+                    if req.reference_files and not req.settings.reference_files:
+                        req.settings.reference_files = req.reference_files
+                    course = await coordinator.generate_course(
+                        req.settings,
+                        structure_override=req.structure_override,
+                    )
+                    return {"index": index, "success": True, "course": course.model_dump()}
+                except QueueFullError as e:
+                    return {"index": index, "success": False, "error": str(e), "retry_after": e.retry_after}
+                except Exception as e:
+                    return {"index": index, "success": False, "error": _describe_generation_error(e)}
+
+        # Ошибка одного курса не валит весь пакет
+        results = await asyncio.gather(*[
+            generate_one(index, req) for index, req in enumerate(requests)
+        ])
+        courses = [result["course"] for result in results if result["success"]]
         
         return {
-            "success": True,
-            "courses": [course.model_dump() for course in courses],
-            "count": len(courses)
+            "success": bool(courses) or not requests,
+            "courses": courses,
+            "results": results,
+            "count": len(courses),
+            "failed": len(results) - len(courses)
         }
     
+    except QueueFullError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -161,6 +401,85 @@ async def generate_courses_batch(requests: list[CourseGenerationRequest]):
         )
 
 
+@app.post("/api/courses/regenerate/lesson", response_model=CourseGenerationResponse)
+async def regenerate_lesson(request: LessonRegenerationRequest):
+    """
+    Перегенерирует один урок переданного курса (текст, упражнения и материалы).
+
+    Остальные уроки возвращаются без изменений - агенты вызываются только для
+    этого урока. В lesson_plan можно передать новые название и описание урока.
+    """
+    return await _regenerate(
+        lambda: coordinator.regenerate_lesson(
+            settings=request.settings,
+            course=request.course,
+            module_index=request.module_index,
+            lesson_index=request.lesson_index,
+            lesson_plan=request.lesson_plan.model_dump(exclude_unset=True) if request.lesson_plan else None,
+        ),
+        "Урок перегенерирован",
+    )
+
+
+@app.post("/api/courses/regenerate/lesson/materials", response_model=CourseGenerationResponse)
+async def regenerate_lesson_materials(request: LessonRegenerationRequest):
+    """
+    Заново подбирает видео и дополнительные материалы одного урока.
+    Текст и упражнения урока сохраняются, LessonDetailAgent не вызывается.
+    """
+    return await _regenerate(
+        lambda: coordinator.regenerate_lesson(
+            settings=request.settings,
+            course=request.course,
+            module_index=request.module_index,
+            lesson_index=request.lesson_index,
+            lesson_plan=request.lesson_plan.model_dump(exclude_unset=True) if request.lesson_plan else None,
+            materials_only=True,
+        ),
+        "Материалы урока обновлены",
+    )
+
+
+@app.post("/api/courses/regenerate/module", response_model=CourseGenerationResponse)
+async def regenerate_module(request: ModuleRegenerationRequest):
+    """
+    Перегенерирует уроки одного модуля переданного курса (параллельно).
+    С module_plan модуль строится по новой структуре; остальные модули не меняются.
+    """
+    return await _regenerate(
+        lambda: coordinator.regenerate_module(
+            settings=request.settings,
+            course=request.course,
+            module_index=request.module_index,
+            module_plan=request.module_plan.model_dump(exclude_unset=True) if request.module_plan else None,
+        ),
+        "Модуль перегенерирован",
+    )
+
+
+async def _regenerate(regenerate: Callable[[], Awaitable[Course]], message: str) -> CourseGenerationResponse:
+    """Общая обработка частичной перегенерации курса"""
+    try:
+        if not os.getenv("OPENAI_API_KEY"):
+            return CourseGenerationResponse(
+                success=False,
+                error="OPENAI_API_KEY не установлен в переменных окружения"
+            )
+        get_llm_scheduler().ensure_capacity(os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"))
+        course = await regenerate()
+        return CourseGenerationResponse(success=True, course=course, message=message)
+    except QueueFullError:
+        raise
+    except ValueError as e:
+        # Неверный индекс модуля или урока
+        return CourseGenerationResponse(success=False, error=str(e))
+    except Exception as e:
+        return CourseGenerationResponse(
+            success=False,
+            error=f"Ошибка при перегенерации: {_describe_generation_error(e)}"
+        )
+
+
 @app.post("/api/ai/grade-exercise", response_model=ExerciseCheckResponse)
 async def grade_exercise(request: ExerciseCheckRequest):
     """
@@ -173,32 +492,110 @@ async def grade_exercise(request: ExerciseCheckRequest):
         result_data = await grading_agent.grade_exercise(request.model_dump())
         result = ExerciseCheckResult(**result_data)
         return ExerciseCheckResponse(success=True, result=result)
+    except QueueFullError:
+        raise
     except Exception as e:
         return ExerciseCheckResponse(success=False, error=str(e))
 
 
+@app.post("/api/ai/grade-exercise/batch", response_model=ExerciseBatchCheckResponse)
+async def grade_exercise_batch(request: ExerciseBatchCheckRequest):
+    """
+    Пакетная проверка многих ответов на одно задание (например, всей группы).
+
+    Ответы упаковываются по несколько в один запрос к модели (в пределах
+    GRADING_BATCH_TOKEN_BUDGET токенов), описание задания передается один раз
+    на пакет. Результат возвращается по каждому ответу в порядке запроса;
+    ошибка проверки одного ответа или пакета не отменяет остальные.
+    """
+    try:
+        answers = [answer.user_answer for answer in request.answers]
+        packs = grading_agent.pack_answers(answers)
+        # Один вызов модели на пакет: очередь должна вместить их все
+        get_llm_scheduler().ensure_capacity(os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"), extra=len(packs))
+        outcomes = await grading_agent.grade_exercise_batch(
+            request.model_dump(exclude={"answers"}),
+            answers,
+            packs=packs,
+        )
+    except QueueFullError:
+        raise
+    except Exception as e:
+        return ExerciseBatchCheckResponse(success=False, error=str(e))
+
+    results = [
+        ExerciseBatchItem(id=answer.id, success=True, result=outcome)
+        if isinstance(outcome, ExerciseCheckResult)
+        else ExerciseBatchItem(id=answer.id, success=False, error=str(outcome))
+        for answer, outcome in zip(request.answers, outcomes)
+    ]
+    graded = sum(1 for item in results if item.success)
+    return ExerciseBatchCheckResponse(
+        success=graded > 0,
+        results=results,
+        graded=graded,
+        failed=len(results) - graded,
+    )
+
+
 @app.post("/api/ai/assistant/chat", response_model=AssistantChatResponse)
-async def assistant_chat(request: AssistantChatRequest):
+async def assistant_chat(request: AssistantChatRequest, http_request: Request, stream: bool = False):
     """
     Личный ИИ-ассистент / болталка с доступом к базовому контексту пользователя.
 
     Фронтенд может передать:
     - user_context (имя, цели, текущие курсы)
     - history (предыдущие сообщения диалога)
+    - conversation_id (чтобы сводка ранней части диалога бралась из кэша)
+
+    С параметром stream=true (или заголовком Accept: text/event-stream) ответ
+    отдается потоком Server-Sent Events:
+    - token: очередной фрагмент ответа по мере генерации
+    - done: полный текст ответа
+    - error: ошибка (поток после нее закрывается)
+    При отключении клиента запрос к модели отменяется.
     """
-    try:
-        history = [
-            {"role": msg.role, "content": msg.content}
-            for msg in (request.history or [])
-        ]
-        user_context = request.user_context.model_dump() if request.user_context else None
+    history = [
+        {"role": msg.role, "content": msg.content}
+        for msg in (request.history or [])
+    ]
+    user_context = request.user_context.model_dump() if request.user_context else None
+
+    if stream or "text/event-stream" in http_request.headers.get("accept", ""):
+        # Admission control до начала потока: после него статус 429 уже не отправить
+        get_llm_scheduler().ensure_capacity(assistant_agent.model_name)
+
+        async def event_stream():
+            parts = []
+            try:
+                async for chunk in assistant_agent.chat_stream(
+                    message=request.message,
+                    user_context=user_context,
+                    history=history,
+                    conversation_id=request.conversation_id,
+                ):
+                    parts.append(chunk)
+                    yield _sse_event("token", {"text": chunk})
+                yield _sse_event("done", {"reply": "".join(parts).strip()})
+            except Exception as e:
+                yield _sse_event("error", {"error": str(e)})
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
+    try:
         reply = await assistant_agent.chat(
             message=request.message,
             user_context=user_context,
             history=history,
+            conversation_id=request.conversation_id,
         )
         return AssistantChatResponse(success=True, reply=reply)
+    except QueueFullError:
+        raise
     except Exception as e:
         return AssistantChatResponse(success=False, error=str(e))
 
@@ -250,6 +647,8 @@ async def generate_module_test(request: ModuleTestRequest):
             test=module_test,
         )
     
+    except QueueFullError:
+        raise
     except Exception as e:
         error_msg = str(e)
         print(f"Ошибка при генерации теста: {error_msg}")
@@ -286,6 +685,8 @@ async def preview_course_structure(request: CourseGenerationRequest):
             success=True,
             structure=structure
         )
+    except QueueFullError:
+        raise
     except Exception as e:
         error_msg = str(e)
         print(f"Ошибка при генерации структуры курса: {error_msg}")
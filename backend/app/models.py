@@ -64,6 +64,20 @@ class TermExplanation(BaseModel):
     explanation: str
 
 
+class LessonDetails(BaseModel):
+    """Детальное содержание урока (ответ LessonDetailAgent)"""
+    content: str
+    exercises: List[str] = Field(default_factory=list)
+    practice_exercises: List[PracticeExercise] = Field(default_factory=list)
+    terms: List[TermExplanation] = Field(default_factory=list)
+
+
+class MaterialSearchPlan(BaseModel):
+    """Поисковые запросы и предложения материалов (ответ MaterialSearchAgent)"""
+    youtube_queries: List[str] = Field(default_factory=list)
+    material_suggestions: List[AdditionalMaterial] = Field(default_factory=list)
+
+
 class Lesson(BaseModel):
     """Урок"""
     title: str
@@ -130,14 +144,65 @@ class CourseGenerationRequest(BaseModel):
     )
 
 
+class LessonPosition(BaseModel):
+    """Позиция урока в курсе"""
+    module_index: int
+    lesson_index: int
+
+
 class CourseGenerationResponse(BaseModel):
     """Ответ с сгенерированным курсом"""
     success: bool
     course: Optional[Course] = None
+    reused_lessons: List[LessonPosition] = Field(
+        default_factory=list,
+        description="Уроки, взятые из хранилища готовых уроков (входные данные не изменились)",
+    )
+    job_id: Optional[str] = Field(None, description="ID задачи при фоновой генерации")
     error: Optional[str] = None
     message: Optional[str] = None
 
 
+class LessonPlanPatch(BaseModel):
+    """Изменения урока при перегенерации: непереданные поля берутся из текущего урока"""
+    title: Optional[str] = None
+    content: Optional[str] = Field(None, description="Краткое описание урока")
+    duration_minutes: Optional[int] = Field(None, ge=1)
+
+
+class ModulePlanPatch(BaseModel):
+    """Изменения модуля при перегенерации: непереданные поля берутся из текущего модуля"""
+    title: Optional[str] = None
+    description: Optional[str] = None
+    lessons: Optional[List[LessonPlan]] = Field(
+        None,
+        min_length=1,
+        description="Полная новая структура уроков модуля (заменяет текущие уроки); "
+                    "не передано - перегенерируются текущие уроки",
+    )
+
+
+class LessonRegenerationRequest(BaseModel):
+    """Запрос на перегенерацию одного урока готового курса"""
+    settings: CourseSettings
+    course: Course
+    module_index: int = Field(..., ge=0, description="Индекс модуля в course.modules")
+    lesson_index: int = Field(..., ge=0, description="Индекс урока в модуле")
+    lesson_plan: Optional[LessonPlanPatch] = Field(
+        None, description="Новые название, описание или длительность урока (по умолчанию текущие)"
+    )
+
+
+class ModuleRegenerationRequest(BaseModel):
+    """Запрос на перегенерацию одного модуля готового курса"""
+    settings: CourseSettings
+    course: Course
+    module_index: int = Field(..., ge=0, description="Индекс модуля в course.modules")
+    module_plan: Optional[ModulePlanPatch] = Field(
+        None, description="Новые название, описание или уроки модуля (по умолчанию текущие)"
+    )
+
+
 class ExerciseCheckRequest(BaseModel):
     """Запрос на проверку практического задания ИИ"""
     course_title: str
@@ -164,6 +229,49 @@ class ExerciseCheckResponse(BaseModel):
     error: Optional[str] = None
 
 
+class ExerciseAnswer(BaseModel):
+    """Ответ одного студента для пакетной проверки"""
+    id: str = Field(..., description="ID ответа на стороне клиента")
+    user_answer: str
+
+
+class ExerciseBatchCheckRequest(BaseModel):
+    """Запрос на проверку многих ответов на одно задание"""
+    course_title: str
+    lesson_title: str
+    exercise_title: str
+    exercise_description: Optional[str] = None
+    answers: List[ExerciseAnswer] = Field(..., min_length=1, max_length=200, description="Ответы студентов (не больше 200)")
+    language: Optional[str] = Field("ru", description="Язык ответов студентов")
+
+
+class GradedAnswer(ExerciseCheckResult):
+    """Результат проверки одного ответа внутри пакета (ответ модели)"""
+    id: str | int = Field(..., description="Номер ответа в пакете")
+
+
+class ExerciseBatchGrading(BaseModel):
+    """Результаты проверки пакета ответов (ответ ExerciseGradingAgent)"""
+    results: List[GradedAnswer] = Field(default_factory=list)
+
+
+class ExerciseBatchItem(BaseModel):
+    """Результат проверки одного ответа из пакетного запроса"""
+    id: str
+    success: bool
+    result: Optional[ExerciseCheckResult] = None
+    error: Optional[str] = None
+
+
+class ExerciseBatchCheckResponse(BaseModel):
+    """Ответ пакетной проверки: результат по каждому ответу в порядке запроса"""
+    success: bool
+    results: List[ExerciseBatchItem] = Field(default_factory=list)
+    graded: int = 0
+    failed: int = 0
+    error: Optional[str] = None
+
+
 class ChatMessage(BaseModel):
     """Сообщение в чате с ИИ-ассистентом"""
     role: str = Field(..., description="system | user | assistant")
@@ -183,6 +291,9 @@ class AssistantChatRequest(BaseModel):
     message: str
     user_context: Optional[UserContext] = None
     history: Optional[List[ChatMessage]] = None
+    conversation_id: Optional[str] = Field(
+        None, description="ID диалога: по нему кэшируется сводка ранних сообщений"
+    )
     language: Optional[str] = Field("ru", description="Желаемый язык ответа")
 
 
@@ -1,18 +1,21 @@
 """Authentication routes"""
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from app.database import get_db
+from app.database import get_async_db
 from app.db_models import User
 from app.schemas import UserCreate, UserResponse, UserLogin, Token
 from app.auth import (
     authenticate_user,
-    get_password_hash,
+    hash_password,
     create_access_token,
     create_refresh_token,
     verify_token,
-    get_current_user,
+    get_current_user_record,
+    load_user,
+    principal_claims,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     timedelta
 )
@@ -22,12 +25,13 @@ router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = db.query(User).filter(
+    result = await db.execute(select(User).where(
         (User.email == user_data.email) | (User.username == user_data.username)
-    ).first()
+    ))
+    existing_user = result.scalars().first()
     
     if existing_user:
         if existing_user.email == user_data.email:
@@ -42,7 +46,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
             )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     db_user = User(
         email=user_data.email,
         username=user_data.username,
@@ -54,11 +58,11 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     
     try:
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         return db_user
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User already exists"
@@ -68,11 +72,11 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Login and get access token"""
     # OAuth2PasswordRequestForm uses 'username' field for email
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -82,12 +86,12 @@ async def login(
     
     # Update last login
     user.last_login = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     # Create tokens
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+        data=principal_claims(user), expires_delta=access_token_expires
     )
     refresh_token = create_refresh_token(data={"sub": str(user.id)})
     
@@ -99,9 +103,9 @@ async def login(
 
 
 @router.post("/login/json", response_model=Token)
-async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login_json(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login using JSON (alternative to OAuth2 form)"""
-    user = authenticate_user(db, user_data.email, user_data.password)
+    user = await authenticate_user(db, user_data.email, user_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -111,12 +115,12 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
     
     # Update last login
     user.last_login = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     # Create tokens
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+        data=principal_claims(user), expires_delta=access_token_expires
     )
     refresh_token = create_refresh_token(data={"sub": str(user.id)})
     
@@ -128,10 +132,10 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
+async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_async_db)):
     """Refresh access token using refresh token"""
     token_data = verify_token(refresh_token, "refresh")
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    user = await load_user(db, token_data.user_id)
     
     if not user:
         raise HTTPException(
@@ -142,7 +146,7 @@ async def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
     # Create new tokens
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+        data=principal_claims(user), expires_delta=access_token_expires
     )
     new_refresh_token = create_refresh_token(data={"sub": str(user.id)})
     
@@ -154,7 +158,7 @@ async def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_user_record)):
     """Get current user information"""
     return current_user
 
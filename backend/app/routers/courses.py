@@ -0,0 +1,96 @@
+"""Saved course routes"""
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from app.auth import get_current_user, get_optional_current_user
+from app.database import get_async_db
+from app.db_models import User
+from app.models import Course
+from app.schemas import CourseDetailResponse, CourseListResponse
+from app.services.course_catalog import CatalogFilters, list_courses
+from app.services.course_store import save_course, get_course_detail
+from app.services.counters import counters
+
+router = APIRouter(prefix="/api/courses", tags=["courses"])
+
+
+@router.get("", response_model=CourseListResponse)
+async def get_courses(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    category_id: Optional[UUID] = None,
+    level: Optional[str] = None,
+    tag: Optional[str] = None,
+    is_public: bool = True,
+    mine: bool = False,
+    current_user: Optional[User] = Depends(get_optional_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """List courses, newest first, with cursor pagination
+
+    Pass `next_cursor` from the previous page as `cursor` to get the next one.
+    Private courses (`is_public=false`) are only listed for their author.
+    """
+    if (mine or not is_public) and current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    filters = CatalogFilters(
+        category_id=category_id,
+        level=level,
+        tag=tag,
+        is_public=is_public,
+        created_by=current_user.id if (mine or not is_public) else None,
+    )
+    try:
+        items, next_cursor = await list_courses(db, filters, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.post("", response_model=Course, status_code=status.HTTP_201_CREATED)
+async def create_course(
+    course: Course,
+    is_public: bool = True,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Save a generated course (modules, lessons and materials) for the current user"""
+    course_id = await save_course(db, course, created_by=current_user.id, is_public=is_public)
+    await db.commit()
+    return course.model_copy(update={"id": str(course_id)})
+
+
+@router.get("/{course_id}", response_model=CourseDetailResponse)
+async def get_course(
+    course_id: UUID,
+    current_user: Optional[User] = Depends(get_optional_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a saved course with modules, lessons, tags and the caller's progress
+
+    The whole tree is loaded in a fixed number of queries (see
+    scripts/check_course_queries.py).
+    """
+    detail = await get_course_detail(db, course_id, user_id=current_user.id if current_user else None)
+    if detail is None or not _can_view(detail, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Course not found"
+        )
+    counters.increment("course_views", course_id)
+    detail["views"] += counters.pending("course_views", course_id)
+    return detail
+
+
+def _can_view(course: dict, user: Optional[User]) -> bool:
+    if course["is_public"] and not course["is_private"]:
+        return True
+    return user is not None and user.id == course["created_by"]
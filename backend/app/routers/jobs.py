@@ -0,0 +1,59 @@
+"""Course generation job routes
+
+Jobs are visible only to the user who enqueued them; other users get 404.
+"""
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from app.auth import get_current_user
+from app.database import get_db
+from app.db_models import CourseGenerationJob, User
+from app.schemas import CourseGenerationJobResponse, CourseGenerationBatchResponse
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.get("/batch/{batch_id}", response_model=CourseGenerationBatchResponse)
+def get_batch_status(
+    batch_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get status of all jobs in a batch enqueued by the current user"""
+    jobs = (
+        db.query(CourseGenerationJob)
+        .filter(
+            CourseGenerationJob.batch_id == batch_id,
+            CourseGenerationJob.created_by == current_user.id,
+        )
+        .order_by(CourseGenerationJob.created_at)
+        .all()
+    )
+    if not jobs:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch not found"
+        )
+
+    return {
+        "batch_id": batch_id,
+        "jobs": jobs,
+        "completed": sum(1 for job in jobs if job.status == "completed"),
+        "failed": sum(1 for job in jobs if job.status == "failed"),
+    }
+
+
+@router.get("/{job_id}", response_model=CourseGenerationJobResponse)
+def get_job_status(
+    job_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get status of the current user's generation job (and the course once completed)"""
+    job = db.get(CourseGenerationJob, job_id)
+    if job is None or job.created_by != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
@@ -0,0 +1,63 @@
+"""Learning progress routes"""
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth import get_current_user
+from app.database import get_async_db
+from app.db_models import User
+from app.schemas import (
+    CourseProgressResponse,
+    HeartbeatBatch,
+    HeartbeatResponse,
+    LessonCompleteResponse,
+)
+from app.services.progress import complete_lesson, get_course_progress, record_heartbeats
+
+router = APIRouter(prefix="/api/progress", tags=["progress"])
+
+
+@router.post("/lesson/{lesson_id}/complete", response_model=LessonCompleteResponse)
+async def mark_lesson_complete(
+    lesson_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Mark a lesson as completed (idempotent); enrolls the user if needed"""
+    result = await complete_lesson(db, current_user.id, lesson_id)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Lesson not found"
+        )
+    await db.commit()
+    return result
+
+
+@router.post("/heartbeat", response_model=HeartbeatResponse)
+async def send_heartbeats(
+    batch: HeartbeatBatch,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Add time spent in lessons; the client sends accumulated heartbeats in one batch"""
+    result = await record_heartbeats(
+        db, current_user.id, ((item.lesson_id, item.seconds) for item in batch.items)
+    )
+    await db.commit()
+    return result
+
+
+@router.get("/course/{course_id}", response_model=CourseProgressResponse)
+async def get_progress(
+    course_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the current user's progress in a course"""
+    progress = await get_course_progress(db, current_user.id, course_id)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not enrolled in this course"
+        )
+    return progress
@@ -0,0 +1,26 @@
+"""Search routes"""
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth import get_optional_current_user
+from app.database import get_async_db
+from app.db_models import User
+from app.schemas import SearchResponse
+from app.services.search import search
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+
+@router.get("", response_model=SearchResponse)
+async def search_library(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    current_user: Optional[User] = Depends(get_optional_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Search course titles and descriptions, lesson content and terms
+
+    Results are ranked across all three kinds; `title` and `snippet` are
+    HTML-escaped text in which matched words are wrapped in <mark>.
+    """
+    return await search(db, q, limit=limit, viewer_id=current_user.id if current_user else None)
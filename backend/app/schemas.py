@@ -1,6 +1,6 @@
 """Pydantic schemas for API requests and responses"""
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 from uuid import UUID
 
@@ -42,6 +42,10 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     user_id: Optional[UUID] = None
+    email: Optional[str] = None
+    username: Optional[str] = None
+    role: Optional[str] = None
+    email_verified: Optional[bool] = None
 
 
 # Course Schemas
@@ -133,6 +137,102 @@ class ModuleResponse(ModuleBase):
         from_attributes = True
 
 
+class CourseSummaryResponse(CourseResponse):
+    category: Optional[str] = None
+    total_duration_hours: Optional[float] = None
+
+
+class CourseListResponse(BaseModel):
+    items: List[CourseSummaryResponse] = []
+    next_cursor: Optional[str] = None
+
+
+# Course Detail Schemas
+class LessonVideoResponse(BaseModel):
+    title: str
+    url: str
+    description: Optional[str] = None
+    duration: Optional[str] = None
+    channel: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class LessonPracticeExerciseResponse(BaseModel):
+    title: str
+    description: str
+    difficulty: str
+    estimated_time: Optional[str] = None
+    solution_hint: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class LessonMaterialResponse(BaseModel):
+    title: str
+    type: str
+    url: Optional[str] = None
+    description: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class LessonTermResponse(BaseModel):
+    term: str
+    explanation: str
+
+    class Config:
+        from_attributes = True
+
+
+class LessonDetailResponse(LessonResponse):
+    exercises: List[str] = []
+    videos: List[LessonVideoResponse] = []
+    practice_exercises: List[LessonPracticeExerciseResponse] = []
+    additional_materials: List[LessonMaterialResponse] = []
+    terms: List[LessonTermResponse] = []
+    completed: bool = False
+    time_spent_minutes: int = 0
+
+
+class ModuleDetailResponse(ModuleBase):
+    id: UUID
+    course_id: UUID
+    duration_hours: Optional[float] = None
+    lessons: List[LessonDetailResponse] = []
+
+    class Config:
+        from_attributes = True
+
+
+class CourseDetailResponse(CourseResponse):
+    category: Optional[str] = None
+    total_duration_hours: Optional[float] = None
+    learning_objectives: List[str] = []
+    modules: List[ModuleDetailResponse] = []
+    enrollment: Optional["EnrollmentResponse"] = None
+
+
+# Search Schemas
+class SearchHitResponse(BaseModel):
+    type: str  # course, lesson, term
+    course_id: UUID
+    course_title: str
+    lesson_id: Optional[UUID] = None
+    title: str  # matches wrapped in <mark>
+    snippet: Optional[str] = None
+    score: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchHitResponse] = []
+    took_ms: float
+
+
 # Enrollment Schemas
 class EnrollmentCreate(BaseModel):
     course_id: UUID
@@ -163,11 +263,47 @@ class ProgressResponse(BaseModel):
     lesson_id: UUID
     completed_at: Optional[datetime] = None
     time_spent_minutes: int
+    time_spent_seconds: int = 0
 
     class Config:
         from_attributes = True
 
 
+class LessonCompleteResponse(BaseModel):
+    course_id: UUID
+    enrollment_id: UUID
+    lesson_id: UUID
+    newly_completed: bool
+    progress_percent: int
+    completed_lessons: int
+    lessons_total: int
+
+
+class CourseProgressResponse(BaseModel):
+    course_id: UUID
+    enrollment_id: UUID
+    progress_percent: int
+    completed_lessons: int
+    lessons_total: int
+    completed_at: Optional[datetime] = None
+    last_accessed_at: Optional[datetime] = None
+    lessons: List[ProgressResponse] = []
+
+
+class HeartbeatItem(BaseModel):
+    lesson_id: UUID
+    seconds: int = Field(..., ge=1, le=3600)
+
+
+class HeartbeatBatch(BaseModel):
+    items: List[HeartbeatItem] = Field(..., max_length=500)
+
+
+class HeartbeatResponse(BaseModel):
+    accepted: int
+    unknown_lessons: List[UUID] = []
+
+
 # Discussion Schemas
 class DiscussionBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=255)
@@ -216,7 +352,33 @@ class DiscussionReplyResponse(DiscussionReplyBase):
         from_attributes = True
 
 
+# Course Generation Job Schemas
+class CourseGenerationJobResponse(BaseModel):
+    id: UUID
+    batch_id: Optional[UUID] = None
+    status: str
+    lessons_total: int
+    lessons_completed: int
+    attempts: int
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class CourseGenerationBatchResponse(BaseModel):
+    batch_id: UUID
+    jobs: List[CourseGenerationJobResponse] = []
+    completed: int
+    failed: int
+
+
 # Update forward references
+CourseDetailResponse.model_rebuild()
 DiscussionResponse.model_rebuild()
 DiscussionReplyResponse.model_rebuild()
 
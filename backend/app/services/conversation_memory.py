@@ -0,0 +1,201 @@
+"""Память диалога ассистента: окно последних сообщений по бюджету токенов + сводка
+
+В модель уходят только последние сообщения, укладывающиеся в
+ASSISTANT_HISTORY_TOKEN_BUDGET токенов. Более ранние сообщения сворачиваются
+в краткую сводку, которая кэшируется по conversation_id:
+- на следующих ходах сводка берется из кэша, пока клиент присылает ту же историю;
+- при переполнении окна в сводку дописываются только новые выпавшие сообщения,
+  причем окно сокращается до ASSISTANT_HISTORY_LOW_WATERMARK бюджета -
+  поэтому пересчет сводки нужен раз в несколько ходов, а не на каждом.
+Размер промпта и задержка хода не растут с длиной диалога.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+
+from app.services.rate_limiter import estimate_tokens
+
+# Служебные токены на каждое сообщение в формате чата
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Словарь tiktoken скачивается при первом использовании; без сети считаем по символам
+        print(f"Ошибка загрузки токенизатора: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    """Число токенов текста (tiktoken, если установлен, иначе оценка по символам)"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(message: Dict[str, str], model: str = "") -> int:
+    return count_tokens(message.get("content", ""), model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _prefix_hash(messages: List[Dict[str, str]]) -> str:
+    payload = json.dumps(
+        [(message.get("role"), message.get("content")) for message in messages], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _SummaryState:
+    covered: int  # сколько первых сообщений истории свернуто в сводку
+    prefix_hash: str
+    summary: str
+
+
+class ConversationMemory:
+    """Окно истории по бюджету токенов и кэш сводок по conversation_id"""
+
+    def __init__(
+        self,
+        token_budget: int | None = None,
+        low_watermark: float | None = None,
+        max_conversations: int | None = None,
+    ):
+        self.token_budget = token_budget or int(os.getenv("ASSISTANT_HISTORY_TOKEN_BUDGET", "2000"))
+        self.low_watermark = low_watermark or float(os.getenv("ASSISTANT_HISTORY_LOW_WATERMARK", "0.6"))
+        self.max_conversations = max_conversations or int(os.getenv("ASSISTANT_MEMORY_MAX_CONVERSATIONS", "10000"))
+        self._states: "OrderedDict[str, _SummaryState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.summary_reuses = 0
+        self.summarizations = 0
+        self.summarization_errors = 0
+        self.folded_messages = 0
+        self.window_tokens_sum = 0
+
+    @staticmethod
+    def conversation_key(conversation_id: str | None, history: List[Dict[str, str]]) -> str:
+        """Ключ кэша: conversation_id, а без него - хэш начала диалога"""
+        if conversation_id:
+            return f"id:{conversation_id}"
+        return f"prefix:{_prefix_hash(history[:2])}"
+
+    def _get_state(self, key: str) -> Optional[_SummaryState]:
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+            return state
+
+    def _set_state(self, key: str, state: _SummaryState) -> None:
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_conversations:
+                self._states.popitem(last=False)
+
+    def _window_start(self, history: List[Dict[str, str]], start: int, budget: float, model: str) -> Tuple[int, int]:
+        """Начало окна: самый ранний индекс >= start, с которого хвост укладывается в budget"""
+        used = 0
+        boundary = len(history)
+        for index in range(len(history) - 1, start - 1, -1):
+            tokens = message_tokens(history[index], model)
+            if used + tokens > budget:
+                break
+            used += tokens
+            boundary = index
+        return boundary, used
+
+    async def prepare(
+        self,
+        history: List[Dict[str, str]],
+        summarize: Summarizer,
+        conversation_id: str | None = None,
+        model: str = "",
+    ) -> Tuple[str, List[Dict[str, str]]]:
+        """Возвращает (сводка ранней части диалога, окно последних сообщений)"""
+        self.turns += 1
+        if not history:
+            return "", []
+
+        key = self.conversation_key(conversation_id, history)
+        covered, summary = 0, ""
+        state = self._get_state(key)
+        # Сводка годится, только если клиент прислал историю с тем же началом
+        if state is not None and state.covered <= len(history) and _prefix_hash(history[:state.covered]) == state.prefix_hash:
+            covered, summary = state.covered, state.summary
+
+        boundary, used = self._window_start(history, covered, self.token_budget, model)
+        if boundary == covered:
+            if covered:
+                self.summary_reuses += 1
+            self.window_tokens_sum += used
+            return summary, history[covered:]
+
+        # Окно переполнено: сворачиваем с запасом, чтобы следующие ходы обошлись без пересчета
+        boundary, used = self._window_start(history, covered, self.token_budget * self.low_watermark, model)
+        try:
+            summary = await self._fold(summarize, summary, history[covered:boundary], model)
+        except Exception as e:
+            print(f"Ошибка сжатия истории диалога: {e}")
+            self.summarization_errors += 1
+            self.window_tokens_sum += used
+            return summary, history[boundary:]
+
+        self.folded_messages += boundary - covered
+        self._set_state(key, _SummaryState(covered=boundary, prefix_hash=_prefix_hash(history[:boundary]), summary=summary))
+        self.window_tokens_sum += used
+        return summary, history[boundary:]
+
+    async def _fold(self, summarize: Summarizer, summary: str, messages: List[Dict[str, str]], model: str) -> str:
+        """Дописывает сообщения в сводку порциями не больше бюджета окна"""
+        batch: List[Dict[str, str]] = []
+        batch_tokens = 0
+        for message in messages:
+            tokens = message_tokens(message, model)
+            if batch and batch_tokens + tokens > self.token_budget:
+                summary = await summarize(summary, batch)
+                self.summarizations += 1
+                batch, batch_tokens = [], 0
+            batch.append(message)
+            batch_tokens += tokens
+        if batch:
+            summary = await summarize(summary, batch)
+            self.summarizations += 1
+        return summary
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "conversations": len(self._states),
+            "token_budget": self.token_budget,
+            "turns": self.turns,
+            "summary_reuses": self.summary_reuses,
+            "summarizations": self.summarizations,
+            "summarization_errors": self.summarization_errors,
+            "folded_messages": self.folded_messages,
+            "avg_window_tokens": round(self.window_tokens_sum / self.turns, 1) if self.turns else 0.0,
+        }
+
+
+conversation_memory = ConversationMemory()
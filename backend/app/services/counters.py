@@ -0,0 +1,185 @@
+"""Счетчики с отложенной записью (write-behind)
+
+Просмотры курсов и лайки обсуждений не пишутся в БД на каждый запрос:
+инкременты копятся в памяти процесса и раз в COUNTER_FLUSH_INTERVAL_SECONDS
+сбрасываются агрегированными дельтами - один UPDATE ... SET x = x + :delta
+(executemany) на тип счетчика. Так популярный курс дает одну строку в пакете
+вместо сотен конкурирующих блокировок строки.
+
+При ошибке записи дельты возвращаются в буфер; при штатной остановке
+выполняется финальный сброс, поэтому инкременты не теряются.
+"""
+from collections import defaultdict
+from typing import Any, Dict
+from uuid import UUID
+import asyncio
+import os
+import time
+
+from sqlalchemy import bindparam, update
+
+from app import db_models
+from app.database import AsyncSessionLocal
+
+# Тип счетчика -> (таблица, колонка)
+COUNTERS = {
+    "course_views": (db_models.Course.__table__, "views"),
+    "discussion_likes": (db_models.Discussion.__table__, "likes_count"),
+    "discussion_reply_likes": (db_models.DiscussionReply.__table__, "likes_count"),
+}
+
+
+class WriteBehindCounters:
+    """Буфер инкрементов с периодическим пакетным сбросом в БД"""
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        flush_interval: float | None = None,
+        max_pending_keys: int | None = None,
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval or float(os.getenv("COUNTER_FLUSH_INTERVAL_SECONDS", "5"))
+        # При таком числе разных ключей в буфере сброс запускается досрочно
+        self.max_pending_keys = max_pending_keys or int(os.getenv("COUNTER_MAX_PENDING_KEYS", "10000"))
+        self._pending: Dict[str, Dict[UUID, int]] = defaultdict(lambda: defaultdict(int))
+        self._oldest_pending_at: float | None = None
+        self._in_flight: Dict[str, Dict[UUID, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.flushes = 0
+        self.flushed_increments = 0
+        self.failed_flushes = 0
+        self.last_flush_at: float | None = None
+        self.last_flush_duration_ms = 0.0
+        self.last_flush_lag_seconds = 0.0
+        self.max_flush_lag_seconds = 0.0
+
+    def increment(self, counter: str, object_id: UUID, delta: int = 1) -> None:
+        """Учитывает инкремент (без обращения к БД)"""
+        if counter not in COUNTERS:
+            raise ValueError(f"Unknown counter: {counter}")
+        if self._oldest_pending_at is None:
+            self._oldest_pending_at = time.monotonic()
+        self._pending[counter][object_id] += delta
+        if self._wakeup is not None and self.pending_keys() >= self.max_pending_keys:
+            self._wakeup.set()
+
+    def pending(self, counter: str, object_id: UUID) -> int:
+        """Еще не записанная дельта (чтобы ответ API учитывал свежие инкременты)"""
+        return (
+            self._pending.get(counter, {}).get(object_id, 0)
+            + self._in_flight.get(counter, {}).get(object_id, 0)
+        )
+
+    def pending_keys(self) -> int:
+        return sum(len(deltas) for deltas in self._pending.values())
+
+    def flush_lag_seconds(self) -> float:
+        """Возраст самого старого незаписанного инкремента"""
+        if self._oldest_pending_at is None:
+            return 0.0
+        return time.monotonic() - self._oldest_pending_at
+
+    async def flush(self) -> int:
+        """Записывает накопленные дельты; возвращает число обновленных строк"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            # Забираем буфер целиком: новые инкременты копятся уже в новом
+            batch, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            self._in_flight = batch
+            lag = self.flush_lag_seconds()
+            self._oldest_pending_at = None
+
+            started = time.monotonic()
+            try:
+                async with self.session_factory() as db:
+                    for counter, deltas in batch.items():
+                        table, column = COUNTERS[counter]
+                        statement = (
+                            update(table)
+                            .where(table.c.id == bindparam("object_id"))
+                            .values({
+                                column: table.c[column] + bindparam("delta"),
+                                # Счетчик не считается изменением записи: не трогаем onupdate
+                                "updated_at": table.c.updated_at,
+                            })
+                        )
+                        await db.execute(
+                            statement,
+                            [{"object_id": object_id, "delta": delta} for object_id, delta in deltas.items()],
+                        )
+                    await db.commit()
+            except Exception:
+                self.failed_flushes += 1
+                self._restore(batch, lag)
+                raise
+            finally:
+                self._in_flight = {}
+
+            rows = sum(len(deltas) for deltas in batch.values())
+            self.flushes += 1
+            self.flushed_increments += sum(sum(deltas.values()) for deltas in batch.values())
+            self.last_flush_at = time.time()
+            self.last_flush_duration_ms = round((time.monotonic() - started) * 1000, 2)
+            self.last_flush_lag_seconds = round(lag, 3)
+            self.max_flush_lag_seconds = max(self.max_flush_lag_seconds, self.last_flush_lag_seconds)
+            return rows
+
+    def _restore(self, batch: Dict[str, Dict[UUID, int]], lag: float) -> None:
+        """Возвращает несохраненные дельты в буфер"""
+        for counter, deltas in batch.items():
+            for object_id, delta in deltas.items():
+                self._pending[counter][object_id] += delta
+        restored_at = time.monotonic() - lag
+        if self._oldest_pending_at is None or restored_at < self._oldest_pending_at:
+            self._oldest_pending_at = restored_at
+
+    # ---- Жизненный цикл ----
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Останавливает фоновый сброс и записывает остаток буфера"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Ошибка финального сброса счетчиков: {e}")
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Ошибка сброса счетчиков: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "flush_interval_seconds": self.flush_interval,
+            "pending_keys": self.pending_keys(),
+            "pending_increments": sum(sum(deltas.values()) for deltas in self._pending.values()),
+            "flush_lag_seconds": round(self.flush_lag_seconds(), 3),
+            "last_flush_lag_seconds": self.last_flush_lag_seconds,
+            "max_flush_lag_seconds": self.max_flush_lag_seconds,
+            "last_flush_at": self.last_flush_at,
+            "last_flush_duration_ms": self.last_flush_duration_ms,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flushed_increments": self.flushed_increments,
+        }
+
+
+counters = WriteBehindCounters()
@@ -0,0 +1,103 @@
+"""Каталог курсов с keyset-пагинацией
+
+Курсы отдаются в порядке (created_at DESC, id DESC). Курсор - это ключ
+последнего курса на странице, следующая страница начинается строго после него:
+WHERE (created_at, id) < (:created_at, :id). В отличие от OFFSET, стоимость
+страницы не зависит от ее номера - поиск начинается сразу с нужного места
+составного индекса (см. ix_courses_catalog_* в db_models).
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+import base64
+
+from sqlalchemy import exists, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app import db_models
+
+
+@dataclass
+class CatalogFilters:
+    """Фильтры каталога"""
+    category_id: UUID | None = None
+    level: str | None = None
+    tag: str | None = None
+    is_public: bool = True
+    created_by: UUID | None = None
+
+
+def encode_cursor(created_at: datetime, course_id: UUID) -> str:
+    raw = f"{created_at.isoformat()}|{course_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Разбирает курсор; ValueError для испорченного курсора"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, course_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), UUID(course_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _catalog_query(filters: CatalogFilters):
+    course = db_models.Course
+    query = select(course)
+
+    if filters.is_public:
+        query = query.where(course.is_public.is_(True), course.is_private.is_(False))
+    else:
+        query = query.where(course.is_public.is_(False))
+    if filters.created_by is not None:
+        query = query.where(course.created_by == filters.created_by)
+    if filters.category_id is not None:
+        query = query.where(course.category_id == filters.category_id)
+    if filters.level is not None:
+        query = query.where(course.level == filters.level)
+    if filters.tag is not None:
+        tag_id = select(db_models.Tag.id).where(db_models.Tag.name == filters.tag).scalar_subquery()
+        query = query.where(
+            exists().where(
+                db_models.course_tags.c.course_id == course.id,
+                db_models.course_tags.c.tag_id == tag_id,
+            )
+        )
+    return query
+
+
+async def list_courses(
+    db: AsyncSession,
+    filters: CatalogFilters,
+    cursor: str | None = None,
+    limit: int = 20,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Возвращает страницу каталога и курсор следующей страницы (None на последней)"""
+    course = db_models.Course
+    query = _catalog_query(filters)
+    if cursor:
+        created_at, course_id = decode_cursor(cursor)
+        query = query.where(tuple_(course.created_at, course.id) < tuple_(created_at, course_id))
+
+    query = (
+        query.order_by(course.created_at.desc(), course.id.desc())
+        .limit(limit + 1)
+        .options(selectinload(course.category), selectinload(course.tags))
+    )
+    rows = list((await db.execute(query)).scalars())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    items = []
+    for row in rows:
+        item = {column.key: getattr(row, column.key) for column in course.__table__.columns}
+        item["category"] = row.category.label if row.category else None
+        item["tags"] = [tag.name for tag in row.tags]
+        items.append(item)
+    return items, next_cursor
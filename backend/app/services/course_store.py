@@ -0,0 +1,304 @@
+"""Сохранение сгенерированных курсов в реляционную схему
+
+Запись: дерево Course → модули → уроки → видео/упражнения/материалы/термины
+раскладывается в списки строк с заранее выданными id и вставляется одним
+bulk INSERT на таблицу (executemany), а не отдельным add() на каждую строку.
+
+Чтение: курс со всем деревом загружается фиксированным числом запросов
+(selectinload на каждый уровень) независимо от числа модулей и уроков.
+Детальная карточка курса дополнительно подгружает теги и прогресс
+текущего пользователя - тоже по одному запросу на связь.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+import uuid
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app import db_models
+from app.services.search import invalidate_search_index_on_commit
+from app.models import (
+    Course, Module, Lesson, VideoMaterial, AdditionalMaterial,
+    PracticeExercise, TermExplanation,
+)
+
+
+def course_tree_options() -> List[Any]:
+    """Опции загрузки полного дерева курса без N+1"""
+    lesson_children = (
+        selectinload(db_models.Lesson.videos),
+        selectinload(db_models.Lesson.practice_exercises),
+        selectinload(db_models.Lesson.additional_materials),
+        selectinload(db_models.Lesson.terms),
+    )
+    return [
+        selectinload(db_models.Course.category),
+        selectinload(db_models.Course.modules)
+        .selectinload(db_models.CourseModule.lessons)
+        .options(*lesson_children),
+    ]
+
+
+async def _get_or_create_category(db: AsyncSession, label: str) -> UUID:
+    result = await db.execute(
+        select(db_models.Category.id).where(db_models.Category.label == label)
+    )
+    category_id = result.scalar_one_or_none()
+    if category_id is None:
+        category_id = uuid.uuid4()
+        await db.execute(insert(db_models.Category), [{"id": category_id, "label": label}])
+    return category_id
+
+
+def build_course_rows(
+    course: Course,
+    created_by: UUID,
+    category_id: UUID | None = None,
+    is_public: bool = True,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Раскладывает дерево курса в строки таблиц (id выдаются заранее)"""
+    course_id = uuid.uuid4()
+    rows: Dict[str, List[Dict[str, Any]]] = {
+        "courses": [{
+            "id": course_id,
+            "title": course.title,
+            "description": course.description,
+            "category_id": category_id,
+            "created_by": created_by,
+            "level": course.difficulty.value,
+            "is_public": is_public,
+            "is_private": not is_public,
+            "total_duration_hours": course.total_duration_hours,
+            "lessons_count": sum(len(module.lessons) for module in course.modules),
+            "learning_objectives": list(course.learning_objectives),
+            # Точное время с микросекундами: created_at - ключ keyset-пагинации каталога
+            "created_at": datetime.now(timezone.utc),
+        }],
+        "modules": [],
+        "lessons": [],
+        "videos": [],
+        "practice_exercises": [],
+        "additional_materials": [],
+        "terms": [],
+    }
+
+    for module_order, module in enumerate(course.modules):
+        module_id = uuid.uuid4()
+        rows["modules"].append({
+            "id": module_id,
+            "course_id": course_id,
+            "title": module.title,
+            "description": module.description,
+            "order": module_order,
+            "duration_hours": module.duration_hours,
+        })
+        for lesson_order, lesson in enumerate(module.lessons):
+            lesson_id = uuid.uuid4()
+            rows["lessons"].append({
+                "id": lesson_id,
+                "module_id": module_id,
+                "title": lesson.title,
+                "content": lesson.content,
+                "duration_minutes": lesson.duration_minutes,
+                "order": lesson_order,
+                "exercises": list(lesson.exercises),
+            })
+            for order, video in enumerate(lesson.videos):
+                rows["videos"].append({
+                    "id": uuid.uuid4(), "lesson_id": lesson_id, "order": order,
+                    **video.model_dump(),
+                })
+            for order, exercise in enumerate(lesson.practice_exercises):
+                rows["practice_exercises"].append({
+                    "id": uuid.uuid4(), "lesson_id": lesson_id, "order": order,
+                    **exercise.model_dump(),
+                })
+            for order, material in enumerate(lesson.additional_materials):
+                rows["additional_materials"].append({
+                    "id": uuid.uuid4(), "lesson_id": lesson_id, "order": order,
+                    **material.model_dump(),
+                })
+            for order, term in enumerate(lesson.terms):
+                rows["terms"].append({
+                    "id": uuid.uuid4(), "lesson_id": lesson_id, "order": order,
+                    **term.model_dump(),
+                })
+    return rows
+
+
+# Порядок вставки соблюдает внешние ключи
+_ROW_TABLES = (
+    ("courses", db_models.Course),
+    ("modules", db_models.CourseModule),
+    ("lessons", db_models.Lesson),
+    ("videos", db_models.LessonVideo),
+    ("practice_exercises", db_models.LessonPracticeExercise),
+    ("additional_materials", db_models.LessonMaterial),
+    ("terms", db_models.LessonTerm),
+)
+
+
+async def save_course(
+    db: AsyncSession,
+    course: Course,
+    created_by: UUID,
+    is_public: bool = True,
+) -> UUID:
+    """Сохраняет сгенерированный курс и возвращает его id в БД
+
+    Все вставки выполняются в текущей транзакции сессии; фиксирует ее вызывающий код.
+    """
+    category_id = await _get_or_create_category(db, course.category) if course.category else None
+    rows = build_course_rows(course, created_by, category_id=category_id, is_public=is_public)
+    for key, model in _ROW_TABLES:
+        if rows[key]:
+            await db.execute(insert(model), rows[key])
+    invalidate_search_index_on_commit(db)
+    return rows["courses"][0]["id"]
+
+
+async def get_course_row(db: AsyncSession, course_id: UUID, extra_options: List[Any] | None = None) -> Optional[db_models.Course]:
+    """Загружает курс со всем деревом фиксированным числом запросов"""
+    result = await db.execute(
+        select(db_models.Course)
+        .where(db_models.Course.id == course_id)
+        .options(*course_tree_options(), *(extra_options or []))
+    )
+    return result.scalar_one_or_none()
+
+
+def lesson_to_model(lesson: db_models.Lesson) -> Lesson:
+    return Lesson(
+        title=lesson.title,
+        content=lesson.content or "",
+        duration_minutes=lesson.duration_minutes or 0,
+        exercises=lesson.exercises or [],
+        practice_exercises=[
+            PracticeExercise(
+                title=item.title,
+                description=item.description,
+                difficulty=item.difficulty,
+                estimated_time=item.estimated_time,
+                solution_hint=item.solution_hint,
+            )
+            for item in lesson.practice_exercises
+        ],
+        videos=[
+            VideoMaterial(
+                title=item.title,
+                url=item.url,
+                description=item.description,
+                duration=item.duration,
+                channel=item.channel,
+            )
+            for item in lesson.videos
+        ],
+        additional_materials=[
+            AdditionalMaterial(
+                title=item.title,
+                type=item.type,
+                url=item.url,
+                description=item.description,
+            )
+            for item in lesson.additional_materials
+        ],
+        terms=[
+            TermExplanation(term=item.term, explanation=item.explanation)
+            for item in lesson.terms
+        ],
+    )
+
+
+def course_to_model(row: db_models.Course) -> Course:
+    """Преобразует загруженное дерево курса в модель API генерации"""
+    modules = [
+        Module(
+            title=module.title,
+            description=module.description or "",
+            lessons=[lesson_to_model(lesson) for lesson in module.lessons],
+            duration_hours=module.duration_hours or 0.0,
+        )
+        for module in row.modules
+    ]
+    return Course(
+        id=str(row.id),
+        title=row.title,
+        description=row.description or "",
+        category=row.category.label if row.category else "",
+        difficulty=row.level or "intermediate",
+        modules=modules,
+        total_duration_hours=row.total_duration_hours or 0.0,
+        learning_objectives=row.learning_objectives or [],
+    )
+
+
+def caller_progress_options(user_id: UUID) -> List[Any]:
+    """Опции загрузки записи на курс и прогресса по урокам только для user_id"""
+    return [
+        selectinload(db_models.Course.enrollments.and_(db_models.Enrollment.user_id == user_id))
+        .selectinload(db_models.Enrollment.student_progress),
+    ]
+
+
+async def get_course_detail(db: AsyncSession, course_id: UUID, user_id: UUID | None = None) -> Optional[Dict[str, Any]]:
+    """Карточка курса: дерево, теги и прогресс пользователя (для CourseDetailResponse)"""
+    extra_options = [selectinload(db_models.Course.tags)]
+    if user_id is not None:
+        extra_options += caller_progress_options(user_id)
+    row = await get_course_row(db, course_id, extra_options=extra_options)
+    if row is None:
+        return None
+
+    # При user_id=None коллекция не загружена - не трогаем ее, чтобы не спровоцировать lazy load
+    enrollment = row.enrollments[0] if user_id is not None and row.enrollments else None
+    progress = {item.lesson_id: item for item in enrollment.student_progress} if enrollment else {}
+
+    modules = []
+    for module in row.modules:
+        lessons = []
+        for lesson in module.lessons:
+            lesson_progress = progress.get(lesson.id)
+            lessons.append({
+                "id": lesson.id,
+                "module_id": lesson.module_id,
+                "title": lesson.title,
+                "content": lesson.content,
+                "duration_minutes": lesson.duration_minutes,
+                "order": lesson.order,
+                "created_at": lesson.created_at,
+                "exercises": lesson.exercises or [],
+                "videos": lesson.videos,
+                "practice_exercises": lesson.practice_exercises,
+                "additional_materials": lesson.additional_materials,
+                "terms": lesson.terms,
+                "completed": bool(lesson_progress and lesson_progress.completed_at),
+                "time_spent_minutes": lesson_progress.time_spent_minutes if lesson_progress else 0,
+            })
+        modules.append({
+            "id": module.id,
+            "course_id": module.course_id,
+            "title": module.title,
+            "description": module.description,
+            "order": module.order,
+            "duration_hours": module.duration_hours,
+            "lessons": lessons,
+        })
+
+    detail = {column.key: getattr(row, column.key) for column in db_models.Course.__table__.columns}
+    detail.update({
+        "category": row.category.label if row.category else None,
+        "tags": [tag.name for tag in row.tags],
+        "learning_objectives": row.learning_objectives or [],
+        "modules": modules,
+        "enrollment": enrollment,
+    })
+    return detail
+
+
+async def load_course(db: AsyncSession, course_id: UUID) -> Optional[Course]:
+    """Загружает сохраненный курс в виде модели Course"""
+    row = await get_course_row(db, course_id)
+    return course_to_model(row) if row is not None else None
@@ -0,0 +1,94 @@
+"""Провайдеры эмбеддингов для поиска похожих текстов
+
+По умолчанию используется детерминированный локальный провайдер на хэшированных
+n-граммах: не требует сети и ключей, одинаковый текст всегда дает одинаковый вектор.
+Провайдер выбирается через EMBEDDINGS_PROVIDER (hashed | openai).
+"""
+from abc import ABC, abstractmethod
+from typing import List
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from app.services.llm_client import llm_registry
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class EmbeddingProvider(ABC):
+    """Базовый провайдер: превращает тексты в нормированные векторы"""
+
+    name = "base"
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Векторы текстов, по строке на текст, нормированные по L2"""
+
+
+class HashedNgramEmbeddings(EmbeddingProvider):
+    """Локальные эмбеддинги: слова и символьные n-граммы, хэшированные в dim корзин
+
+    Знак корзины берется из того же хэша (hashing trick), поэтому коллизии
+    в среднем гасят друг друга. Векторы нормируются по L2 - скалярное
+    произведение равно косинусной близости.
+    """
+
+    name = "hashed"
+
+    def __init__(self, dim: int | None = None, ngram: int = 3):
+        self.dim = dim or int(os.getenv("EMBEDDINGS_DIM", "512"))
+        self.ngram = ngram
+
+    def _features(self, text: str) -> List[tuple[str, float]]:
+        words = [word.replace("ё", "е") for word in _WORD_RE.findall(text.lower())]
+        features = [(f"w:{word}", 1.0) for word in words]
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(
+                (f"c:{padded[i:i + self.ngram]}", 0.5)
+                for i in range(max(1, len(padded) - self.ngram + 1))
+            )
+        return features
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dim] += sign * weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return np.vstack([self.embed_one(text) for text in texts]) if texts else np.zeros((0, self.dim), dtype=np.float32)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Эмбеддинги OpenAI (EMBEDDINGS_MODEL, по умолчанию text-embedding-3-small)
+
+    Клиент берется из общего реестра llm_registry - тот же пул соединений,
+    таймауты и повторы, что и у моделей агентов.
+    """
+
+    name = "openai"
+
+    def __init__(self, model: str | None = None):
+        self.model = model or os.getenv("EMBEDDINGS_MODEL", "text-embedding-3-small")
+        self._client = llm_registry.get_embeddings(self.model)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(await self._client.aembed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+def get_default_embedding_provider() -> EmbeddingProvider:
+    """Провайдер из переменной окружения EMBEDDINGS_PROVIDER"""
+    provider = os.getenv("EMBEDDINGS_PROVIDER", "hashed").lower()
+    if provider == "openai":
+        return OpenAIEmbeddingProvider()
+    return HashedNgramEmbeddings()
@@ -0,0 +1,321 @@
+"""Очередь фоновой генерации курсов с чекпоинтами по урокам
+
+Задачи хранятся в таблице course_generation_jobs, каждый готовый урок
+сохраняется отдельной строкой в course_generation_job_lessons. Если воркер
+упал или был перезапущен, задача подхватывается заново и продолжает
+генерацию с последнего сохраненного урока.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+from uuid import UUID
+import asyncio
+import os
+import socket
+import uuid
+
+from sqlalchemy import or_, and_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.database import SessionLocal
+from app.db_models import CourseGenerationJob, CourseGenerationJobLesson
+from app.models import CourseGenerationRequest, Lesson
+
+
+class CourseJobQueue:
+    """Персистентная очередь задач генерации курсов"""
+
+    def __init__(
+        self,
+        coordinator,
+        session_factory=SessionLocal,
+        workers: int | None = None,
+        poll_interval: float | None = None,
+        stale_after: float | None = None,
+        max_attempts: int | None = None,
+    ):
+        self.coordinator = coordinator
+        self.session_factory = session_factory
+        self.workers = workers if workers is not None else int(os.getenv("COURSE_JOB_WORKERS", "2"))
+        self.poll_interval = poll_interval or float(os.getenv("COURSE_JOB_POLL_INTERVAL_SECONDS", "2"))
+        # Задача в статусе running без heartbeat дольше stale_after считается брошенной
+        self.stale_after = stale_after or float(os.getenv("COURSE_JOB_STALE_SECONDS", "120"))
+        self.max_attempts = max_attempts or int(os.getenv("COURSE_JOB_MAX_ATTEMPTS", "3"))
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: asyncio.Event | None = None
+
+    # ---- Постановка задач ----
+
+    async def enqueue(self, request: CourseGenerationRequest, created_by: UUID | None = None) -> UUID:
+        """Ставит генерацию курса в очередь и возвращает id задачи"""
+        _, job_ids = await self.enqueue_many([request], created_by=created_by, batch=False)
+        return job_ids[0]
+
+    async def enqueue_many(
+        self,
+        requests: List[CourseGenerationRequest],
+        created_by: UUID | None = None,
+        batch: bool = True,
+    ) -> Tuple[UUID | None, List[UUID]]:
+        """Ставит несколько генераций в очередь одной транзакцией"""
+        batch_id = uuid.uuid4() if batch else None
+        job_ids = await asyncio.to_thread(self._insert_jobs, requests, batch_id, created_by)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return batch_id, job_ids
+
+    def _insert_jobs(
+        self,
+        requests: List[CourseGenerationRequest],
+        batch_id: UUID | None,
+        created_by: UUID | None,
+    ) -> List[UUID]:
+        with self.session_factory() as db:
+            jobs = [
+                CourseGenerationJob(
+                    id=uuid.uuid4(),
+                    batch_id=batch_id,
+                    created_by=created_by,
+                    status="queued",
+                    request=request.model_dump(mode="json"),
+                )
+                for request in requests
+            ]
+            db.add_all(jobs)
+            db.commit()
+            return [job.id for job in jobs]
+
+    # ---- Жизненный цикл воркеров ----
+
+    async def start(self) -> None:
+        """Запускает воркеры в текущем event loop"""
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(f"{socket.gethostname()}:{os.getpid()}:{index}"))
+            for index in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """Останавливает воркеры; незавершенные задачи возвращаются в очередь"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker_loop(self, worker_id: str) -> None:
+        while True:
+            try:
+                job_id = await asyncio.to_thread(self._claim_next_job, worker_id)
+            except Exception as e:
+                print(f"Ошибка очереди генерации курсов: {e}")
+                job_id = None
+
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            await self._run_job(job_id, worker_id)
+
+    def _claim_next_job(self, worker_id: str) -> UUID | None:
+        """Забирает задачу из очереди (новую или брошенную упавшим воркером)
+
+        Каждый захват, в том числе брошенной задачи, считается попыткой: задача,
+        которая роняет воркер, после max_attempts помечается проваленной, а не
+        подхватывается бесконечно.
+        """
+        now = datetime.now(timezone.utc)
+        stale = and_(
+            CourseGenerationJob.status == "running",
+            CourseGenerationJob.heartbeat_at < now - timedelta(seconds=self.stale_after),
+        )
+        claimable = or_(
+            CourseGenerationJob.status == "queued",
+            and_(stale, CourseGenerationJob.attempts < self.max_attempts),
+        )
+        with self.session_factory() as db:
+            db.execute(
+                update(CourseGenerationJob)
+                .where(stale, CourseGenerationJob.attempts >= self.max_attempts)
+                .values(
+                    status="failed",
+                    error=f"Воркер не завершил задачу за {self.max_attempts} попыток",
+                    locked_by=None,
+                    finished_at=now,
+                )
+            )
+            db.commit()
+
+            candidate = (
+                db.query(CourseGenerationJob.id)
+                .filter(claimable)
+                .order_by(CourseGenerationJob.created_at)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+            if candidate is None:
+                return None
+
+            # Условный UPDATE защищает от двойного захвата там, где нет SKIP LOCKED
+            claimed = db.execute(
+                update(CourseGenerationJob)
+                .where(CourseGenerationJob.id == candidate.id, claimable)
+                .values(
+                    status="running",
+                    locked_by=worker_id,
+                    heartbeat_at=now,
+                    attempts=CourseGenerationJob.attempts + 1,
+                )
+            )
+            db.commit()
+            return candidate.id if claimed.rowcount == 1 else None
+
+    # ---- Выполнение задачи ----
+
+    async def _run_job(self, job_id: UUID, worker_id: str) -> None:
+        request_data, structure, completed_lessons = await asyncio.to_thread(self._load_job, job_id)
+        request = CourseGenerationRequest(**request_data)
+        if request.reference_files and not request.settings.reference_files:
+            request.settings.reference_files = request.reference_files
+
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job_id))
+        try:
+            async for event in self.coordinator.generate_course_events(
+                settings=request.settings,
+                structure_override=structure or request.structure_override,
+                completed_lessons=completed_lessons,
+            ):
+                if event["event"] == "structure" and structure is None:
+                    await asyncio.to_thread(self._save_structure, job_id, event["structure"])
+                elif event["event"] == "lesson":
+                    await asyncio.to_thread(
+                        self._save_lesson,
+                        job_id,
+                        event["module_index"],
+                        event["lesson_index"],
+                        event["lesson"].model_dump(mode="json"),
+                    )
+                elif event["event"] == "course":
+                    await asyncio.to_thread(self._complete_job, job_id, event["course"].model_dump(mode="json"))
+        except asyncio.CancelledError:
+            # Воркер останавливается - сразу возвращаем задачу в очередь (запись в БД не в event loop)
+            await asyncio.to_thread(self._release_job, job_id)
+            raise
+        except Exception as e:
+            print(f"Ошибка выполнения задачи генерации {job_id}: {e}")
+            await asyncio.to_thread(self._fail_job, job_id, str(e))
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat_loop(self, job_id: UUID) -> None:
+        while True:
+            await asyncio.sleep(self.stale_after / 3)
+            try:
+                await asyncio.to_thread(self._touch_job, job_id)
+            except Exception as e:
+                print(f"Ошибка обновления heartbeat задачи {job_id}: {e}")
+
+    def _load_job(self, job_id: UUID) -> Tuple[Dict[str, Any], Dict[str, Any] | None, Dict[tuple[int, int], Lesson]]:
+        with self.session_factory() as db:
+            job = db.get(CourseGenerationJob, job_id)
+            checkpoints = (
+                db.query(CourseGenerationJobLesson)
+                .filter(CourseGenerationJobLesson.job_id == job_id)
+                .all()
+            )
+            completed_lessons = {
+                (checkpoint.module_index, checkpoint.lesson_index): Lesson(**checkpoint.result)
+                for checkpoint in checkpoints
+            }
+            return job.request, job.structure, completed_lessons
+
+    def _touch_job(self, job_id: UUID) -> None:
+        with self.session_factory() as db:
+            db.execute(
+                update(CourseGenerationJob)
+                .where(CourseGenerationJob.id == job_id)
+                .values(heartbeat_at=datetime.now(timezone.utc))
+            )
+            db.commit()
+
+    def _save_structure(self, job_id: UUID, structure: Dict[str, Any]) -> None:
+        lessons_total = sum(len(module.get("lessons", [])) for module in structure.get("modules", []))
+        with self.session_factory() as db:
+            db.execute(
+                update(CourseGenerationJob)
+                .where(CourseGenerationJob.id == job_id)
+                .values(
+                    structure=structure,
+                    lessons_total=lessons_total,
+                    heartbeat_at=datetime.now(timezone.utc),
+                )
+            )
+            db.commit()
+
+    def _save_lesson(self, job_id: UUID, module_index: int, lesson_index: int, lesson: Dict[str, Any]) -> None:
+        with self.session_factory() as db:
+            db.add(CourseGenerationJobLesson(
+                job_id=job_id,
+                module_index=module_index,
+                lesson_index=lesson_index,
+                result=lesson,
+            ))
+            db.execute(
+                update(CourseGenerationJob)
+                .where(CourseGenerationJob.id == job_id)
+                .values(
+                    lessons_completed=CourseGenerationJob.lessons_completed + 1,
+                    heartbeat_at=datetime.now(timezone.utc),
+                )
+            )
+            try:
+                db.commit()
+            except IntegrityError:
+                # Урок уже сохранен другим воркером
+                db.rollback()
+
+    def _complete_job(self, job_id: UUID, course: Dict[str, Any]) -> None:
+        with self.session_factory() as db:
+            db.execute(
+                update(CourseGenerationJob)
+                .where(CourseGenerationJob.id == job_id)
+                .values(
+                    status="completed",
+                    result=course,
+                    error=None,
+                    locked_by=None,
+                    finished_at=datetime.now(timezone.utc),
+                )
+            )
+            db.commit()
+
+    def _fail_job(self, job_id: UUID, error: str) -> None:
+        """Возвращает задачу в очередь или помечает ее проваленной после max_attempts"""
+        with self.session_factory() as db:
+            job = db.get(CourseGenerationJob, job_id)
+            job.error = error
+            job.locked_by = None
+            if job.attempts >= self.max_attempts:
+                job.status = "failed"
+                job.finished_at = datetime.now(timezone.utc)
+            else:
+                job.status = "queued"
+            db.commit()
+
+    def _release_job(self, job_id: UUID) -> None:
+        try:
+            with self.session_factory() as db:
+                db.execute(
+                    update(CourseGenerationJob)
+                    .where(CourseGenerationJob.id == job_id, CourseGenerationJob.status == "running")
+                    .values(
+                        status="queued",
+                        locked_by=None,
+                        attempts=CourseGenerationJob.attempts - 1,
+                    )
+                )
+                db.commit()
+        except Exception as e:
+            print(f"Не удалось вернуть задачу {job_id} в очередь: {e}")
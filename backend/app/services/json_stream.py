@@ -0,0 +1,153 @@
+"""Инкрементальный разбор JSON из потока токенов модели
+
+Парсер получает фрагменты ответа по мере генерации и сразу строит итоговый
+объект: к концу потока документ уже разобран, повторный проход по полному
+буферу не нужен. Каждое завершенное значение до глубины emit_depth отдается
+событием (путь, значение) - например ("content",) или ("terms", 2).
+"""
+from typing import Any, List, Tuple
+import json
+import re
+
+_STRING_SPECIAL_RE = re.compile(r'["\\]')
+_LITERAL_END = set(",]} \t\r\n")
+
+
+class JSONStreamError(ValueError):
+    """Поток не является корректным JSON"""
+
+
+class IncrementalJSONParser:
+    """Потоковый парсер JSON-документа с событиями о завершенных значениях"""
+
+    def __init__(self, emit_depth: int = 2):
+        self.emit_depth = emit_depth
+        self.result: Any = None
+        self.done = False
+        # Стек открытых контейнеров: [контейнер, текущий ключ объекта]
+        self._stack: List[list] = []
+        self._state = "start"
+        self._raw: List[str] = []
+        self._escaped = False
+        self._string_is_key = False
+
+    def _path(self) -> Tuple[Any, ...]:
+        return tuple(
+            frame[1] if isinstance(frame[0], dict) else len(frame[0])
+            for frame in self._stack
+        )
+
+    def _finish_value(self, value: Any, events: List[Tuple[Tuple[Any, ...], Any]]) -> None:
+        if not self._stack:
+            self.result = value
+            self.done = True
+            self._state = "done"
+            return
+        path = self._path()
+        container = self._stack[-1][0]
+        if isinstance(container, dict):
+            container[self._stack[-1][1]] = value
+        else:
+            container.append(value)
+        if len(path) <= self.emit_depth:
+            events.append((path, value))
+        self._state = "after"
+
+    def _close(self, events: List[Tuple[Tuple[Any, ...], Any]]) -> None:
+        container = self._stack.pop()[0]
+        self._finish_value(container, events)
+
+    def _open(self, container: Any) -> None:
+        self._stack.append([container, None])
+        self._state = "key" if isinstance(container, dict) else "value"
+
+    def feed(self, chunk: str) -> List[Tuple[Tuple[Any, ...], Any]]:
+        """Разбирает очередной фрагмент; возвращает завершенные в нем значения"""
+        events: List[Tuple[Tuple[Any, ...], Any]] = []
+        index, length = 0, len(chunk)
+        while index < length and not self.done:
+            state = self._state
+
+            if state == "string":
+                if self._escaped:
+                    self._raw.append(chunk[index])
+                    self._escaped = False
+                    index += 1
+                    continue
+                match = _STRING_SPECIAL_RE.search(chunk, index)
+                if match is None:
+                    self._raw.append(chunk[index:])
+                    index = length
+                    continue
+                self._raw.append(chunk[index:match.start()])
+                index = match.end()
+                if match.group() == "\\":
+                    self._raw.append("\\")
+                    self._escaped = True
+                    continue
+                # Декодируем только эту строку (escape-последовательности, \\u)
+                value = json.loads('"' + "".join(self._raw) + '"', strict=False)
+                self._raw = []
+                if self._string_is_key:
+                    self._stack[-1][1] = value
+                    self._state = "colon"
+                else:
+                    self._finish_value(value, events)
+                continue
+
+            if state == "literal":
+                while index < length and chunk[index] not in _LITERAL_END:
+                    self._raw.append(chunk[index])
+                    index += 1
+                if index < length:
+                    literal = "".join(self._raw)
+                    self._raw = []
+                    try:
+                        value = json.loads(literal)
+                    except json.JSONDecodeError as e:
+                        raise JSONStreamError(f"Некорректное значение: {literal[:20]}") from e
+                    self._finish_value(value, events)
+                continue
+
+            char = chunk[index]
+            index += 1
+            if char in " \t\r\n":
+                continue
+
+            if state == "start":
+                # Текст до начала JSON (например, ```json) пропускается
+                if char == "{":
+                    self._open({})
+                elif char == "[":
+                    self._open([])
+            elif state == "value":
+                if char == '"':
+                    self._state, self._string_is_key = "string", False
+                elif char == "{":
+                    self._open({})
+                elif char == "[":
+                    self._open([])
+                elif char == "]" and self._stack and isinstance(self._stack[-1][0], list):
+                    self._close(events)  # пустой список или висячая запятая
+                else:
+                    self._state = "literal"
+                    self._raw = [char]
+            elif state == "key":
+                if char == '"':
+                    self._state, self._string_is_key = "string", True
+                elif char == "}":
+                    self._close(events)
+                else:
+                    raise JSONStreamError(f"Ожидался ключ, получено {char!r}")
+            elif state == "colon":
+                if char != ":":
+                    raise JSONStreamError(f"Ожидалось ':', получено {char!r}")
+                self._state = "value"
+            elif state == "after":
+                if char == ",":
+                    self._state = "key" if isinstance(self._stack[-1][0], dict) else "value"
+                elif char in "}]":
+                    self._close(events)
+                else:
+                    raise JSONStreamError(f"Ожидалось ',' или конец, получено {char!r}")
+        return events
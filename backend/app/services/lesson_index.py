@@ -0,0 +1,293 @@
+"""Индекс похожих уроков для переиспользования уже сгенерированного содержания
+
+Каждый сгенерированный урок сохраняется вместе с эмбеддингом текста его запроса
+(название, описание, модуль, курс). Перед генерацией нового урока координатор ищет
+ближайший урок в той же области - того же уровня сложности и аудитории, в любом курсе:
+- близость >= LESSON_REUSE_THRESHOLD - урок берется как есть (ни одного вызова LLM);
+- близость >= LESSON_ADAPT_THRESHOLD - текст урока адаптируется одним вызовом вместо
+  генерации с нуля, материалы ищутся заново;
+- иначе урок генерируется обычным способом и добавляется в индекс.
+
+Уроки одного курса с неизмененной структурой уже переиспользует хранилище по
+отпечаткам (lesson_results); индекс нужен для похожих уроков разных курсов, поэтому
+название курса в область не входит - его учитывает близость запросов. Эмбеддинги по
+умолчанию (хэшированные n-граммы) измеряют совпадение текста, а не смысла, поэтому
+переиспользование включается явно (LESSON_REUSE_ENABLED).
+
+Векторы хранятся в памяти (numpy-матрица; поиск - матричное умножение по строкам
+своей области) и в SQLite-файле LESSON_INDEX_DB_PATH, чтобы индекс переживал перезапуск.
+"""
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from app.models import CourseSettings, Lesson
+from app.services.embeddings import EmbeddingProvider, get_default_embedding_provider
+
+
+def lesson_scope(settings: CourseSettings) -> str:
+    """Область переиспользования: тот же уровень сложности и та же аудитория"""
+    parts = [settings.difficulty.value, settings.target_audience or ""]
+    normalized = "\x00".join(" ".join(part.lower().split()) for part in parts)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class LessonMatch:
+    """Найденный похожий урок"""
+    lesson: Lesson
+    similarity: float
+    mode: str  # reuse | adapt
+
+
+class SQLiteLessonStore:
+    """Персистентное хранилище уроков индекса (файл открывается при первом обращении)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS lesson_index (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    lesson TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    scope TEXT NOT NULL DEFAULT ''
+                )"""
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(lesson_index)")}
+            if "scope" not in columns:
+                # Записи без области из старых файлов никогда не совпадут с запросом
+                conn.execute("ALTER TABLE lesson_index ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def load(self, provider: str, limit: int) -> List[tuple]:
+        with self._lock:
+            return self._connection().execute(
+                """SELECT key, scope, vector, lesson FROM lesson_index
+                WHERE provider = ? AND scope != '' ORDER BY created_at DESC LIMIT ?""",
+                (provider, limit),
+            ).fetchall()
+
+    def add(self, key: str, provider: str, scope: str, difficulty: str, text: str, vector: bytes, lesson: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """INSERT OR REPLACE INTO lesson_index
+                (key, provider, difficulty, text, vector, lesson, created_at, scope)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (key, provider, difficulty, text, vector, lesson, time.time(), scope),
+            )
+            conn.commit()
+
+
+class LessonSimilarityIndex:
+    """Векторный индекс уроков со статистикой переиспользования"""
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider | None = None,
+        store: SQLiteLessonStore | None = None,
+        reuse_threshold: float | None = None,
+        adapt_threshold: float | None = None,
+        max_entries: int | None = None,
+    ):
+        self.provider = provider or get_default_embedding_provider()
+        self.store = store
+        self.reuse_threshold = reuse_threshold or float(os.getenv("LESSON_REUSE_THRESHOLD", "0.92"))
+        self.adapt_threshold = adapt_threshold or float(os.getenv("LESSON_ADAPT_THRESHOLD", "0.8"))
+        self.max_entries = max_entries or int(os.getenv("LESSON_INDEX_MAX_ENTRIES", "50000"))
+        # Матрица векторов с запасом по строкам: добавление не копирует весь индекс
+        self._vectors: np.ndarray | None = None
+        self._size = 0
+        self._scope_rows: Dict[str, List[int]] = {}  # область -> номера строк по возрастанию
+        self._lessons: List[str] = []  # JSON уроков, Lesson создается только для найденного
+        self._row_keys: List[str] = []
+        self._keys: set[str] = set()
+        self._load_lock = asyncio.Lock()
+        self._loaded = False
+        self.lookups = 0
+        self.reused = 0
+        self.adapted = 0
+        self.generated = 0
+        self.similarity_sum = 0.0
+        self.generation_seconds_sum = 0.0
+        self.served_seconds_sum = 0.0
+
+    @property
+    def provider_key(self) -> str:
+        dim = getattr(self.provider, "dim", "")
+        return f"{self.provider.name}:{dim}"
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            if self.store is not None:
+                try:
+                    rows = await asyncio.to_thread(self.store.load, self.provider_key, self.max_entries)
+                except sqlite3.Error as e:
+                    print(f"Ошибка чтения индекса уроков: {e}")
+                    rows = []
+                rows.reverse()  # от старых к новым, как при добавлении
+                for key, scope, vector, lesson in rows:
+                    self._append(key, scope, np.frombuffer(vector, dtype=np.float32), lesson)
+            self._loaded = True
+
+    @staticmethod
+    def _key(text: str, scope: str) -> str:
+        return hashlib.sha256(f"{scope}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _append(self, key: str, scope: str, vector: np.ndarray, lesson: str) -> None:
+        if self._vectors is None:
+            self._vectors = np.empty((16, vector.shape[0]), dtype=np.float32)
+        elif self._size == self._vectors.shape[0]:
+            # Геометрический рост: амортизированно O(1) на добавление
+            grown = np.empty((self._size * 2, self._vectors.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size] = vector
+        self._scope_rows.setdefault(scope, []).append(self._size)
+        self._size += 1
+        self._lessons.append(lesson)
+        self._row_keys.append(key)
+        self._keys.add(key)
+        if self._size > self.max_entries:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Вытесняет самые старые уроки пачкой (10% индекса), а не по одному на добавление"""
+        overflow = self._size - self.max_entries + max(1, self.max_entries // 10)
+        overflow = min(overflow, self._size)
+        self._keys.difference_update(self._row_keys[:overflow])
+        remaining = self._size - overflow
+        self._vectors[:remaining] = self._vectors[overflow:self._size]
+        self._size = remaining
+        for scope in list(self._scope_rows):
+            rows = self._scope_rows[scope]
+            kept = [row - overflow for row in rows[bisect_left(rows, overflow):]]
+            if kept:
+                self._scope_rows[scope] = kept
+            else:
+                del self._scope_rows[scope]
+        del self._lessons[:overflow]
+        del self._row_keys[:overflow]
+
+    async def find(self, text: str, scope: str) -> Optional[LessonMatch]:
+        """Ищет ближайший урок той же области; None, если близость ниже порога адаптации"""
+        await self._ensure_loaded()
+        self.lookups += 1
+        rows = self._scope_rows.get(scope)
+        if not rows:
+            return None
+
+        query = (await self.provider.embed([text]))[0]
+        # Эмбеддинг считается с await: строки могли сдвинуться из-за вытеснения
+        rows = np.array(self._scope_rows.get(scope, ()), dtype=np.intp)
+        if not rows.size:
+            return None
+        similarities = self._vectors[rows] @ query
+        position = int(np.argmax(similarities))
+        best = int(rows[position])
+        similarity = float(similarities[position])
+        if similarity < self.adapt_threshold:
+            return None
+
+        mode = "reuse" if similarity >= self.reuse_threshold else "adapt"
+        self.similarity_sum += similarity
+        return LessonMatch(lesson=Lesson(**json.loads(self._lessons[best])), similarity=similarity, mode=mode)
+
+    async def add(self, text: str, scope: str, difficulty: str, lesson: Lesson) -> None:
+        """Добавляет сгенерированный урок в индекс"""
+        await self._ensure_loaded()
+        key = self._key(text, scope)
+        if key in self._keys:
+            return
+        vector = (await self.provider.embed([text]))[0].astype(np.float32)
+        if key in self._keys:  # добавлен параллельно, пока считался эмбеддинг
+            return
+        payload = lesson.model_dump_json()
+        self._append(key, scope, vector, payload)
+
+        if self.store is not None:
+            try:
+                await asyncio.to_thread(
+                    self.store.add, key, self.provider_key, scope, difficulty, text, vector.tobytes(), payload
+                )
+            except sqlite3.Error as e:
+                print(f"Ошибка записи индекса уроков: {e}")
+
+    def record_generated(self, seconds: float) -> None:
+        self.generated += 1
+        self.generation_seconds_sum += seconds
+
+    def record_served(self, match: LessonMatch, seconds: float) -> None:
+        if match.mode == "reuse":
+            self.reused += 1
+        else:
+            self.adapted += 1
+        self.served_seconds_sum += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        served = self.reused + self.adapted
+        total = served + self.generated
+        avg_generation = self.generation_seconds_sum / self.generated if self.generated else 0.0
+        return {
+            "provider": self.provider_key,
+            "entries": self._size,
+            "reuse_threshold": self.reuse_threshold,
+            "adapt_threshold": self.adapt_threshold,
+            "lookups": self.lookups,
+            "reused": self.reused,
+            "adapted": self.adapted,
+            "generated": self.generated,
+            "reuse_rate": round(served / total, 3) if total else 0.0,
+            "avg_match_similarity": round(self.similarity_sum / served, 3) if served else None,
+            "avg_generation_seconds": round(avg_generation, 3),
+            # Оценка: каждый найденный урок сэкономил среднее время генерации минус время адаптации
+            "estimated_seconds_saved": round(max(0.0, avg_generation * served - self.served_seconds_sum), 3),
+        }
+
+
+_lesson_index: LessonSimilarityIndex | None = None
+
+
+def lesson_reuse_enabled() -> bool:
+    return os.getenv("LESSON_REUSE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+def get_lesson_index() -> LessonSimilarityIndex:
+    """Возвращает общий индекс уроков (создается лениво из переменных окружения)"""
+    global _lesson_index
+    if _lesson_index is None:
+        db_path = os.getenv("LESSON_INDEX_DB_PATH", "lesson_index.sqlite3")
+        _lesson_index = LessonSimilarityIndex(store=SQLiteLessonStore(db_path) if db_path else None)
+    return _lesson_index
+
+
+def set_lesson_index(index: LessonSimilarityIndex | None) -> None:
+    """Подменяет общий индекс (например, индексом без файла в тестах)"""
+    global _lesson_index
+    _lesson_index = index
@@ -0,0 +1,154 @@
+"""Хранилище готовых уроков по отпечатку их входных данных
+
+Отпечаток урока - хэш всего, что попадает в промпты LessonDetailAgent и
+MaterialSearchAgent: название и описание урока, название модуля, название курса,
+уровень, аудитория, материалы курса и модель. Поля настроек, которые в промпты
+уроков не попадают (описание курса, цели), урок не меняют и в отпечаток не входят.
+
+Когда преподаватель правит структуру после /api/courses/structure/preview,
+координатор сравнивает отпечатки уроков новой структуры с сохраненными:
+неизмененные уроки берутся из хранилища, заново генерируются только
+добавленные и измененные.
+
+Перегенерированный урок (/api/courses/regenerate/...) записывается и под
+отпечатком, с которым был сгенерирован заменяемый урок, - иначе следующая
+генерация той же структуры вернула бы старую версию. Для этого рядом с уроком
+хранится обратная запись "хэш урока → отпечаток". Внутри refresh_cache()
+хранилище не читается.
+
+Хранение - тот же двухуровневый кэш, что и у ответов LLM (LRU в памяти +
+SQLite-файл LESSON_RESULTS_DB_PATH), с отдельным файлом и лимитами.
+"""
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import os
+
+from pydantic import ValidationError
+
+from app.models import CourseSettings, Lesson
+from app.services.llm_cache import LLMCache, SQLiteCacheBackend, cache_refresh_requested
+
+_AGENT = "lesson_results"
+_ORIGIN_AGENT = "lesson_results_origin"
+
+
+def reference_fingerprint(settings: CourseSettings) -> str:
+    """Хэш материалов курса (один раз на курс, а не на каждый урок)"""
+    digest = hashlib.sha256()
+    for item in settings.reference_files or []:
+        digest.update(item.name.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(item.content.encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def lesson_fingerprint(
+    settings: CourseSettings,
+    module_title: str,
+    lesson_data: Dict[str, Any],
+    reference_digest: str = "",
+) -> str:
+    """Отпечаток входных данных урока"""
+    payload = json.dumps(
+        {
+            "model": os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"),
+            "course_title": settings.title,
+            "difficulty": settings.difficulty.value,
+            "target_audience": settings.target_audience,
+            "module_title": module_title,
+            "lesson_title": lesson_data.get("title", "Урок"),
+            "lesson_summary": lesson_data.get("content") or "",
+            "reference": reference_digest,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LessonResultStore:
+    """Готовые уроки по отпечатку входных данных"""
+
+    def __init__(self, cache: LLMCache):
+        self.cache = cache
+
+    @staticmethod
+    def _origin_key(lesson: Lesson) -> str:
+        # Длительность задается структурой и меняется при переиспользовании - в хэш не входит
+        payload = lesson.model_dump_json(exclude={"duration_minutes"})
+        return "origin:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, fingerprint: str) -> Optional[Lesson]:
+        if cache_refresh_requested():
+            return None
+        payload = await self.cache.aget(fingerprint, agent=_AGENT)
+        if payload is None:
+            return None
+        try:
+            return Lesson.model_validate_json(payload)
+        except ValidationError as e:
+            print(f"Ошибка чтения сохраненного урока: {e}")
+            return None
+
+    async def put(self, fingerprint: str, lesson: Lesson) -> None:
+        await self.cache.aset(fingerprint, lesson.model_dump_json())
+        await self.cache.aset(self._origin_key(lesson), fingerprint)
+
+    async def replace(self, previous: Lesson, fingerprint: str, lesson: Lesson) -> None:
+        """Сохраняет перегенерированный урок под своим отпечатком и вместо previous"""
+        origin = await self.cache.aget(self._origin_key(previous), agent=_ORIGIN_AGENT)
+        payload = lesson.model_dump_json()
+        await self.cache.aset(fingerprint, payload)
+        if origin is not None and origin != fingerprint:
+            await self.cache.aset(origin, payload)
+        # Обратная запись ведет к исходному отпечатку: урок можно перегенерировать снова
+        await self.cache.aset(self._origin_key(lesson), origin or fingerprint)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        counters = stats["agents"].get(_AGENT, {})
+        reused = counters.get("hits", 0)
+        lookups = reused + counters.get("misses", 0)
+        return {
+            "memory_entries": stats["memory_entries"],
+            "persistent": stats["persistent"],
+            "lookups": lookups,
+            "reused": reused,
+            "reuse_rate": round(reused / lookups, 3) if lookups else 0.0,
+        }
+
+
+_lesson_result_store: LessonResultStore | None = None
+
+
+def lesson_results_enabled() -> bool:
+    return os.getenv("LESSON_RESULTS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def get_lesson_result_store() -> LessonResultStore:
+    """Возвращает общее хранилище уроков (создается лениво из переменных окружения)"""
+    global _lesson_result_store
+    if _lesson_result_store is None:
+        ttl_seconds = int(os.getenv("LESSON_RESULTS_TTL_SECONDS", "604800"))
+        db_path = os.getenv("LESSON_RESULTS_DB_PATH", "lesson_results.sqlite3")
+        persistent = None
+        if db_path:
+            persistent = SQLiteCacheBackend(
+                db_path,
+                max_entries=int(os.getenv("LESSON_RESULTS_PERSISTENT_MAX_ENTRIES", "50000")),
+                ttl_seconds=ttl_seconds,
+            )
+        _lesson_result_store = LessonResultStore(LLMCache(
+            max_entries=int(os.getenv("LESSON_RESULTS_MAX_ENTRIES", "2000")),
+            ttl_seconds=ttl_seconds,
+            persistent=persistent,
+        ))
+    return _lesson_result_store
+
+
+def set_lesson_result_store(store: LessonResultStore | None) -> None:
+    """Подменяет общее хранилище (например, хранилищем без файла в тестах)"""
+    global _lesson_result_store
+    _lesson_result_store = store
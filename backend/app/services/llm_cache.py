@@ -0,0 +1,408 @@
+"""Кэш ответов LLM, общий для всех агентов
+
+Ключ кэша — хэш от отрендеренного промпта, имени модели, температуры и режима ответа (JSON mode).
+Два уровня хранения:
+1. In-process LRU (быстрый, живет в памяти воркера)
+2. Персистентный SQLite (переживает перезапуск, общий для воркеров на одной машине)
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from app.services.rate_limiter import get_llm_scheduler
+
+
+class SQLiteCacheBackend:
+    """Персистентный уровень кэша на SQLite с TTL и ограничением по размеру
+
+    Просроченные и лишние записи удаляются раз в evict_every записей, а не при
+    каждой: размер файла может превышать max_entries не больше чем на evict_every.
+    Чтение просроченной записи ее не возвращает независимо от очистки.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int, evict_every: int = 100):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = max(1, evict_every)
+        self._writes_since_evict = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_llm_cache_created_at ON llm_cache (created_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= self.evict_every:
+                self._writes_since_evict = 0
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """Удаляет просроченные записи и самые давно использованные сверх лимита"""
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                """DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?
+                )""",
+                (overflow,),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class LLMCache:
+    """Двухуровневый кэш ответов LLM со счетчиками попаданий"""
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: int = 86400,
+        persistent: SQLiteCacheBackend | None = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self._memory: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(prompt: str, model: str, temperature: float, json_mode: bool = False) -> str:
+        """Строит ключ кэша из промпта, модели, температуры и режима ответа"""
+        raw = f"{model}\x00{temperature:.3f}\x00{prompt}"
+        if json_mode:
+            # Суффикс только для JSON mode: ключи обычных ответов остаются прежними
+            raw += "\x00json"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, agent: str, field: str) -> None:
+        counters = self._counters.setdefault(
+            agent, {"hits": 0, "memory_hits": 0, "persistent_hits": 0, "misses": 0}
+        )
+        counters[field] += 1
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            created_at, value = item
+            if time.time() - created_at > self.ttl_seconds:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._memory[key] = (time.time(), value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    async def aget(self, key: str, agent: str = "default") -> Optional[str]:
+        """Ищет ответ сначала в памяти, затем в персистентном хранилище"""
+        value = self._memory_get(key)
+        if value is not None:
+            self._count(agent, "hits")
+            self._count(agent, "memory_hits")
+            return value
+
+        if self.persistent is not None:
+            try:
+                value = await asyncio.to_thread(self.persistent.get, key)
+            except sqlite3.Error as e:
+                print(f"Ошибка чтения кэша LLM: {e}")
+                value = None
+            if value is not None:
+                self._memory_set(key, value)
+                self._count(agent, "hits")
+                self._count(agent, "persistent_hits")
+                return value
+
+        self._count(agent, "misses")
+        return None
+
+    async def aset(self, key: str, value: str) -> None:
+        """Сохраняет ответ на обоих уровнях"""
+        self._memory_set(key, value)
+        if self.persistent is not None:
+            try:
+                await asyncio.to_thread(self.persistent.set, key, value)
+            except sqlite3.Error as e:
+                print(f"Ошибка записи кэша LLM: {e}")
+
+    async def adelete(self, key: str) -> None:
+        """Удаляет ответ с обоих уровней"""
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.persistent is not None:
+            try:
+                await asyncio.to_thread(self.persistent.delete, key)
+            except sqlite3.Error as e:
+                print(f"Ошибка удаления из кэша LLM: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики попаданий/промахов по агентам"""
+        total_hits = sum(c["hits"] for c in self._counters.values())
+        total_misses = sum(c["misses"] for c in self._counters.values())
+        lookups = total_hits + total_misses
+        return {
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self.persistent.path if self.persistent else None,
+            "hits": total_hits,
+            "misses": total_misses,
+            "hit_rate": round(total_hits / lookups, 3) if lookups else 0.0,
+            "agents": {agent: dict(c) for agent, c in self._counters.items()},
+        }
+
+
+_llm_cache: LLMCache | None = None
+
+
+def get_llm_cache() -> LLMCache:
+    """Возвращает общий экземпляр кэша (создается лениво из переменных окружения)"""
+    global _llm_cache
+    if _llm_cache is None:
+        ttl_seconds = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+        db_path = os.getenv("LLM_CACHE_DB_PATH", "llm_cache.sqlite3")
+        persistent = None
+        if db_path:
+            persistent = SQLiteCacheBackend(
+                db_path,
+                max_entries=int(os.getenv("LLM_CACHE_PERSISTENT_MAX_ENTRIES", "50000")),
+                ttl_seconds=ttl_seconds,
+                evict_every=int(os.getenv("LLM_CACHE_EVICT_EVERY", "100")),
+            )
+        _llm_cache = LLMCache(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000")),
+            ttl_seconds=ttl_seconds,
+            persistent=persistent,
+        )
+    return _llm_cache
+
+
+def set_llm_cache(cache: LLMCache | None) -> None:
+    """Подменяет общий кэш (например, на кэш без персистентного уровня в тестах)"""
+    global _llm_cache
+    _llm_cache = cache
+
+
+# Внутри refresh_cache() ответы берутся у модели заново (например, при перегенерации урока)
+_refresh_cache: ContextVar[bool] = ContextVar("llm_cache_refresh", default=False)
+
+
+@contextmanager
+def refresh_cache() -> Iterator[None]:
+    """Вызовы внутри блока (и запущенные из него задачи) не читают кэш, но сохраняют в него новые ответы"""
+    token = _refresh_cache.set(True)
+    try:
+        yield
+    finally:
+        _refresh_cache.reset(token)
+
+
+def cache_refresh_requested() -> bool:
+    """True внутри refresh_cache() - для хранилищ готовых результатов поверх кэша"""
+    return _refresh_cache.get()
+
+
+class DeferredCacheWrites:
+    """Ответы модели, которые попадают в кэш только после проверки вызывающим
+
+    Передается в ainvoke_cached/astream_text: новые ответы копятся здесь,
+    а не пишутся в кэш сразу. commit() сохраняет их, когда ответ разобран и
+    провалидирован; discard() забывает их и удаляет из кэша ответы, прочитанные
+    из него в этом вызове, - иначе негодный ответ возвращался бы весь TTL.
+    """
+
+    def __init__(self):
+        self.writes: List[Tuple[str, str]] = []
+        self.read_keys: List[str] = []
+
+    async def commit(self) -> None:
+        cache = get_llm_cache()
+        for key, value in self.writes:
+            await cache.aset(key, value)
+        self.writes.clear()
+        self.read_keys.clear()
+
+    async def discard(self) -> None:
+        cache = get_llm_cache()
+        for key in self.read_keys:
+            await cache.adelete(key)
+        self.writes.clear()
+        self.read_keys.clear()
+
+
+def cache_enabled_for(temperature: float, use_cache: bool | None = None) -> bool:
+    """Решает, кэшировать ли вызовы агента
+
+    Явный use_cache имеет приоритет; иначе кэшируются только вызовы
+    с температурой не выше LLM_CACHE_MAX_TEMPERATURE.
+    """
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return False
+    if use_cache is not None:
+        return use_cache
+    return temperature <= float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "1.0"))
+
+
+async def ainvoke_cached(
+    prompt_template: Any,
+    llm: Any,
+    variables: Dict[str, Any],
+    agent: str = "default",
+    use_cache: bool = True,
+    json_mode: bool = False,
+    deferred: DeferredCacheWrites | None = None,
+) -> str:
+    """Рендерит промпт, вызывает модель через планировщик и возвращает текст ответа через кэш
+
+    json_mode=True просит модель вернуть JSON-объект (response_format=json_object).
+    С deferred ответ сохраняется в кэш только после deferred.commit().
+    """
+    prompt_value = await prompt_template.ainvoke(variables)
+    prompt = prompt_value.to_string()
+    model = getattr(llm, "model_name", "")
+
+    if use_cache:
+        cache = get_llm_cache()
+        key = cache.make_key(prompt, model, float(getattr(llm, "temperature", 0.0) or 0.0), json_mode)
+        cached = None if _refresh_cache.get() else await cache.aget(key, agent=agent)
+        if cached is not None:
+            if deferred is not None:
+                deferred.read_keys.append(key)
+            return cached
+
+    # Все обращения к модели проходят через общий планировщик лимитов
+    async with get_llm_scheduler().slot(model, prompt):
+        if json_mode:
+            response = await llm.ainvoke(prompt_value, response_format={"type": "json_object"})
+        else:
+            response = await llm.ainvoke(prompt_value)
+    content = response.content
+
+    if use_cache:
+        if deferred is not None:
+            deferred.writes.append((key, content))
+        else:
+            await cache.aset(key, content)
+    return content
+
+
+async def astream_text(
+    prompt_template: Any,
+    llm: Any,
+    variables: Dict[str, Any],
+    agent: str = "default",
+    use_cache: bool = False,
+    json_mode: bool = False,
+    deferred: DeferredCacheWrites | None = None,
+) -> AsyncIterator[str]:
+    """Рендерит промпт и отдает текст ответа по частям
+
+    Слот планировщика занят, пока идет поток. Если потребитель прекращает
+    чтение (клиент отключился), генератор закрывается вместе с запросом к модели.
+    С use_cache=True ответ из кэша отдается одним фрагментом, а полностью
+    полученный поток сохраняется в кэш (с deferred - после deferred.commit()).
+    """
+    prompt_value = await prompt_template.ainvoke(variables)
+    prompt = prompt_value.to_string()
+    model = getattr(llm, "model_name", "")
+
+    if use_cache:
+        cache = get_llm_cache()
+        key = cache.make_key(prompt, model, float(getattr(llm, "temperature", 0.0) or 0.0), json_mode)
+        cached = None if _refresh_cache.get() else await cache.aget(key, agent=agent)
+        if cached is not None:
+            if deferred is not None:
+                deferred.read_keys.append(key)
+            yield cached
+            return
+
+    parts = []
+    kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+    async with get_llm_scheduler().slot(model, prompt):
+        stream = llm.astream(prompt_value, **kwargs)
+        try:
+            async for chunk in stream:
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+        finally:
+            await stream.aclose()
+
+    if use_cache:
+        if deferred is not None:
+            deferred.writes.append((key, "".join(parts)))
+        else:
+            await cache.aset(key, "".join(parts))
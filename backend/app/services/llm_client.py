@@ -0,0 +1,113 @@
+"""Реестр LLM-клиентов, общий для всех агентов
+
+Все модели (и эмбеддинги) используют один пул HTTP-соединений к OpenAI (keep-alive, лимиты
+соединений, таймауты). Повторы при 429/5xx выполняет SDK OpenAI:
+экспоненциальная задержка со случайным разбросом (jitter) и учетом Retry-After,
+число попыток задается LLM_MAX_RETRIES.
+"""
+from typing import Any, Callable, Dict, Tuple
+import os
+
+import httpx
+import openai
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+
+class LLMClientRegistry:
+    """Выдает модели по (имя модели, температура) поверх общего пула соединений"""
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, float], Any] = {}
+        self._embeddings: Dict[str, Any] = {}
+        self._factory: Callable[[str, float], Any] | None = None
+        self._sync_client: openai.OpenAI | None = None
+        self._async_client: openai.AsyncOpenAI | None = None
+
+    @staticmethod
+    def default_model() -> str:
+        return os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+    def _http_settings(self) -> Dict[str, Any]:
+        return {
+            "limits": httpx.Limits(
+                max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+                keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "30")),
+            ),
+            "timeout": httpx.Timeout(
+                float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "120")),
+                connect=float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT_SECONDS", "10")),
+            ),
+        }
+
+    def _build_clients(self) -> None:
+        http2 = os.getenv("LLM_HTTP2", "false").lower() in ("1", "true", "yes")
+        settings = self._http_settings()
+        try:
+            sync_http = httpx.Client(http2=http2, **settings)
+            async_http = httpx.AsyncClient(http2=http2, **settings)
+        except ImportError:
+            # HTTP/2 требует пакет h2 (httpx[http2])
+            print("Пакет h2 не установлен, LLM-клиент использует HTTP/1.1")
+            sync_http = httpx.Client(**settings)
+            async_http = httpx.AsyncClient(**settings)
+
+        max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self._sync_client = openai.OpenAI(http_client=sync_http, max_retries=max_retries)
+        self._async_client = openai.AsyncOpenAI(http_client=async_http, max_retries=max_retries)
+
+    def get(self, model: str | None = None, temperature: float = 0.7) -> Any:
+        """Возвращает модель с нужными параметрами (экземпляры переиспользуются)"""
+        model = model or self.default_model()
+        key = (model, round(float(temperature), 3))
+        if key not in self._models:
+            if self._factory is not None:
+                self._models[key] = self._factory(model, temperature)
+            else:
+                if self._async_client is None:
+                    self._build_clients()
+                self._models[key] = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    client=self._sync_client.chat.completions,
+                    async_client=self._async_client.chat.completions,
+                    max_retries=self._async_client.max_retries,
+                )
+        return self._models[key]
+
+    def get_embeddings(self, model: str) -> Any:
+        """Клиент эмбеддингов поверх того же пула соединений"""
+        if model not in self._embeddings:
+            if self._async_client is None:
+                self._build_clients()
+            self._embeddings[model] = OpenAIEmbeddings(
+                model=model,
+                client=self._sync_client.embeddings,
+                async_client=self._async_client.embeddings,
+                max_retries=self._async_client.max_retries,
+            )
+        return self._embeddings[model]
+
+    def set_factory(self, factory: Callable[[str, float], Any] | None) -> None:
+        """Подменяет создание моделей (например, локальным фейком в тестах)"""
+        self._factory = factory
+        self._models.clear()
+
+    async def aclose(self) -> None:
+        """Закрывает пул соединений"""
+        if self._async_client is not None:
+            await self._async_client.close()
+        if self._sync_client is not None:
+            self._sync_client.close()
+        self._sync_client = None
+        self._async_client = None
+        self._models.clear()
+        self._embeddings.clear()
+
+
+llm_registry = LLMClientRegistry()
+
+
+def get_llm(model: str | None = None, temperature: float = 0.7) -> Any:
+    """Модель из общего реестра"""
+    return llm_registry.get(model=model, temperature=temperature)
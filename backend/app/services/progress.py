@@ -0,0 +1,172 @@
+"""Учет прогресса студентов по урокам
+
+Прогресс обновляется инкрементально, без пересчета пройденных уроков:
+- запись на курс и отметка урока - идемпотентные upsert по уникальным ключам
+  (user_id, course_id) и (enrollment_id, lesson_id), без чтения перед записью;
+- Enrollment.completed_lessons_count увеличивается только когда upsert действительно
+  перевел урок в пройденные, а progress_percent считается из него и заранее
+  посчитанного Course.lessons_count;
+- heartbeat-обновления времени приходят пакетом и пишутся одним upsert (executemany).
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+import uuid
+
+from sqlalchemy import case, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import db_models
+
+
+def _insert(db: AsyncSession, model):
+    """INSERT с поддержкой ON CONFLICT для текущей СУБД"""
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
+
+
+async def get_lessons_courses(db: AsyncSession, lesson_ids: Iterable[UUID]) -> Dict[UUID, Tuple[UUID, int]]:
+    """lesson_id -> (course_id, число уроков курса) одним запросом"""
+    lesson, module, course = db_models.Lesson, db_models.CourseModule, db_models.Course
+    rows = await db.execute(
+        select(lesson.id, course.id, course.lessons_count)
+        .join(module, lesson.module_id == module.id)
+        .join(course, module.course_id == course.id)
+        .where(lesson.id.in_(list(lesson_ids)))
+    )
+    return {lesson_id: (course_id, lessons_count) for lesson_id, course_id, lessons_count in rows}
+
+
+async def ensure_enrollments(db: AsyncSession, user_id: UUID, course_ids: Iterable[UUID]) -> Dict[UUID, UUID]:
+    """Записывает пользователя на курсы (если еще не записан); course_id -> enrollment_id"""
+    now = datetime.now(timezone.utc)
+    enrollments: Dict[UUID, UUID] = {}
+    for course_id in set(course_ids):
+        statement = _insert(db, db_models.Enrollment).values(
+            id=uuid.uuid4(), user_id=user_id, course_id=course_id, last_accessed_at=now,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "course_id"],
+            set_={"last_accessed_at": now},
+        ).returning(db_models.Enrollment.id)
+        enrollments[course_id] = (await db.execute(statement)).scalar_one()
+    return enrollments
+
+
+async def complete_lesson(db: AsyncSession, user_id: UUID, lesson_id: UUID) -> Optional[Dict[str, Any]]:
+    """Отмечает урок пройденным; None, если урока нет. Повторный вызов ничего не меняет"""
+    courses = await get_lessons_courses(db, [lesson_id])
+    if lesson_id not in courses:
+        return None
+    course_id, lessons_total = courses[lesson_id]
+    enrollment_id = (await ensure_enrollments(db, user_id, [course_id]))[course_id]
+    now = datetime.now(timezone.utc)
+
+    progress = db_models.StudentProgress
+    statement = _insert(db, progress).values(
+        id=uuid.uuid4(), enrollment_id=enrollment_id, lesson_id=lesson_id, completed_at=now,
+    )
+    # Строка возвращается только если урок впервые стал пройденным
+    statement = statement.on_conflict_do_update(
+        index_elements=["enrollment_id", "lesson_id"],
+        set_={"completed_at": now},
+        where=progress.completed_at.is_(None),
+    ).returning(progress.id)
+    newly_completed = (await db.execute(statement)).first() is not None
+
+    enrollment = db_models.Enrollment
+    if newly_completed:
+        completed = enrollment.completed_lessons_count + 1
+        finished = completed >= lessons_total
+        result = await db.execute(
+            update(enrollment)
+            .where(enrollment.id == enrollment_id)
+            .values(
+                completed_lessons_count=completed,
+                progress_percent=case((finished, 100), else_=completed * 100 // max(lessons_total, 1)),
+                completed_at=case((finished, now), else_=enrollment.completed_at),
+                last_accessed_at=now,
+            )
+            .returning(enrollment.progress_percent, enrollment.completed_lessons_count)
+        )
+    else:
+        result = await db.execute(
+            select(enrollment.progress_percent, enrollment.completed_lessons_count)
+            .where(enrollment.id == enrollment_id)
+        )
+    progress_percent, completed_lessons = result.one()
+    return {
+        "course_id": course_id,
+        "enrollment_id": enrollment_id,
+        "lesson_id": lesson_id,
+        "newly_completed": newly_completed,
+        "progress_percent": progress_percent,
+        "completed_lessons": completed_lessons,
+        "lessons_total": lessons_total,
+    }
+
+
+async def record_heartbeats(db: AsyncSession, user_id: UUID, items: Iterable[Tuple[UUID, int]]) -> Dict[str, Any]:
+    """Добавляет время, проведенное в уроках, пакетом (lesson_id, секунды)"""
+    seconds_by_lesson: Dict[UUID, int] = defaultdict(int)
+    for lesson_id, seconds in items:
+        seconds_by_lesson[lesson_id] += seconds
+    if not seconds_by_lesson:
+        return {"accepted": 0, "unknown_lessons": []}
+
+    courses = await get_lessons_courses(db, seconds_by_lesson)
+    unknown = [lesson_id for lesson_id in seconds_by_lesson if lesson_id not in courses]
+    if not courses:
+        return {"accepted": 0, "unknown_lessons": unknown}
+    enrollments = await ensure_enrollments(db, user_id, (course_id for course_id, _ in courses.values()))
+
+    progress = db_models.StudentProgress
+    statement = _insert(db, progress)
+    total_seconds = progress.time_spent_seconds + statement.excluded.time_spent_seconds
+    statement = statement.on_conflict_do_update(
+        index_elements=["enrollment_id", "lesson_id"],
+        set_={
+            "time_spent_seconds": total_seconds,
+            "time_spent_minutes": total_seconds // 60,
+        },
+    )
+    await db.execute(statement, [
+        {
+            "id": uuid.uuid4(),
+            "enrollment_id": enrollments[courses[lesson_id][0]],
+            "lesson_id": lesson_id,
+            "time_spent_seconds": seconds,
+            "time_spent_minutes": seconds // 60,
+        }
+        for lesson_id, seconds in seconds_by_lesson.items()
+        if lesson_id in courses
+    ])
+    return {"accepted": len(courses), "unknown_lessons": unknown}
+
+
+async def get_course_progress(db: AsyncSession, user_id: UUID, course_id: UUID) -> Optional[Dict[str, Any]]:
+    """Прогресс пользователя по курсу; None, если пользователь не записан"""
+    enrollment = db_models.Enrollment
+    row = (await db.execute(
+        select(enrollment, db_models.Course.lessons_count)
+        .join(db_models.Course, enrollment.course_id == db_models.Course.id)
+        .where(enrollment.user_id == user_id, enrollment.course_id == course_id)
+    )).first()
+    if row is None:
+        return None
+    enrollment_row, lessons_total = row
+    lessons: List[db_models.StudentProgress] = list((await db.execute(
+        select(db_models.StudentProgress).where(db_models.StudentProgress.enrollment_id == enrollment_row.id)
+    )).scalars())
+    return {
+        "course_id": course_id,
+        "enrollment_id": enrollment_row.id,
+        "progress_percent": enrollment_row.progress_percent,
+        "completed_lessons": enrollment_row.completed_lessons_count,
+        "lessons_total": lessons_total,
+        "completed_at": enrollment_row.completed_at,
+        "last_accessed_at": enrollment_row.last_accessed_at,
+        "lessons": lessons,
+    }
@@ -0,0 +1,185 @@
+"""Глобальный планировщик обращений к LLM с лимитами по моделям
+
+Для каждой модели держит два token bucket (запросы в минуту и токены в минуту),
+ограничение числа одновременных запросов и длину очереди ожидания.
+Когда очередь переполнена, новые вызовы сразу получают QueueFullError
+с рекомендуемой задержкой (для ответа 429 с Retry-After).
+"""
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+import asyncio
+import json
+import math
+import os
+import time
+
+
+class QueueFullError(Exception):
+    """Очередь к модели переполнена, запрос стоит повторить позже"""
+
+    def __init__(self, model: str, retry_after: float):
+        self.model = model
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            f"Очередь запросов к модели '{model}' переполнена, повторите через {self.retry_after} с"
+        )
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (≈4 символа на токен)"""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Token bucket, пополняемый равномерно в течение минуты"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        """Сколько секунд ждать, пока в ведре наберется amount"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class ModelRateLimiter:
+    """Лимиты одной модели: RPM, TPM, параллельность и длина очереди"""
+
+    def __init__(self, model: str, rpm: int, tpm: int, max_concurrent: int, max_queue: int):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_queue = max_queue
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._concurrency = asyncio.Semaphore(max_concurrent)
+        self.max_concurrent = max_concurrent
+        # asyncio.Lock отдает блокировку в порядке очереди (FIFO)
+        self._budget_lock = asyncio.Lock()
+        self.waiting = 0
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+
+    def retry_after(self, extra: int = 1) -> float:
+        """Оценка времени, за которое очередь разгребется до нового запроса"""
+        return (self.waiting + extra) * 60.0 / self.rpm
+
+    def ensure_capacity(self, extra: int = 1) -> None:
+        """Admission control: отказ, если очередь не вместит еще extra запросов"""
+        if self.waiting + extra > self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self.model, self.retry_after(extra))
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int) -> AsyncIterator[None]:
+        self.ensure_capacity()
+        self.waiting += 1
+        try:
+            async with self._budget_lock:
+                while True:
+                    wait = max(
+                        self.requests.time_until(1),
+                        self.tokens.time_until(estimated_tokens),
+                    )
+                    if wait <= 0:
+                        self.requests.consume(1)
+                        self.tokens.consume(estimated_tokens)
+                        break
+                    await asyncio.sleep(wait)
+            await self._concurrency.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._concurrency.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+class LLMScheduler:
+    """Реестр лимитеров по моделям, общий для всех агентов"""
+
+    def __init__(
+        self,
+        rpm: int | None = None,
+        tpm: int | None = None,
+        max_concurrent: int | None = None,
+        max_queue: int | None = None,
+        model_limits: Dict[str, Dict[str, int]] | None = None,
+    ):
+        self.defaults = {
+            "rpm": rpm or int(os.getenv("LLM_RPM_LIMIT", "500")),
+            "tpm": tpm or int(os.getenv("LLM_TPM_LIMIT", "200000")),
+            "max_concurrent": max_concurrent or int(os.getenv("LLM_MAX_CONCURRENT_REQUESTS", "32")),
+            "max_queue": max_queue or int(os.getenv("LLM_MAX_QUEUED_REQUESTS", "256")),
+        }
+        if model_limits is None:
+            # Например: LLM_MODEL_LIMITS='{"gpt-4o": {"rpm": 500, "tpm": 30000}}'
+            model_limits = json.loads(os.getenv("LLM_MODEL_LIMITS", "{}") or "{}")
+        self.model_limits = model_limits
+        self.estimated_output_tokens = int(os.getenv("LLM_ESTIMATED_OUTPUT_TOKENS", "800"))
+        self._limiters: Dict[str, ModelRateLimiter] = {}
+
+    def limiter(self, model: str) -> ModelRateLimiter:
+        if model not in self._limiters:
+            limits = {**self.defaults, **self.model_limits.get(model, {})}
+            self._limiters[model] = ModelRateLimiter(model=model, **limits)
+        return self._limiters[model]
+
+    def slot(self, model: str, prompt: str):
+        """Контекст, внутри которого разрешено обращаться к модели"""
+        return self.limiter(model).slot(estimate_tokens(prompt) + self.estimated_output_tokens)
+
+    def ensure_capacity(self, model: str, extra: int = 1) -> None:
+        self.limiter(model).ensure_capacity(extra)
+
+    def stats(self) -> Dict[str, Any]:
+        return {model: limiter.stats() for model, limiter in self._limiters.items()}
+
+
+_scheduler: LLMScheduler | None = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Возвращает общий планировщик (создается лениво из переменных окружения)"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def set_llm_scheduler(scheduler: LLMScheduler | None) -> None:
+    """Подменяет общий планировщик (например, с другими лимитами в тестах)"""
+    global _scheduler
+    _scheduler = scheduler
@@ -0,0 +1,138 @@
+"""Индекс переданных материалов (reference_files) для генерации курса
+
+Файлы любого размера режутся на перекрывающиеся фрагменты по словам
+(REFERENCE_CHUNK_WORDS слов, перекрытие REFERENCE_CHUNK_OVERLAP), по фрагментам
+строится BM25-индекс отдельного курса. В промпты структуры и уроков попадают
+только наиболее релевантные фрагменты (REFERENCE_TOP_K, не больше
+REFERENCE_CONTEXT_MAX_CHARS символов), поэтому размер промпта не зависит
+от объема загруженных материалов.
+"""
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List
+import math
+import os
+import re
+
+from app.services.search import tokenize
+
+_WORD_SPAN_RE = re.compile(r"\S+")
+
+
+@dataclass
+class ReferenceChunk:
+    """Фрагмент переданного материала"""
+    source: str
+    index: int
+    text: str
+
+
+def iter_chunks(text: str, chunk_words: int, overlap: int) -> Iterator[str]:
+    """Проходит по тексту один раз и отдает фрагменты с перекрытием
+
+    Фрагмент вырезается из исходного текста по позициям слов, поэтому
+    переносы строк и форматирование сохраняются.
+    """
+    step = max(1, chunk_words - overlap)
+    window: deque = deque()
+    since_last = 0
+    for match in _WORD_SPAN_RE.finditer(text):
+        window.append((match.start(), match.end()))
+        since_last += 1
+        if len(window) > chunk_words:
+            window.popleft()
+        if len(window) == chunk_words and since_last >= step:
+            since_last = 0
+            yield text[window[0][0]:window[-1][1]]
+    if window and (since_last > 0 or len(window) < chunk_words):
+        # Хвост, не вошедший в последний полный фрагмент
+        yield text[window[0][0]:window[-1][1]]
+
+
+class ReferenceIndex:
+    """BM25-индекс по фрагментам материалов одного курса"""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(
+        self,
+        chunk_words: int | None = None,
+        overlap: int | None = None,
+        top_k: int | None = None,
+        max_context_chars: int | None = None,
+    ):
+        self.chunk_words = chunk_words or int(os.getenv("REFERENCE_CHUNK_WORDS", "200"))
+        self.overlap = min(overlap or int(os.getenv("REFERENCE_CHUNK_OVERLAP", "40")), self.chunk_words - 1)
+        self.top_k = top_k or int(os.getenv("REFERENCE_TOP_K", "4"))
+        self.max_context_chars = max_context_chars or int(os.getenv("REFERENCE_CONTEXT_MAX_CHARS", "6000"))
+        self.sources: List[str] = []
+        self.chunks: List[ReferenceChunk] = []
+        self._lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+
+    @classmethod
+    def from_files(cls, reference_files: Iterable[Any], **options) -> "ReferenceIndex":
+        """Индекс из ReferenceFile или словарей с полями name/content"""
+        index = cls(**options)
+        for item in reference_files or []:
+            if hasattr(item, "model_dump"):
+                item = item.model_dump()
+            index.add_file(item.get("name") or "Материал", item.get("content") or "")
+        return index
+
+    def add_file(self, name: str, content: str) -> None:
+        self.sources.append(name)
+        for position, chunk_text in enumerate(iter_chunks(content, self.chunk_words, self.overlap)):
+            chunk_index = len(self.chunks)
+            freqs: Dict[str, int] = defaultdict(int)
+            for token in tokenize(chunk_text):
+                freqs[token] += 1
+            self.chunks.append(ReferenceChunk(source=name, index=position, text=chunk_text))
+            self._lengths.append(sum(freqs.values()))
+            for token, freq in freqs.items():
+                self.postings[token][chunk_index] = freq
+
+    def __bool__(self) -> bool:
+        return bool(self.chunks)
+
+    def search(self, query: str, k: int | None = None) -> List[ReferenceChunk]:
+        """Топ-k фрагментов по BM25"""
+        k = k or self.top_k
+        if not self.chunks:
+            return []
+        total = len(self.chunks)
+        avg_length = sum(self._lengths) / total or 1
+        scores: Dict[int, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_index, freq in postings.items():
+                norm = 1 - self.b + self.b * self._lengths[chunk_index] / avg_length
+                scores[chunk_index] += idf * freq * (self.k1 + 1) / (freq + self.k1 * norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [self.chunks[chunk_index] for chunk_index, _ in ranked]
+
+    def context(self, query: str, k: int | None = None) -> str:
+        """Релевантные фрагменты для промпта (не длиннее max_context_chars)"""
+        return self._format(self.search(query, k))
+
+    def overview(self) -> str:
+        """Начальные фрагменты каждого файла - когда запрос ничего не нашел"""
+        first_chunks = [chunk for chunk in self.chunks if chunk.index == 0]
+        return self._format(first_chunks)
+
+    def _format(self, chunks: List[ReferenceChunk]) -> str:
+        parts: List[str] = []
+        used = 0
+        for chunk in chunks:
+            part = f"[{chunk.source}, фрагмент {chunk.index + 1}]\n{chunk.text}"
+            if used + len(part) > self.max_context_chars:
+                if not parts:
+                    parts.append(part[:self.max_context_chars])
+                break
+            parts.append(part)
+            used += len(part)
+        return "\n\n".join(parts)
@@ -0,0 +1,491 @@
+"""Поиск по курсам, урокам и терминам
+
+Два бэкенда с одним интерфейсом:
+1. PostgreSQL - tsvector (конфигурации russian и english) по GIN-индексам
+   и pg_trgm для опечаток и подстрок в коротких полях; подсветка через ts_headline
+   считается только для строк, попавших в итоговый топ.
+2. Остальные СУБД (SQLite в разработке и тестах) - инвертированный индекс в памяти
+   с ранжированием BM25, поиском по префиксу и нечетким совпадением по триграммам.
+
+Ищутся только публичные курсы и курсы самого пользователя.
+
+Заголовки и фрагменты в результатах - HTML: текст курсов экранируется,
+и единственная разметка в нем - добавленные поиском <mark>.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+import asyncio
+import html
+import math
+import re
+import time
+
+from sqlalchemy import and_, desc, event, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import db_models
+from app.db_models import search_vector
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_CYRILLIC_RE = re.compile(r"[а-яё]", re.IGNORECASE)
+
+
+def tokenize(text_value: str) -> List[str]:
+    return [token.replace("ё", "е") for token in _TOKEN_RE.findall(text_value.lower())]
+
+
+def headline_config(query: str) -> str:
+    """Конфигурация для подсветки: русская для запросов на кириллице"""
+    return "russian" if _CYRILLIC_RE.search(query) else "english"
+
+
+def _visibility(viewer_id: UUID | None):
+    course = db_models.Course
+    public = and_(course.is_public.is_(True), course.is_private.is_(False))
+    if viewer_id is None:
+        return public
+    return or_(public, course.created_by == viewer_id)
+
+
+# ---- PostgreSQL ----
+
+class PostgresSearchBackend:
+    """Полнотекстовый поиск на стороне PostgreSQL"""
+
+    headline_options = (
+        f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, "
+        "MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=\" … \""
+    )
+
+    async def search(self, db: AsyncSession, query: str, limit: int, viewer_id: UUID | None) -> List[Dict[str, Any]]:
+        hits: List[Dict[str, Any]] = []
+        hits += await self._search_courses(db, query, limit, viewer_id)
+        hits += await self._search_lessons(db, query, limit, viewer_id)
+        hits += await self._search_terms(db, query, limit, viewer_id)
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+        return hits[:limit]
+
+    @staticmethod
+    def _match(query: str, *columns):
+        """Условие совпадения и ранг по обеим конфигурациям (выражения совпадают с индексами)"""
+        conditions, ranks = [], []
+        for config in db_models.SEARCH_CONFIGS:
+            vector = search_vector(config, *columns)
+            tsquery = func.websearch_to_tsquery(text(f"'{config}'"), query)
+            conditions.append(vector.op("@@")(tsquery))
+            ranks.append(func.ts_rank_cd(vector, tsquery))
+        return conditions, ranks
+
+    @staticmethod
+    def _escaped(column):
+        """HTML-экранирование текста до ts_headline (как html.escape(quote=False))"""
+        value = func.coalesce(column, "")
+        for char, entity in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;")):
+            value = func.replace(value, char, entity)
+        return value
+
+    def _headline(self, query: str, column):
+        config = headline_config(query)
+        return func.ts_headline(
+            text(f"'{config}'"),
+            self._escaped(column),
+            func.websearch_to_tsquery(text(f"'{config}'"), query),
+            self.headline_options,
+        )
+
+    async def _search_courses(self, db, query, limit, viewer_id):
+        course = db_models.Course
+        conditions, ranks = self._match(query, course.title, course.description)
+        similarity = func.similarity(course.title, query)
+        top = (
+            select(
+                course.id,
+                course.title,
+                course.description,
+                func.greatest(*ranks, similarity).label("score"),
+            )
+            .where(or_(*conditions, course.title.op("%")(query)), _visibility(viewer_id))
+            .order_by(desc("score"))
+            .limit(limit)
+            .subquery()
+        )
+        rows = await db.execute(
+            select(
+                top.c.id,
+                top.c.title,
+                self._headline(query, top.c.title).label("title_hl"),
+                self._headline(query, top.c.description).label("snippet"),
+                top.c.score,
+            ).order_by(top.c.score.desc())
+        )
+        return [
+            {
+                "type": "course",
+                "course_id": row.id,
+                "course_title": row.title,
+                "lesson_id": None,
+                "title": row.title_hl,
+                "snippet": row.snippet,
+                "score": float(row.score),
+            }
+            for row in rows
+        ]
+
+    async def _search_lessons(self, db, query, limit, viewer_id):
+        lesson, module, course = db_models.Lesson, db_models.CourseModule, db_models.Course
+        conditions, ranks = self._match(query, lesson.title, lesson.content)
+        top = (
+            select(
+                lesson.id,
+                lesson.title,
+                lesson.content,
+                course.id.label("course_id"),
+                course.title.label("course_title"),
+                func.greatest(*ranks).label("score"),
+            )
+            .join(module, lesson.module_id == module.id)
+            .join(course, module.course_id == course.id)
+            .where(or_(*conditions), _visibility(viewer_id))
+            .order_by(desc("score"))
+            .limit(limit)
+            .subquery()
+        )
+        rows = await db.execute(
+            select(
+                top.c.id,
+                top.c.course_id,
+                top.c.course_title,
+                self._headline(query, top.c.title).label("title_hl"),
+                self._headline(query, top.c.content).label("snippet"),
+                top.c.score,
+            ).order_by(top.c.score.desc())
+        )
+        return [
+            {
+                "type": "lesson",
+                "course_id": row.course_id,
+                "course_title": row.course_title,
+                "lesson_id": row.id,
+                "title": row.title_hl,
+                "snippet": row.snippet,
+                "score": float(row.score),
+            }
+            for row in rows
+        ]
+
+    async def _search_terms(self, db, query, limit, viewer_id):
+        term, lesson, module, course = db_models.LessonTerm, db_models.Lesson, db_models.CourseModule, db_models.Course
+        conditions, ranks = self._match(query, term.term, term.explanation)
+        similarity = func.similarity(term.term, query)
+        top = (
+            select(
+                term.term,
+                term.explanation,
+                lesson.id.label("lesson_id"),
+                course.id.label("course_id"),
+                course.title.label("course_title"),
+                func.greatest(*ranks, similarity).label("score"),
+            )
+            .join(lesson, term.lesson_id == lesson.id)
+            .join(module, lesson.module_id == module.id)
+            .join(course, module.course_id == course.id)
+            .where(or_(*conditions, term.term.op("%")(query)), _visibility(viewer_id))
+            .order_by(desc("score"))
+            .limit(limit)
+            .subquery()
+        )
+        rows = await db.execute(
+            select(
+                top.c.lesson_id,
+                top.c.course_id,
+                top.c.course_title,
+                self._headline(query, top.c.term).label("title_hl"),
+                self._headline(query, top.c.explanation).label("snippet"),
+                top.c.score,
+            ).order_by(top.c.score.desc())
+        )
+        return [
+            {
+                "type": "term",
+                "course_id": row.course_id,
+                "course_title": row.course_title,
+                "lesson_id": row.lesson_id,
+                "title": row.title_hl,
+                "snippet": row.snippet,
+                "score": float(row.score),
+            }
+            for row in rows
+        ]
+
+
+# ---- Инвертированный индекс в памяти ----
+
+@dataclass
+class SearchDocument:
+    """Документ индекса: курс, урок или термин"""
+    type: str
+    course_id: UUID
+    course_title: str
+    title: str
+    body: str
+    lesson_id: UUID | None = None
+    is_public: bool = True
+    created_by: UUID | None = None
+    length: int = 0
+    term_freqs: Dict[str, float] = field(default_factory=dict)
+
+
+class InvertedIndex:
+    """Инвертированный индекс с BM25, префиксным и нечетким (триграммы) поиском"""
+
+    title_weight = 2.0
+    k1 = 1.2
+    b = 0.75
+    prefix_penalty = 0.8
+    fuzzy_penalty = 0.6
+    fuzzy_threshold = 0.45
+
+    def __init__(self):
+        self.documents: List[SearchDocument] = []
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._vocabulary: List[str] = []
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self._avg_length = 0.0
+
+    @staticmethod
+    def trigrams(token: str) -> Set[str]:
+        padded = f"  {token} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, document: SearchDocument) -> None:
+        doc_index = len(self.documents)
+        freqs: Dict[str, float] = defaultdict(float)
+        for token in tokenize(document.title):
+            freqs[token] += self.title_weight
+        for token in tokenize(document.body):
+            freqs[token] += 1.0
+        document.term_freqs = dict(freqs)
+        document.length = int(sum(freqs.values()))
+        self.documents.append(document)
+        for token, freq in freqs.items():
+            self.postings[token][doc_index] = freq
+
+    def finalize(self) -> None:
+        """Строит словарь для префиксного и нечеткого поиска (после всех add)"""
+        self._vocabulary = sorted(self.postings)
+        self._trigrams.clear()
+        for token in self._vocabulary:
+            if len(token) >= 4:
+                for trigram in self.trigrams(token):
+                    self._trigrams[trigram].add(token)
+        total = sum(document.length for document in self.documents)
+        self._avg_length = total / len(self.documents) if self.documents else 0.0
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Термины индекса для токена запроса: точное, по префиксу, нечеткое"""
+        if token in self.postings:
+            expansions = [(token, 1.0)]
+        else:
+            expansions = []
+        if len(token) >= 3:
+            start = bisect_left(self._vocabulary, token)
+            for candidate in self._vocabulary[start:start + 50]:
+                if not candidate.startswith(token):
+                    break
+                if candidate != token:
+                    expansions.append((candidate, self.prefix_penalty))
+        if not expansions and len(token) >= 4:
+            query_trigrams = self.trigrams(token)
+            candidates: Dict[str, int] = defaultdict(int)
+            for trigram in query_trigrams:
+                for candidate in self._trigrams.get(trigram, ()):
+                    candidates[candidate] += 1
+            for candidate, shared in candidates.items():
+                similarity = shared / len(query_trigrams | self.trigrams(candidate))
+                if similarity >= self.fuzzy_threshold:
+                    expansions.append((candidate, self.fuzzy_penalty * similarity))
+        return expansions
+
+    def search(self, query: str, limit: int, viewer_id: UUID | None = None) -> List[Dict[str, Any]]:
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, Set[str]] = defaultdict(set)
+        total_docs = len(self.documents)
+
+        for token in set(tokenize(query)):
+            for term, weight in self._expand(token):
+                postings = self.postings[term]
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_index, freq in postings.items():
+                    document = self.documents[doc_index]
+                    norm = 1 - self.b + self.b * document.length / (self._avg_length or 1)
+                    scores[doc_index] += weight * idf * freq * (self.k1 + 1) / (freq + self.k1 * norm)
+                    matched[doc_index].add(term)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        hits = []
+        for doc_index, score in ranked:
+            document = self.documents[doc_index]
+            if not document.is_public and (viewer_id is None or document.created_by != viewer_id):
+                continue
+            hits.append({
+                "type": document.type,
+                "course_id": document.course_id,
+                "course_title": document.course_title,
+                "lesson_id": document.lesson_id,
+                "title": highlight(document.title, matched[doc_index]),
+                "snippet": snippet(document.body, matched[doc_index]),
+                "score": round(score, 4),
+            })
+            if len(hits) >= limit:
+                break
+        return hits
+
+
+def highlight(text_value: str, terms: Iterable[str]) -> str:
+    """Экранирует текст и оборачивает совпавшие слова в <mark>"""
+    terms = set(terms)
+    parts = []
+    position = 0
+    for match in _TOKEN_RE.finditer(text_value):
+        word = match.group(0)
+        if word.lower().replace("ё", "е") in terms:
+            parts.append(html.escape(text_value[position:match.start()], quote=False))
+            parts.append(f"{HIGHLIGHT_START}{html.escape(word, quote=False)}{HIGHLIGHT_END}")
+            position = match.end()
+    parts.append(html.escape(text_value[position:], quote=False))
+    return "".join(parts)
+
+
+def snippet(text_value: str, terms: Iterable[str], words: int = 30) -> Optional[str]:
+    """Фрагмент текста вокруг первого совпадения с подсветкой"""
+    if not text_value:
+        return None
+    terms = set(terms)
+    parts = text_value.split()
+    first = next(
+        (i for i, part in enumerate(parts) if any(token in terms for token in tokenize(part))),
+        0,
+    )
+    start = max(0, first - words // 3)
+    fragment = " ".join(parts[start:start + words])
+    prefix = "… " if start > 0 else ""
+    suffix = " …" if start + words < len(parts) else ""
+    return prefix + highlight(fragment, terms) + suffix
+
+
+class InMemorySearchBackend:
+    """Индекс в памяти, построенный из БД; перестраивается после изменения курсов
+
+    Каждый сброс увеличивает номер поколения. Индекс, построение которого началось
+    до последнего сброса, отдается только текущему запросу и не сохраняется.
+    """
+
+    def __init__(self):
+        self._index: InvertedIndex | None = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._index = None
+
+    async def _build(self, db: AsyncSession) -> InvertedIndex:
+        course, module, lesson, term = db_models.Course, db_models.CourseModule, db_models.Lesson, db_models.LessonTerm
+        visible = and_(course.is_public.is_(True), course.is_private.is_(False))
+        index = InvertedIndex()
+
+        courses = await db.execute(
+            select(course.id, course.title, course.description, visible.label("visible"), course.created_by)
+        )
+        for row in courses:
+            index.add(SearchDocument(
+                type="course", course_id=row.id, course_title=row.title,
+                title=row.title, body=row.description or "",
+                is_public=bool(row.visible), created_by=row.created_by,
+            ))
+
+        lessons = await db.execute(
+            select(lesson.id, lesson.title, lesson.content, course.id.label("course_id"),
+                   course.title.label("course_title"), visible.label("visible"), course.created_by)
+            .join(module, lesson.module_id == module.id)
+            .join(course, module.course_id == course.id)
+        )
+        for row in lessons:
+            index.add(SearchDocument(
+                type="lesson", course_id=row.course_id, course_title=row.course_title,
+                lesson_id=row.id, title=row.title, body=row.content or "",
+                is_public=bool(row.visible), created_by=row.created_by,
+            ))
+
+        terms = await db.execute(
+            select(term.term, term.explanation, lesson.id.label("lesson_id"), course.id.label("course_id"),
+                   course.title.label("course_title"), visible.label("visible"), course.created_by)
+            .join(lesson, term.lesson_id == lesson.id)
+            .join(module, lesson.module_id == module.id)
+            .join(course, module.course_id == course.id)
+        )
+        for row in terms:
+            index.add(SearchDocument(
+                type="term", course_id=row.course_id, course_title=row.course_title,
+                lesson_id=row.lesson_id, title=row.term, body=row.explanation,
+                is_public=bool(row.visible), created_by=row.created_by,
+            ))
+
+        index.finalize()
+        return index
+
+    async def search(self, db: AsyncSession, query: str, limit: int, viewer_id: UUID | None) -> List[Dict[str, Any]]:
+        index = self._index
+        if index is None:
+            async with self._lock:
+                index = self._index
+                if index is None:
+                    generation = self._generation
+                    index = await self._build(db)
+                    if generation == self._generation:
+                        self._index = index
+        return index.search(query, limit, viewer_id)
+
+
+_postgres_backend = PostgresSearchBackend()
+memory_search_backend = InMemorySearchBackend()
+
+
+def invalidate_search_index() -> None:
+    """Сбрасывает индекс в памяти после изменения курсов (для PostgreSQL ничего не делает)"""
+    memory_search_backend.invalidate()
+
+
+def invalidate_search_index_on_commit(db: AsyncSession) -> None:
+    """Сбрасывает индекс после фиксации транзакции сессии
+
+    Сброс до commit дал бы параллельному поиску перестроить индекс без
+    незафиксированных строк и сохранить его.
+    """
+    event.listen(db.sync_session, "after_commit", lambda session: invalidate_search_index(), once=True)
+
+
+async def search(
+    db: AsyncSession,
+    query: str,
+    limit: int = 20,
+    viewer_id: UUID | None = None,
+) -> Dict[str, Any]:
+    """Ранжированный поиск с подсветкой по курсам, урокам и терминам"""
+    started = time.perf_counter()
+    query = query.strip()
+    results: List[Dict[str, Any]] = []
+    if tokenize(query):
+        backend = _postgres_backend if db.bind.dialect.name == "postgresql" else memory_search_backend
+        results = await backend.search(db, query, limit, viewer_id)
+    return {
+        "query": query,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
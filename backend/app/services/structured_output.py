@@ -0,0 +1,443 @@
+"""Общий слой структурированных ответов LLM
+
+Вместо обрезки ```json и json.loads в каждом агенте:
+1. Модель вызывается в JSON mode (response_format=json_object), если модель его
+   поддерживает (LLM_JSON_MODE=auto|true|false).
+2. Ответ разбирается одним проходом: лишний текст и markdown вокруг JSON,
+   комментарии, висячие запятые и оборванный на середине ответ не мешают разбору.
+3. Результат валидируется сразу в Pydantic-модель из app/models.py. Невалидные
+   элементы списков отбрасываются, а для испорченных полей делается один
+   точечный запрос на исправление только этих полей - без повторной генерации
+   всего ответа.
+4. По каждому агенту считается доля ответов, которые не разобрались с первого раза.
+5. В кэш LLM ответ (и ответ на запрос исправления) попадает только после успешной
+   валидации; закэшированный ответ, который не прошел схему, из кэша удаляется.
+"""
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+import json
+import os
+import threading
+
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from app.services.json_stream import IncrementalJSONParser, JSONStreamError
+from app.services.llm_cache import DeferredCacheWrites, ainvoke_cached, astream_text
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Модели OpenAI с поддержкой response_format=json_object
+JSON_MODE_MODEL_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-4-turbo", "gpt-4-1106", "gpt-4-0125", "gpt-3.5-turbo", "gpt-5")
+JSON_MODE_UNSUPPORTED_SUFFIXES = ("-0301", "-0613")
+
+
+class StructuredOutputError(Exception):
+    """Ответ модели не удалось привести к схеме даже после исправления"""
+
+
+# ---- Разбор JSON ----
+
+def _drop_trailing_comma(buffer: List[str]) -> None:
+    position = len(buffer) - 1
+    while position >= 0 and buffer[position].isspace():
+        position -= 1
+    if position >= 0 and buffer[position] == ",":
+        del buffer[position]
+
+
+def _close(prefix: List[str], stack: List[str]) -> str:
+    buffer = list(prefix)
+    _drop_trailing_comma(buffer)
+    return "".join(buffer) + "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+
+
+def extract_json(text: str) -> Tuple[Any, bool]:
+    """Находит и разбирает первый JSON-объект/массив в тексте за один проход
+
+    Возвращает (значение, был ли нужен ремонт). Убирает текст вокруг JSON,
+    комментарии // и /* */, висячие запятые; оборванный ответ закрывается
+    по последнему целому значению. ValueError, если JSON в тексте нет.
+    """
+    stripped = text.strip()
+    try:
+        return json.loads(stripped, strict=False), False
+    except json.JSONDecodeError:
+        pass
+
+    starts = [index for index in (stripped.find("{"), stripped.find("[")) if index >= 0]
+    if not starts:
+        raise ValueError("JSON не найден в ответе модели")
+
+    buffer: List[str] = []
+    stack: List[str] = []
+    # Точки, где JSON можно оборвать без потери целых значений: (длина буфера, стек)
+    cut_points: List[Tuple[int, List[str]]] = []
+    in_string = escaped = False
+    index = min(starts)
+    length = len(stripped)
+    while index < length:
+        char = stripped[index]
+        index += 1
+        if in_string:
+            buffer.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == "/" and stripped.startswith("/", index):
+            newline = stripped.find("\n", index)
+            index = length if newline < 0 else newline
+            continue
+        if char == "/" and stripped.startswith("*", index):
+            end = stripped.find("*/", index + 1)
+            index = length if end < 0 else end + 2
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+        elif char in "}]":
+            _drop_trailing_comma(buffer)
+            if stack:
+                stack.pop()
+            buffer.append(char)
+            if not stack:
+                break
+            continue
+        elif char == ",":
+            cut_points.append((len(buffer), list(stack)))
+        buffer.append(char)
+
+    if not stack and not in_string:
+        return json.loads("".join(buffer), strict=False), True
+
+    # Ответ оборван: пробуем закрыть как есть, затем по последним целым значениям
+    if in_string:
+        buffer.append('"')
+    candidates = [_close(buffer, stack)]
+    for position, cut_stack in reversed(cut_points[-20:]):
+        candidates.append(_close(buffer[:position], cut_stack))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate, strict=False), True
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("Не удалось восстановить оборванный JSON")
+
+
+# ---- Статистика ----
+
+class StructuredOutputStats:
+    """Счетчики разбора ответов по агентам"""
+
+    fields = ("calls", "json_mode", "clean", "extracted", "pruned_items", "repair_calls", "repaired", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {field: 0 for field in self.fields})
+
+    def count(self, agent: str, field: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[agent][field] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            agents = {}
+            for agent, counters in self._counters.items():
+                calls = counters["calls"] or 1
+                agents[agent] = {
+                    **counters,
+                    # Ответ не прошел схему с первого разбора
+                    "parse_failure_rate": round(1 - counters["clean"] / calls, 3),
+                    # Ответ так и не удалось использовать
+                    "unrecovered_rate": round(counters["failed"] / calls, 3),
+                }
+            return {"agents": agents}
+
+
+structured_output_stats = StructuredOutputStats()
+
+
+# ---- JSON mode ----
+
+_json_mode_disabled: set[str] = set()
+
+
+def json_mode_supported(model: str) -> bool:
+    setting = os.getenv("LLM_JSON_MODE", "auto").lower()
+    if setting in ("0", "false", "no") or model in _json_mode_disabled:
+        return False
+    if setting in ("1", "true", "yes"):
+        return True
+    return model.startswith(JSON_MODE_MODEL_PREFIXES) and not model.endswith(JSON_MODE_UNSUPPORTED_SUFFIXES)
+
+
+async def astream_json(
+    prompt_template: Any,
+    llm: Any,
+    variables: Dict[str, Any],
+    agent: str,
+    use_cache: bool,
+    deferred: DeferredCacheWrites | None = None,
+) -> AsyncIterator[str]:
+    """Потоковый вызов модели в JSON mode (если поддерживается); отдает фрагменты текста"""
+    model = getattr(llm, "model_name", "")
+    if json_mode_supported(model):
+        started = False
+        try:
+            async for chunk in astream_text(
+                prompt_template, llm, variables, agent=agent, use_cache=use_cache, json_mode=True, deferred=deferred
+            ):
+                started = True
+                yield chunk
+            structured_output_stats.count(agent, "json_mode")
+            return
+        except Exception as e:
+            if started or "response_format" not in str(e):
+                raise
+            print(f"JSON mode недоступен для модели {model}: {e}")
+            _json_mode_disabled.add(model)
+    async for chunk in astream_text(prompt_template, llm, variables, agent=agent, use_cache=use_cache, deferred=deferred):
+        yield chunk
+
+
+async def _ainvoke_json(
+    prompt_template: Any,
+    llm: Any,
+    variables: Dict[str, Any],
+    agent: str,
+    use_cache: bool,
+    deferred: DeferredCacheWrites | None = None,
+) -> str:
+    model = getattr(llm, "model_name", "")
+    if json_mode_supported(model):
+        try:
+            content = await ainvoke_cached(
+                prompt_template, llm, variables, agent=agent, use_cache=use_cache, json_mode=True, deferred=deferred
+            )
+            structured_output_stats.count(agent, "json_mode")
+            return content
+        except Exception as e:
+            if "response_format" not in str(e):
+                raise
+            # Модель не поддерживает JSON mode - больше не пробуем
+            print(f"JSON mode недоступен для модели {model}: {e}")
+            _json_mode_disabled.add(model)
+    return await ainvoke_cached(prompt_template, llm, variables, agent=agent, use_cache=use_cache, deferred=deferred)
+
+
+# ---- Валидация и исправление ----
+
+REPAIR_PROMPT = ChatPromptTemplate.from_template(
+    """Ниже задание и JSON-ответ на него, в котором некорректны поля: {fields}.
+Ошибки валидации:
+{errors}
+
+Задание (сокращено):
+{task}
+
+Верни ТОЛЬКО валидный JSON-объект, содержащий исправленные поля {fields}
+(и никаких других), по JSON Schema:
+{schema}"""
+)
+
+
+def _prune_invalid_items(data: Dict[str, Any], errors: Iterable[Dict[str, Any]]) -> int:
+    """Отбрасывает невалидные элементы списков; возвращает число удаленных
+
+    Если невалидны все элементы, список не трогается - его нужно исправлять.
+    """
+    to_drop: Dict[str, set] = defaultdict(set)
+    for error in errors:
+        loc = error["loc"]
+        if len(loc) >= 2 and isinstance(loc[1], int) and isinstance(data.get(loc[0]), list):
+            to_drop[loc[0]].add(loc[1])
+    removed = 0
+    for field, indexes in to_drop.items():
+        kept = [item for position, item in enumerate(data[field]) if position not in indexes]
+        if kept:
+            removed += len(data[field]) - len(kept)
+            data[field] = kept
+    return removed
+
+
+def _validate(
+    schema: Type[ModelT], data: Dict[str, Any], non_empty: Iterable[str]
+) -> Tuple[Optional[ModelT], Dict[str, List[str]], List[Dict[str, Any]]]:
+    """Валидирует данные; возвращает (модель или None, поле -> ошибки, ошибки Pydantic)"""
+    problems: Dict[str, List[str]] = defaultdict(list)
+    for field in non_empty:
+        if not data.get(field):
+            problems[field].append(f"{field}: поле обязательно и не может быть пустым")
+    try:
+        model = schema.model_validate(data)
+    except ValidationError as e:
+        errors = e.errors()
+        for error in errors:
+            field = str(error["loc"][0]) if error["loc"] else "__root__"
+            problems[field].append(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}")
+        return None, dict(problems), errors
+    return (None if problems else model), dict(problems), []
+
+
+async def ainvoke_structured(
+    prompt_template: Any,
+    llm: Any,
+    variables: Dict[str, Any],
+    schema: Type[ModelT],
+    agent: str = "default",
+    use_cache: bool = True,
+    non_empty: Iterable[str] = (),
+) -> ModelT:
+    """Вызывает модель и возвращает ответ, провалидированный в schema
+
+    non_empty - поля, которые должны быть непустыми (например, modules структуры).
+    StructuredOutputError, если ответ не удалось привести к схеме.
+    """
+    structured_output_stats.count(agent, "calls")
+    deferred = DeferredCacheWrites()
+    try:
+        content = await _ainvoke_json(prompt_template, llm, variables, agent, use_cache, deferred)
+        try:
+            data, extracted = extract_json(content)
+        except ValueError as e:
+            structured_output_stats.count(agent, "failed")
+            raise StructuredOutputError(str(e)) from e
+        model = await validate_structured(
+            prompt_template, llm, variables, schema, data, extracted,
+            agent=agent, use_cache=use_cache, non_empty=non_empty, deferred=deferred,
+        )
+    except StructuredOutputError:
+        await deferred.discard()
+        raise
+    await deferred.commit()
+    return model
+
+
+async def astream_structured(
+    prompt_template: Any,
+    llm: Any,
+    variables: Dict[str, Any],
+    schema: Type[ModelT],
+    agent: str = "default",
+    use_cache: bool = True,
+    non_empty: Iterable[str] = (),
+    emit_depth: int = 2,
+) -> AsyncIterator[Tuple[Optional[Tuple[Any, ...]], Any]]:
+    """Потоковый вариант ainvoke_structured
+
+    По мере генерации отдает (путь, значение) для каждого завершенного значения
+    до глубины emit_depth (еще не провалидированные), в конце - (None, модель).
+    Документ собирается инкрементальным парсером, полный буфер заново разбирается
+    только если поток оказался невалидным JSON.
+    """
+    structured_output_stats.count(agent, "calls")
+    parser = IncrementalJSONParser(emit_depth=emit_depth)
+    deferred = DeferredCacheWrites()
+    chunks: List[str] = []
+    parser_failed = False
+    async for chunk in astream_json(prompt_template, llm, variables, agent, use_cache, deferred):
+        chunks.append(chunk)
+        if parser_failed:
+            continue
+        try:
+            for path, value in parser.feed(chunk):
+                yield path, value
+        except JSONStreamError:
+            parser_failed = True
+
+    try:
+        if parser.done:
+            data, extracted = parser.result, False
+        else:
+            try:
+                data, extracted = extract_json("".join(chunks))
+            except ValueError as e:
+                structured_output_stats.count(agent, "failed")
+                raise StructuredOutputError(str(e)) from e
+        model = await validate_structured(
+            prompt_template, llm, variables, schema, data, extracted,
+            agent=agent, use_cache=use_cache, non_empty=non_empty, deferred=deferred,
+        )
+    except StructuredOutputError:
+        await deferred.discard()
+        raise
+    await deferred.commit()
+    yield None, model
+
+
+async def validate_structured(
+    prompt_template: Any,
+    llm: Any,
+    variables: Dict[str, Any],
+    schema: Type[ModelT],
+    data: Any,
+    extracted: bool = False,
+    agent: str = "default",
+    use_cache: bool = True,
+    non_empty: Iterable[str] = (),
+    deferred: DeferredCacheWrites | None = None,
+) -> ModelT:
+    """Валидирует уже разобранный ответ в schema, при необходимости исправляя поля
+
+    Используется и после потокового разбора; prompt_template/variables нужны
+    для запроса на исправление. extracted - был ли нужен ремонт JSON при разборе.
+    Ответ на запрос исправления копится в deferred вместе с исходным ответом.
+    """
+    non_empty = tuple(non_empty)
+    if not isinstance(data, dict):
+        structured_output_stats.count(agent, "failed")
+        raise StructuredOutputError("Ответ модели - не JSON-объект")
+
+    model, problems, errors = _validate(schema, data, non_empty)
+    if model is not None:
+        structured_output_stats.count(agent, "extracted" if extracted else "clean")
+        return model
+
+    # Сначала бесплатный ремонт: выкидываем битые элементы списков
+    pruned = _prune_invalid_items(data, errors)
+    if pruned:
+        structured_output_stats.count(agent, "pruned_items", pruned)
+        model, problems, errors = _validate(schema, data, non_empty)
+        if model is not None:
+            return model
+
+    # Точечное исправление только сломанных полей
+    fields = [field for field in problems if field in schema.model_fields]
+    if not fields:
+        structured_output_stats.count(agent, "failed")
+        raise StructuredOutputError("; ".join(sum(problems.values(), [])))
+
+    prompt_value = await prompt_template.ainvoke(variables)
+    field_schemas = {
+        field: TypeAdapter(schema.model_fields[field].annotation).json_schema()
+        for field in fields
+    }
+    repair_variables = {
+        "fields": ", ".join(fields),
+        "errors": "\n".join(f"- {message}" for field in fields for message in problems[field][:5]),
+        "task": prompt_value.to_string()[:int(os.getenv("STRUCTURED_REPAIR_CONTEXT_CHARS", "4000"))],
+        "schema": json.dumps({"type": "object", "properties": field_schemas, "required": fields}, ensure_ascii=False),
+    }
+    structured_output_stats.count(agent, "repair_calls")
+    repair_content = await _ainvoke_json(REPAIR_PROMPT, llm, repair_variables, f"{agent}_repair", use_cache, deferred)
+    try:
+        patch, _ = extract_json(repair_content)
+    except ValueError as e:
+        structured_output_stats.count(agent, "failed")
+        raise StructuredOutputError(f"Исправление не удалось: {e}") from e
+    if isinstance(patch, dict):
+        data.update({field: patch[field] for field in fields if field in patch})
+
+    model, problems, _ = _validate(schema, data, non_empty)
+    if model is None:
+        structured_output_stats.count(agent, "failed")
+        raise StructuredOutputError("; ".join(sum(problems.values(), [])))
+    structured_output_stats.count(agent, "repaired")
+    return model
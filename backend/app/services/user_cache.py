@@ -0,0 +1,93 @@
+"""In-memory cache of authenticated user principals"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from uuid import UUID
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.db_models import User
+
+
+class UserPrincipalCache:
+    """Bounded TTL cache of user rows keyed by user id
+
+    Stores a snapshot of column values and hands out a fresh detached
+    ``User`` per lookup, so requests never share ORM instances.
+    """
+
+    def __init__(self, ttl_seconds: float | None = None, max_entries: int | None = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+        self.max_entries = max_entries or int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+        self._entries: "OrderedDict[UUID, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def get(self, user_id: UUID) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            snapshot = entry[1]
+
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return user
+
+    def set(self, user: User) -> None:
+        if not self.enabled:
+            return
+        # The password hash is only needed by login, which always reads the row
+        snapshot = {
+            column.key: getattr(user, column.key)
+            for column in User.__table__.columns
+            if column.key != "password_hash"
+        }
+        with self._lock:
+            self._entries[user.id] = (time.monotonic(), snapshot)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: UUID) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+user_cache = UserPrincipalCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User) -> None:
+    """Drop the cached principal whenever a user row is changed via the ORM
+
+    Bulk ``update(User)`` statements bypass ORM events and must call
+    ``user_cache.invalidate`` themselves.
+    """
+    user_cache.invalidate(target.id)
@@ -0,0 +1,143 @@
+"""Асинхронные провайдеры поиска видео для MaterialSearchAgent"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+import asyncio
+import os
+try:
+    # Асинхронная версия API библиотеки (не блокирует event loop)
+    from youtubesearchpython.__future__ import VideosSearch as AsyncVideosSearch
+except ImportError:
+    # Fallback если библиотека не установлена
+    AsyncVideosSearch = None
+
+
+def normalize_text(value):
+    if value is None:
+        return None
+
+    if isinstance(value, str):
+        return value
+
+    if isinstance(value, list):
+        return " ".join(
+            item.get("text", "")
+            for item in value
+            if isinstance(item, dict)
+        )
+
+    return str(value)
+
+
+class VideoSearchProvider(ABC):
+    """Интерфейс поиска видео
+
+    Реализации возвращают список словарей с ключами
+    title, url, description, duration, channel.
+    """
+
+    @abstractmethod
+    async def search(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
+        """Ищет видео по запросу"""
+
+    async def search_many(self, queries: List[str], max_results: int = 3) -> List[List[Dict[str, Any]]]:
+        """Выполняет несколько запросов параллельно, сохраняя их порядок"""
+        return list(await asyncio.gather(
+            *(self.search(query, max_results=max_results) for query in queries)
+        ))
+
+
+class YouTubeSearchProvider(VideoSearchProvider):
+    """Поиск видео на YouTube без блокировки event loop
+
+    Ограничивает число одновременных запросов к одному хосту
+    и прерывает запросы, не уложившиеся в таймаут.
+    """
+
+    host = "www.youtube.com"
+
+    def __init__(
+        self,
+        timeout: float | None = None,
+        max_connections_per_host: int | None = None,
+        language: str = "en",
+        region: str = "US",
+    ):
+        if timeout is None:
+            timeout = float(os.getenv("VIDEO_SEARCH_TIMEOUT_SECONDS", "5"))
+        if max_connections_per_host is None:
+            max_connections_per_host = int(os.getenv("VIDEO_SEARCH_MAX_CONNECTIONS_PER_HOST", "4"))
+        self.timeout = timeout
+        self.max_connections_per_host = max(1, max_connections_per_host)
+        self.language = language
+        self.region = region
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _host_limit(self, host: str) -> asyncio.Semaphore:
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_connections_per_host)
+        return self._host_limits[host]
+
+    async def search(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
+        if AsyncVideosSearch is None:
+            print("youtube-search-python не установлен, пропускаем поиск видео")
+            return []
+
+        try:
+            async with self._host_limit(self.host):
+                videos_search = AsyncVideosSearch(
+                    query,
+                    limit=max_results,
+                    language=self.language,
+                    region=self.region,
+                    timeout=self.timeout,
+                )
+                results = await asyncio.wait_for(videos_search.next(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            print(f"Таймаут поиска YouTube видео по запросу '{query}'")
+            return []
+        except Exception as e:
+            print(f"Ошибка поиска YouTube видео: {e}")
+            return []
+
+        videos = []
+        for video in (results or {}).get("result", [])[:max_results]:
+            videos.append({
+                "title": normalize_text(video.get("title")),
+                "url": video.get("link", ""),
+                "description": normalize_text(video.get("descriptionSnippet")),
+                "duration": normalize_text(video.get("duration")),
+                "channel": normalize_text(video.get("channel", {}).get("name") if video.get("channel") else None)
+            })
+        return videos
+
+
+class StaticVideoSearchProvider(VideoSearchProvider):
+    """Локальный провайдер без сети (для тестов и офлайн-разработки)
+
+    Возвращает заранее заданные результаты по точному запросу
+    или результаты по умолчанию.
+    """
+
+    def __init__(
+        self,
+        results: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+        default: Optional[List[Dict[str, Any]]] = None,
+        delay_seconds: float = 0.0,
+    ):
+        self.results = results or {}
+        self.default = default or []
+        self.delay_seconds = delay_seconds
+        self.queries: List[str] = []
+
+    async def search(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
+        self.queries.append(query)
+        if self.delay_seconds:
+            await asyncio.sleep(self.delay_seconds)
+        return [dict(video) for video in self.results.get(query, self.default)[:max_results]]
+
+
+def get_default_video_provider() -> VideoSearchProvider:
+    """Провайдер по умолчанию; VIDEO_SEARCH_PROVIDER=static отключает сетевой поиск"""
+    if os.getenv("VIDEO_SEARCH_PROVIDER", "youtube").lower() == "static":
+        return StaticVideoSearchProvider()
+    return YouTubeSearchProvider()
@@ -0,0 +1,72 @@
+"""Microbenchmark: login password verification under concurrent load
+
+Compares verifying bcrypt hashes inline on the event loop with the
+executor-based verify_and_update_password used by the auth routes.
+Reports login throughput and the worst event-loop stall observed by a
+ticker coroutine while the logins are running.
+
+Usage (from backend/):
+    python -m scripts.bench_password_hashing --logins 64 --concurrency 16
+"""
+import argparse
+import asyncio
+import time
+
+from app.auth import pwd_context, verify_and_update_password, PASSWORD_HASH_WORKERS, BCRYPT_ROUNDS
+
+
+async def _loop_lag_monitor(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Return the largest delay between scheduled and actual ticks"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def _inline_login(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password, hashed)
+
+
+async def _offloaded_login(password: str, hashed: str) -> bool:
+    verified, _ = await verify_and_update_password(password, hashed)
+    return verified
+
+
+async def _run(login, logins: int, concurrency: int, hashed: str) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_loop_lag_monitor(stop))
+
+    async def one():
+        async with semaphore:
+            assert await login("correct horse battery staple", hashed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    worst_lag = await monitor
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "logins_per_s": round(logins / elapsed, 1),
+        "max_loop_lag_ms": round(worst_lag * 1000, 1),
+    }
+
+
+async def main(logins: int, concurrency: int) -> None:
+    hashed = pwd_context.hash("correct horse battery staple")
+    print(f"bcrypt rounds={BCRYPT_ROUNDS}, executor workers={PASSWORD_HASH_WORKERS}, "
+          f"logins={logins}, concurrency={concurrency}")
+    for name, login in (("inline (blocking)", _inline_login), ("executor", _offloaded_login)):
+        result = await _run(login, logins, concurrency, hashed)
+        print(f"{name:>18}: {result}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency))
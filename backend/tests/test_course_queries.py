@@ -0,0 +1,116 @@
+"""Regression test: the course detail read path must not issue N+1 queries
+
+Saves a small and a large generated course into an in-memory SQLite
+database, enrolls a user with progress on some lessons, loads both via
+get_course_detail and counts the SQL statements. Fails if the query count
+grows with the number of modules/lessons or differs from the expected budget.
+
+Run from backend/:
+    python -m pytest tests
+"""
+import asyncio
+import uuid
+
+import pytest
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import MissingGreenlet
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.database import Base
+from app import db_models
+from app.models import (
+    Course, Module, Lesson, VideoMaterial, AdditionalMaterial,
+    PracticeExercise, TermExplanation,
+)
+from app.services.course_store import save_course, get_course_detail
+
+# course, category, tags, modules, lessons, 4 lesson child tables,
+# caller's enrollment, enrollment progress
+EXPECTED_QUERIES = 11
+
+
+def _course(modules: int, lessons: int) -> Course:
+    lesson = Lesson(
+        title="Lesson",
+        content="Content",
+        duration_minutes=30,
+        exercises=["Exercise"],
+        practice_exercises=[PracticeExercise(title="Practice", description="Do it")],
+        videos=[VideoMaterial(title="Video", url="https://example.com")],
+        additional_materials=[AdditionalMaterial(title="Article", type="article")],
+        terms=[TermExplanation(term="Term", explanation="Meaning")],
+    )
+    return Course(
+        id="check",
+        title="Query count check",
+        description="",
+        category="Check",
+        difficulty="beginner",
+        modules=[
+            Module(title=f"Module {m}", description="", lessons=[lesson] * lessons, duration_hours=1)
+            for m in range(modules)
+        ],
+        total_duration_hours=modules,
+    )
+
+
+async def _count_detail_queries(engine, session_factory, course_id, user_id) -> int:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        async with session_factory() as db:
+            detail = await get_course_detail(db, course_id, user_id=user_id)
+            assert detail is not None and detail["enrollment"] is not None
+    except MissingGreenlet:
+        # A relationship without an eager loader was lazy-loaded (N+1 under a sync session)
+        pytest.fail("lazy load attempted while building the course detail")
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    return len(statements)
+
+
+async def _detail_query_counts() -> dict:
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    counts = {}
+    async with session_factory() as db:
+        user = db_models.User(id=uuid.uuid4(), email="check@example.com", username="check", password_hash="-")
+        db.add(user)
+        await db.flush()
+        course_ids = {}
+        for size in [(1, 1), (8, 12)]:
+            course_ids[size] = await save_course(db, _course(*size), created_by=user.id)
+        await db.commit()
+
+        for size, course_id in course_ids.items():
+            enrollment = db_models.Enrollment(id=uuid.uuid4(), user_id=user.id, course_id=course_id)
+            db.add(enrollment)
+            first_lesson = await db.scalar(
+                select(db_models.Lesson.id)
+                .join(db_models.CourseModule)
+                .where(db_models.CourseModule.course_id == course_id)
+                .limit(1)
+            )
+            db.add(db_models.StudentProgress(enrollment_id=enrollment.id, lesson_id=first_lesson, time_spent_minutes=5))
+        await db.commit()
+
+    try:
+        for size, course_id in course_ids.items():
+            counts[size] = await _count_detail_queries(engine, session_factory, course_id, user.id)
+    finally:
+        await engine.dispose()
+    return counts
+
+
+def test_course_detail_query_count_is_constant():
+    counts = asyncio.run(_detail_query_counts())
+    # keys are (modules, lessons per module)
+    assert counts == {size: EXPECTED_QUERIES for size in counts}, counts